@@ -0,0 +1,161 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+# Admission control configuration
+ADMISSION_WORKERS = int(os.getenv("ADMISSION_WORKERS", "4"))
+MAX_QUEUE_PER_USER = int(os.getenv("ADMISSION_MAX_QUEUE_PER_USER", "20"))
+MAX_QUEUE_TOTAL = int(os.getenv("ADMISSION_MAX_QUEUE_TOTAL", "1000"))
+DEFER_AFTER_MS = float(os.getenv("ADMISSION_DEFER_AFTER_MS", "500"))
+SHED_AFTER_MS = float(os.getenv("ADMISSION_SHED_AFTER_MS", "5000"))
+
+ACCEPTED = "accepted"
+DEFERRED = "deferred"
+SHED = "shed"
+
+logger = logging.getLogger(__name__)
+
+
+class FairScheduler:
+    """Per-user fair queues served round-robin by a small worker pool.
+
+    Each user has its own FIFO queue and at most one of their tasks runs at a
+    time, so events of one conversation stay ordered and a user with many
+    queued tasks only gets one turn per round. Heavy tasks are deferred to a
+    low-priority lane once queue latency passes DEFER_AFTER_MS and shed once
+    it passes SHED_AFTER_MS; any task is shed when the queues are full.
+    Queue latency is the age of the oldest queued task, so it keeps rising
+    while every worker is stuck, not only when tasks are dequeued.
+    """
+
+    def __init__(self, workers=ADMISSION_WORKERS, max_queue_per_user=MAX_QUEUE_PER_USER,
+                 max_queue_total=MAX_QUEUE_TOTAL, defer_after_ms=DEFER_AFTER_MS,
+                 shed_after_ms=SHED_AFTER_MS):
+        self.workers = workers
+        self.max_queue_per_user = max_queue_per_user
+        self.max_queue_total = max_queue_total
+        self.defer_after = defer_after_ms / 1000
+        self.shed_after = shed_after_ms / 1000
+
+        self._queues = {}        # user -> deque of (enqueued_at, ctx, fn, deferred)
+        self._arrivals = deque() # every queued entry in enqueue order (head may already be taken)
+        self._taken = set()      # ids of entries in _arrivals that workers have dequeued
+        self._ready = deque()    # users with normal work waiting, round-robin order
+        self._deferred = deque() # users with only deferred work waiting
+        self._running = set()    # users with a task in flight
+        self._total = 0
+        self._cond = threading.Condition()
+        self._threads = []
+
+        self.metrics = {
+            "accepted": 0,
+            "deferred": 0,
+            "shed": 0,
+            "completed": 0,
+            "errors": 0,
+        }
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"fair-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def running(self) -> bool:
+        with self._cond:
+            return bool(self._threads) and all(thread.is_alive() for thread in self._threads)
+
+    def submit(self, user_id, fn, heavy=False) -> str:
+        """Queue `fn` for `user_id` and return ACCEPTED, DEFERRED or SHED."""
+        with self._cond:
+            queue = self._queues.get(user_id)
+            latency = self._current_latency()
+            if (self._total >= self.max_queue_total
+                    or (queue is not None and len(queue) >= self.max_queue_per_user)
+                    or (heavy and latency > self.shed_after)):
+                self.metrics["shed"] += 1
+                return SHED
+
+            deferred = heavy and latency > self.defer_after
+            if queue is None:
+                queue = self._queues[user_id] = deque()
+            entry = (time.monotonic(), contextvars.copy_context(), fn, deferred)
+            queue.append(entry)
+            self._arrivals.append(entry)
+            self._total += 1
+
+            if len(queue) == 1 and user_id not in self._running:
+                (self._deferred if deferred else self._ready).append(user_id)
+
+            if deferred:
+                self.metrics["deferred"] += 1
+                status = DEFERRED
+            else:
+                self.metrics["accepted"] += 1
+                status = ACCEPTED
+            self._cond.notify()
+            return status
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                **self.metrics,
+                "queued": self._total,
+                "active_users": len(self._queues),
+                "queue_latency_ms": round(self._current_latency() * 1000, 1),
+            }
+
+    def _current_latency(self):
+        # Head-of-line age; entries dequeued out of order are dropped lazily
+        while self._arrivals and id(self._arrivals[0]) in self._taken:
+            self._taken.discard(id(self._arrivals.popleft()))
+        return time.monotonic() - self._arrivals[0][0] if self._arrivals else 0.0
+
+    def _next_user(self):
+        # Normal work first; deferred work only runs when nothing else waits
+        if self._ready:
+            return self._ready.popleft()
+        if self._deferred:
+            return self._deferred.popleft()
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                user_id = self._next_user()
+                while user_id is None:
+                    self._cond.wait()
+                    user_id = self._next_user()
+                entry = self._queues[user_id].popleft()
+                _, ctx, fn, _ = entry
+                self._taken.add(id(entry))
+                self._total -= 1
+                self._running.add(user_id)
+
+            failed = False
+            try:
+                ctx.run(fn)
+            except Exception:
+                failed = True
+                logger.exception("task failed", extra={"user_id": user_id})
+
+            with self._cond:
+                self.metrics["errors" if failed else "completed"] += 1
+                self._running.discard(user_id)
+                queue = self._queues[user_id]
+                if queue:
+                    # Back of the line so other users get their turn
+                    deferred = queue[0][3]
+                    (self._deferred if deferred else self._ready).append(user_id)
+                    self._cond.notify()
+                else:
+                    del self._queues[user_id]
+
+
+scheduler = FairScheduler()
@@ -0,0 +1,106 @@
+"""Benchmark webhook parsing: SDK WebhookParser vs the filtered fast path.
+
+Example:
+    python bench_parse.py --bodies 2000 --events 5 --handled 0.3
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+
+from linebot import WebhookParser
+
+import webhook_events
+from replay import sign
+
+SECRET = "bench-secret"
+
+
+def user_id() -> str:
+    return "U" + uuid.uuid4().hex
+
+
+def make_event(kind: str) -> dict:
+    """One webhook event shaped like LINE's, for the given type."""
+    event = {
+        "type": kind,
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "source": {"type": "user", "userId": user_id()},
+        "webhookEventId": uuid.uuid4().hex.upper(),
+        "deliveryContext": {"isRedelivery": False},
+    }
+    if kind in ("message", "postback", "follow"):
+        event["replyToken"] = uuid.uuid4().hex
+    if kind == "message":
+        event["message"] = {"id": str(random.getrandbits(48)), "type": "text", "quoteToken": uuid.uuid4().hex,
+                            "text": random.choice(["สร้างการประชุม", "09:00-10:00", "someone@example.com"])}
+    elif kind == "postback":
+        event["postback"] = {"data": f"select_user_{user_id()}_someone@example.com"}
+    elif kind == "read":
+        event["read"] = {"watermark": uuid.uuid4().hex}
+    elif kind == "delivery":
+        event["delivery"] = {"data": uuid.uuid4().hex}
+    return event
+
+
+def make_bodies(count: int, events_per_body: int, handled_share: float) -> list:
+    """Signed bodies where `handled_share` of events are message/postback."""
+    bodies = []
+    for _ in range(count):
+        events = [
+            make_event(random.choice(["message", "postback"]) if random.random() < handled_share
+                       else random.choice(["follow", "unfollow", "read", "delivery"]))
+            for _ in range(events_per_body)
+        ]
+        body = json.dumps({"destination": user_id(), "events": events}, ensure_ascii=False).encode("utf-8")
+        bodies.append((body, sign(body, SECRET)))
+    return bodies
+
+
+def sdk_parse(bodies) -> int:
+    parser = WebhookParser(SECRET)
+    return sum(len(parser.parse(body.decode("utf-8"), signature)) for body, signature in bodies)
+
+
+def fast_parse(bodies) -> int:
+    dispatched = 0
+    for body, signature in bodies:
+        if not webhook_events.verify_signature(body, signature, SECRET):
+            raise ValueError("bad signature")
+        if webhook_events.may_contain_handled(body):
+            dispatched += len(webhook_events.parse_events(webhook_events.load_payload(body)))
+    return dispatched
+
+
+def timed(fn, bodies, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(bodies)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bodies", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=5, help="events per body")
+    parser.add_argument("--handled", type=float, default=0.3, help="share of message/postback events")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    bodies = make_bodies(args.bodies, args.events, args.handled)
+    sdk = timed(sdk_parse, bodies, args.repeat)
+    fast = timed(fast_parse, bodies, args.repeat)
+    print(json.dumps({
+        "bodies": args.bodies,
+        "events_per_body": args.events,
+        "handled_share": args.handled,
+        "models_built": {"sdk": sdk_parse(bodies), "fast": fast_parse(bodies)},
+        "sdk_us_per_body": round(sdk / args.bodies * 1e6, 1),
+        "fast_us_per_body": round(fast / args.bodies * 1e6, 1),
+        "speedup": round(sdk / fast, 2) if fast else None,
+    }, indent=2))
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List
+from urllib.parse import quote, urlsplit
+
+import tracing
+from test import parse_events
+from timezones import DEFAULT_TIMEZONE
+
+if TYPE_CHECKING:
+    import httpx
+
+# Calendar API configuration (fetching is disabled when no URL is set)
+CALENDAR_API_URL = os.getenv("CALENDAR_API_URL", "")
+CALENDAR_CACHE_TTL = float(os.getenv("CALENDAR_CACHE_TTL", "300"))
+CALENDAR_MAX_PER_HOST = int(os.getenv("CALENDAR_MAX_PER_HOST", "10"))
+CALENDAR_TIMEOUT = float(os.getenv("CALENDAR_TIMEOUT", "15"))
+
+logger = logging.getLogger(__name__)
+
+
+class CalendarFetcher:
+    """Fetch many users' calendars concurrently over one pooled HTTP client.
+
+    The client lives on a dedicated event loop thread so its connection pool
+    survives across requests; sync callers block on `fetch` until every
+    requested user has been answered (or has failed).
+    """
+
+    def __init__(self, base_url: str = CALENDAR_API_URL, cache_ttl: float = CALENDAR_CACHE_TTL,
+                 max_per_host: int = CALENDAR_MAX_PER_HOST, timeout: float = CALENDAR_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.cache_ttl = cache_ttl
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.fetched_at = {}  # (store id, email) -> time.monotonic() of the last successful fetch
+        self._loop = None
+        self._client = None
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    def is_fresh(self, store, email: str) -> bool:
+        fetched_at = self.fetched_at.get((id(store), email))
+        return fetched_at is not None and time.monotonic() - fetched_at < self.cache_ttl
+
+    def fetch(self, emails: List[str], store, timezones: Dict[str, str] = None, force: bool = False) -> Dict[str, str]:
+        """Refresh the given users in a ScheduleStore and return {email: error}.
+
+        `timezones` ({email: zone}) is used for all-day and floating-time
+        events and updated with the zone each calendar reports.
+        """
+        stale = [email for email in dict.fromkeys(emails) if force or not self.is_fresh(store, email)]
+        if not stale or not self.enabled:
+            return {}
+        if timezones is None:
+            timezones = {}
+        with tracing.span("calendar fetch", calendars=len(stale)):
+            future = asyncio.run_coroutine_threadsafe(self._fetch_all(stale, store, timezones), self._ensure_loop())
+            errors = future.result()
+        logger.debug("calendars fetched", extra={"requested": len(stale), "failed": len(errors)})
+        return errors
+
+    def start(self):
+        """Start the loop thread and HTTP client ahead of the first fetch."""
+        if self.enabled:
+            asyncio.run_coroutine_threadsafe(self._start_client(), self._ensure_loop()).result()
+
+    async def _start_client(self):
+        self._get_client()
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            if self._client is not None:
+                asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+            self._client = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="calendar-fetch", daemon=True).start()
+            return self._loop
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        # Created lazily on the loop thread, where it will be used; httpx
+        # itself is only imported when calendar fetching is enabled
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_per_host * 4,
+                    max_keepalive_connections=self.max_per_host
+                )
+            )
+        return self._client
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_limits[host]
+
+    async def _fetch_all(self, emails: List[str], store, timezones: Dict[str, str]) -> Dict[str, str]:
+        results = await asyncio.gather(*(self._fetch_one(email) for email in emails), return_exceptions=True)
+
+        errors = {}
+        for email, result in zip(emails, results):
+            if isinstance(result, Exception):
+                errors[email] = str(result)
+                logger.warning("calendar fetch failed", extra={"email": email, "error": str(result)})
+                continue
+            zone = result.get("timeZone") or timezones.get(email, DEFAULT_TIMEZONE)
+            timezones[email] = zone
+            busy = {
+                date: [list(period) for period in periods]
+                for date, periods in parse_events(result.get("events", []), zone).items()
+            }
+            store.sync_user(email, busy)
+            self.fetched_at[(id(store), email)] = time.monotonic()
+        return errors
+
+    async def _fetch_one(self, email: str) -> dict:
+        url = f"{self.base_url}/events/{quote(email)}"
+        async with self._host_limit(url):
+            response = await self._get_client().get(url)
+        response.raise_for_status()
+        return response.json()
+
+
+calendar_fetcher = CalendarFetcher()
@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+# Capture configuration (disabled unless a path is set)
+WEBHOOK_CAPTURE_PATH = os.getenv("WEBHOOK_CAPTURE_PATH", "")
+CAPTURE_QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", "10000"))
+
+USER_ID_PATTERN = re.compile(r'U[0-9a-f]{32}')
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+# Postback data is "<action>_<user ID>[_<argument>]"; only the argument is free text
+POSTBACK_ARG_PATTERN = re.compile(r'^(.*?_U[0-9a-f]{32})_(.*)$')
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _scrub_ids(text: str) -> str:
+    return USER_ID_PATTERN.sub(lambda m: "U" + _digest(m.group(0))[:32], text)
+
+
+def _scrub_emails(text: str) -> str:
+    return EMAIL_PATTERN.sub(lambda m: f"user{_digest(m.group(0))[:10]}@example.com", text)
+
+
+def sanitize(payload: dict) -> dict:
+    """Strip personal data from a webhook payload while keeping it replayable.
+
+    User IDs and emails map to stable pseudonyms of the same shape, so a
+    conversation still lines up across events and postback data still
+    parses; reply tokens are dropped because they are single-use anyway.
+    """
+    events = []
+    for event in payload.get("events", []):
+        event = json.loads(_scrub_ids(json.dumps(event, ensure_ascii=False)))
+        event.pop("replyToken", None)
+
+        message = event.get("message")
+        if message and "text" in message:
+            message["text"] = _scrub_emails(message["text"])
+
+        postback = event.get("postback")
+        if postback and "data" in postback:
+            match = POSTBACK_ARG_PATTERN.match(postback["data"])
+            if match:
+                postback["data"] = f"{match.group(1)}_{_scrub_emails(match.group(2))}"
+        events.append(event)
+    return {**payload, "events": events}
+
+
+class WebhookCapture:
+    """Append sanitized webhook bodies to a gzip JSON-lines file.
+
+    Sanitizing and writing happen on a background thread; the request path
+    only enqueues the raw bytes and never blocks (bodies are dropped when the
+    queue is full).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(CAPTURE_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="webhook-capture", daemon=True)
+        self._thread.start()
+
+    def record(self, body: bytes):
+        try:
+            self._queue.put_nowait((time.time(), body))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 1000 and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # One gzip member per batch, so the file stays readable even if
+            # the process dies before the next write
+            with gzip.open(self.path, "at", encoding="utf-8") as out:
+                for received_at, body in batch:
+                    try:
+                        payload = sanitize(json.loads(body))
+                    except ValueError:
+                        logger.warning("capture skipped unparseable body")
+                        continue
+                    record = {"t": received_at, "body": payload}
+                    out.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def load_capture(path: str) -> list:
+    """Read a capture file as [(seconds since first event, payload), ...]."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        return []
+    start = records[0]["t"]
+    return [(record["t"] - start, record["body"]) for record in records]
+
+
+capture = WebhookCapture(WEBHOOK_CAPTURE_PATH) if WEBHOOK_CAPTURE_PATH else None
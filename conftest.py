@@ -0,0 +1 @@
+# Lets tests/ import the flat top-level modules
@@ -0,0 +1,100 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Conversation states
+MAIN_MENU = "main_menu"
+ENTER_EMAIL = "enter_email"
+CONFIRM_EMAIL = "confirm_email"
+ENTER_MEETING_NAME = "enter_meeting_name"
+SELECT_DATE = "select_date"
+ENTER_TIME = "enter_time"
+SELECT_ATTENDEES = "select_attendees"
+SELECT_SLOT = "select_slot"
+CONFIRM_MEETING = "confirm_meeting"
+
+# Matches any state when registering a transition
+ANY_STATE = "*"
+
+# Text input that is not a global command
+TEXT_EVENT = "text"
+
+# Postback data is "<action>_<LINE user ID>[_<argument>]"
+POSTBACK_PATTERN = re.compile(r'^(.*?)_U[0-9a-f]{32}(?:_(.*))?$')
+
+
+@dataclass(slots=True)
+class MeetingDraft:
+    """Meeting being put together by the organizer."""
+    name: str = ""
+    start_date: str = ""
+    end_date: str = ""
+    start_time: str = ""
+    end_time: str = ""
+    duration: int = 0  # minutes; 0 means the meeting fills start_time-end_time
+    date: str = ""
+    selected_users: List[str] = field(default_factory=list)  # required attendees
+    optional_users: List[str] = field(default_factory=list)
+    min_attendance: float = 1.0  # share of all attendees that must be free
+    room_capacity: int = 0  # seats needed; 0 when no room is wanted
+    room_attributes: List[str] = field(default_factory=list)
+    room_id: str = ""
+    room_name: str = ""
+
+
+@dataclass(slots=True)
+class Session:
+    """Per-user conversation state."""
+    state: str = MAIN_MENU
+    email: str = ""
+    meeting: Optional[MeetingDraft] = None
+    available_slots: Optional[List[Dict]] = None
+    hold_id: str = ""
+
+    def reset(self) -> str:
+        """Drop any in-progress data and return to the main menu."""
+        self.email = ""
+        self.meeting = None
+        self.available_slots = None
+        self.hold_id = ""
+        return MAIN_MENU
+
+
+def parse_postback(data: str) -> Tuple[str, str]:
+    """Split postback data into (action, argument)."""
+    match = POSTBACK_PATTERN.match(data)
+    if match is None:
+        return data, ""
+    return match.group(1), match.group(2) or ""
+
+
+class StateMachine:
+    """Declarative (state, event) -> handler transition table.
+
+    Handlers are registered with the states they are allowed from and
+    return the next state (or None to stay). Dispatching is a single dict
+    lookup, falling back to transitions registered for ANY_STATE.
+    """
+
+    def __init__(self):
+        self._transitions = {}
+
+    def on(self, event: str, *states: str):
+        def decorator(func: Callable):
+            for state in states or (ANY_STATE,):
+                self._transitions[(state, event)] = func
+            return func
+        return decorator
+
+    def allows(self, state: str, event: str) -> bool:
+        return (state, event) in self._transitions or (ANY_STATE, event) in self._transitions
+
+    def dispatch(self, session: Session, event: str, *args) -> bool:
+        """Run the transition for `event`; returns False if it is not allowed."""
+        func = self._transitions.get((session.state, event)) or self._transitions.get((ANY_STATE, event))
+        if func is None:
+            return False
+        next_state = func(session, *args)
+        if next_state is not None:
+            session.state = next_state
+        return True
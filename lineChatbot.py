@@ -1,13 +1,17 @@
 import os
 
+import contextvars
+import heapq
+import logging
 import threading
+import time
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from pydantic import BaseModel
 
 from urllib.parse import quote
-from linebot import LineBotApi, WebhookHandler
+from linebot import LineBotApi
 
 from linebot.models import (
     MessageEvent, TextMessage, TextSendMessage,
@@ -15,22 +19,37 @@ from linebot.models import (
     PostbackEvent
 )
 
-import requests
 
+import profiler
+from conversation import (
+    StateMachine, Session, MeetingDraft, parse_postback, TEXT_EVENT,
+    MAIN_MENU, ENTER_EMAIL, CONFIRM_EMAIL, ENTER_MEETING_NAME, SELECT_DATE,
+    ENTER_TIME, SELECT_ATTENDEES, SELECT_SLOT, CONFIRM_MEETING
+)
+import shard_search
+import shadow
+import tracing
+from schedule_store import DAY_START, ScheduleStore, intersect_gaps, to_hhmm, to_minutes
+from nl_parser import DEFAULT_SEARCH_DAYS, parse_meeting_request, parse_time_window
+import timezones
+from timezones import DEFAULT_TIMEZONE
+import quorum
+from rooms import ROOM_KEY_PREFIX, Room, load_rooms
+from schedule_snapshot import attach_snapshot
+from work_calendar import WorkCalendar
+import tenants
+from tenants import Tenant, TenantLocal, registry
+from calendar_fetch import calendar_fetcher
 from test import send_post
 
+logger = logging.getLogger(__name__)
+
 # LINE API configuration
 CHANNEL_ACCESS_TOKEN = os.getenv("CHANNEL_ACCESS_TOKEN")
 CHANNEL_SECRET = os.getenv("CHANNEL_SECRET")
 
-line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN)
-handler = WebhookHandler(CHANNEL_SECRET)
-
-# Session storage (in production, use a database)
-user_sessions = {}
-
-# Mockup data for user schedules (busy times)
-user_schedules = {
+# Mockup data for user schedules (busy times, Bangkok local)
+mock_schedules = {
     "panupongpr3841@gmail.com": {
         "2025-04-21": [
             ["09:00", "10:00"],
@@ -50,8 +69,27 @@ user_schedules = {
     }
 }
 
-# Mock user data (in production, fetch from database)
-available_users = ["panupongpr3841@gmail.com", "panupongnu4@gmail.com"]
+# Default channel (more are loaded from LINE_CHANNELS_FILE)
+default_tenant = registry.add(Tenant.create(
+    channel_id="default",
+    access_token=CHANNEL_ACCESS_TOKEN,
+    secret=CHANNEL_SECRET,
+    destination=os.getenv("CHANNEL_DESTINATION", ""),
+    schedules=timezones.utc_schedules(mock_schedules, "Asia/Bangkok"),
+    # Mock user data (in production, fetch from database)
+    available_users=["panupongpr3841@gmail.com", "panupongnu4@gmail.com"],
+    rooms=load_rooms()
+), default=True)
+
+# Per-channel objects, resolved for the webhook being handled
+line_bot_api: LineBotApi = TenantLocal("line_bot_api")
+# Session storage (in production, use a database)
+user_sessions: Dict[str, Session] = TenantLocal("user_sessions")
+schedule_store: ScheduleStore = TenantLocal("store")
+# Short-lived holds on offered slots (prevents double booking)
+reservations = TenantLocal("reservations")
+available_users = TenantLocal("available_users")
+
 
 # Model for meeting creation result
 class MeetingResult(BaseModel):
@@ -64,6 +102,40 @@ class MeetingResult(BaseModel):
     attendees: List[Any] = []
 
 
+def load_channels():
+    """Load the other channels and attach the shared schedule snapshot (from the app's startup hook)."""
+    registry.load_file()
+    # Share the default channel's busy periods with other workers through an mmap snapshot
+    attach_snapshot(default_tenant.store)
+
+
+def warm_line_clients():
+    """Build every channel's LINE client, and the shared HTTP pool, before the first reply."""
+    for tenant in list(registry.by_channel.values()):
+        tenant.line_bot_api
+
+
+def warm_timezone_tables(days: int = 2 * DEFAULT_SEARCH_DAYS):
+    """Fill the offset tables for the zones and days searches are about to use."""
+    zones = {DEFAULT_TIMEZONE}
+    for tenant in list(registry.by_channel.values()):
+        zones.update(tenant.timezones.values())
+    for zone in zones:
+        first = timezones.today(zone)
+        for i in range(days):
+            timezones.day_offsets(zone, (first + timedelta(days=i)).isoformat())
+
+
+def warm_parser():
+    """Compile the free-text tokenizer before the first meeting request."""
+    parse_meeting_request("ประชุม พรุ่งนี้ 13:00-14:00 กับ someone@example.com", timezones.today())
+
+
+def user_timezone(key: str) -> str:
+    """IANA zone of a LINE user or attendee email."""
+    return tenants.current().timezones.get(key, DEFAULT_TIMEZONE)
+
+
 def add_user_email(email):
     """Add a new user email to the available users list."""
     # For production, this should update a database
@@ -71,53 +143,292 @@ def add_user_email(email):
         available_users.append(email)
         return True
     return False
+
+
+def postback_action(data: str) -> str:
+    """Strip the user ID (and anything after it) from postback data."""
+    return parse_postback(data)[0]
+
+
 def validate_email(email):
     """Simple email validation."""
     import re
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
-def parse_time_range(time_range: str) -> tuple:
-    """Parse time range string (e.g., '13:00 - 14:00') into start and end times."""
-    try:
-        start_time, end_time = time_range.split("-")
-        return start_time.strip(), end_time.strip()
-    except:
-        try:
-            start_time, end_time = time_range.split("to")
-            return start_time.strip(), end_time.strip()
-        except:
-            raise ValueError("Invalid time range format. Please use format like '13:00 - 14:00'")
-
-def is_time_available(date: str, start_time: str, end_time: str, users: List[str]) -> bool:
-    """Check if all users are available at the given date and time."""
-    for user in users:
-        if user not in user_schedules:
-            continue  # User has no schedule, so they're available
-        
-        if date in user_schedules[user]:
-            for busy_period in user_schedules[user][date]:
-                busy_start, busy_end = busy_period
-                
-                # Check for overlap
-                if (start_time <= busy_end and end_time >= busy_start):
-                    return False
+
+
+def parse_time_range(time_range: str) -> Optional[tuple]:
+    """Parse time range string (e.g., '13:00 - 14:00') into start and end times, or None."""
+    return parse_time_window(time_range)
+
+
+def require_time_range(time_range: str) -> tuple:
+    """Like parse_time_range, but raise ValueError for text that is not a time range."""
+    window = parse_time_range(time_range)
+    if window is None:
+        raise ValueError(f"invalid time range: {time_range!r}")
+    return window
+
+
+def is_time_available(date: str, start_time: str, end_time: str, users: List[str], store: ScheduleStore = None,
+                      zone: str = DEFAULT_TIMEZONE) -> bool:
+    """Check if all users are available at the given local date and time."""
+    if store is None:
+        store = schedule_store
+    
+    # The store is in UTC; a window can straddle UTC midnight
+    for utc_date, start, end in timezones.to_utc(zone, date, to_minutes(start_time), to_minutes(end_time)):
+        # Users without a schedule for the day have a single all-day gap
+        for user in users:
+            if not store.is_free(user, utc_date, start, end):
+                return False
     
     return True
 
-def find_available_slots(date_range: List[str], time_range: str, users: List[str]) -> List[Dict]:
-    """Find available meeting slots within the given date range and time."""
-    start_time, end_time = parse_time_range(time_range)
-    available_slots = []
+
+def make_slot(date: str, start_time: str, end_time: str, zone: str) -> Dict:
+    """Slot in the organizer's local time plus the UTC periods it occupies."""
+    return {
+        "date": date,
+        "start_time": start_time,
+        "end_time": end_time,
+        "periods": [
+            (utc_date, to_hhmm(start), to_hhmm(end))
+            for utc_date, start, end in timezones.to_utc(zone, date, to_minutes(start_time), to_minutes(end_time))
+        ]
+    }
+
+
+def find_available_slots(date_range: List[str], time_range: str, users: List[str], calendar: WorkCalendar = None,
+                         zone: str = DEFAULT_TIMEZONE) -> List[Dict]:
+    """Find available meeting slots within the given date range and time (local to `zone`)."""
+    start_time, end_time = require_time_range(time_range)
     
-    for date in date_range:
-        if is_time_available(date, start_time, end_time, users):
-            available_slots.append({
-                "date": date,
-                "start_time": start_time,
-                "end_time": end_time
-            })
+    # Weekends, holidays and out-of-hours windows never reach the per-user checks
+    date_range = (calendar or tenants.current().calendar).filter_dates(date_range, start_time, end_time)
+    
+    # Large searches are split into date shards and run on worker processes
+    store = tenants.current().store
+    if shard_search.should_shard(date_range, users, store):
+        available_dates = shard_search.search(date_range, start_time, end_time, users, store, zone)
+    else:
+        available_dates = [
+            date for date in date_range
+            if is_time_available(date, start_time, end_time, users, zone=zone)
+        ]
     
-    return available_slots
+    return [make_slot(date, start_time, end_time, zone) for date in available_dates]
+
+
+def find_available_slots_by_gaps(date_range: List[str], time_range: str, users: List[str],
+                                 calendar: WorkCalendar = None, zone: str = DEFAULT_TIMEZONE) -> List[Dict]:
+    """Same answer as find_available_slots, from one common-gap intersection per date.
+
+    Candidate engine for shadow mode: the window fits when a single common
+    gap of all users covers it.
+    """
+    start_time, end_time = require_time_range(time_range)
+    date_range = (calendar or tenants.current().calendar).filter_dates(date_range, start_time, end_time)
+    slots = []
+    for date in date_range:
+        first = timezones.local_to_utc(zone, date, to_minutes(start_time))
+        last = timezones.local_to_utc(zone, date, to_minutes(end_time))
+        # Gap bounds are exclusive, busy periods inclusive
+        if any(lo < first and last < hi for lo, hi in common_utc_gaps(users, first, last)):
+            slots.append(make_slot(date, start_time, end_time, zone))
+    return slots
+
+
+shadow.register("gaps", find_available_slots_by_gaps)
+
+
+def common_utc_gaps(users: List[str], first: int, last: int) -> List[tuple]:
+    """Common free gaps over absolute UTC minutes [first, last], joined across UTC midnight."""
+    store = tenants.current().store
+    gaps = []
+    for utc_date, _, _ in timezones.split_utc(first, last):
+        base = timezones.day_start(utc_date)
+        for lo, hi in store.common_gaps(users, utc_date):
+            if gaps and lo == DAY_START and gaps[-1][1] == base:
+                gaps[-1] = (gaps[-1][0], base + hi)
+            else:
+                gaps.append((base + lo, base + hi))
+    return gaps
+
+
+def first_fit(gaps: List[tuple], first: int, last: int, duration: int, date: str, zone: str) -> Optional[int]:
+    """Earliest quarter-hour local start on `date` whose meeting fits a gap inside [first, last]."""
+    for gap_lo, gap_hi in gaps:
+        # Gap bounds are exclusive (see schedule_store)
+        start = -(-timezones.local_minute(zone, date, max(gap_lo + 1, first)) // 15) * 15
+        if timezones.local_to_utc(zone, date, start + duration) <= min(gap_hi - 1, last):
+            return start
+        if gap_lo >= last:
+            break
+    return None
+
+
+def room_is_free(room: Room, periods: List[tuple], owner: str = None) -> bool:
+    """Check a room's schedule and other organizers' holds for the slot's UTC periods."""
+    store = tenants.current().store
+    return (
+        all(store.is_free(room.key, date, to_minutes(start), to_minutes(end)) for date, start, end in periods)
+        and not reservations.is_held([room.key], periods, owner=owner)
+    )
+
+
+def assign_rooms(slots: List[Dict], rooms: List[Room], owner: str = None) -> List[Dict]:
+    """Give each slot the smallest free room, dropping slots no room can host."""
+    assigned = []
+    for slot in slots:
+        room = next((room for room in rooms if room_is_free(room, slot["periods"], owner)), None)
+        if room is not None:
+            slot["room_id"], slot["room_name"] = room.room_id, room.name
+            assigned.append(slot)
+    return assigned
+
+
+def not_before_now(date: str, lo: int, zone: str, now: datetime = None) -> int:
+    """Raise `lo` (local minutes on `date`) to the current time when `date` is today in `zone`."""
+    now = now or timezones.local_now(zone)
+    if date == now.date().isoformat():
+        return max(lo, now.hour * 60 + now.minute)
+    return lo
+
+
+def find_duration_slots(date_range: List[str], duration: int, users: List[str], window: tuple = None,
+                        calendar: WorkCalendar = None, zone: str = DEFAULT_TIMEZONE,
+                        rooms: List[Room] = None, owner: str = None, now: datetime = None) -> List[Dict]:
+    """Find the earliest `duration`-minute slot per date where all users are free.
+
+    The search runs inside `window` (start, end) when given, otherwise inside
+    each day's working hours, and never before `now` (default: the current
+    time in `zone`); starts are rounded up to the quarter hour.
+    With `rooms` (candidates from the capacity index, smallest first) the
+    slot and its room are found together by earliest_room_fit.
+    """
+    calendar = calendar or tenants.current().calendar
+    slots = []
+    for date in date_range:
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+        hours = calendar.working_hours.get(day.weekday())
+        if hours is None or not calendar.is_working_day(day):
+            continue
+        lo, hi = hours
+        if window:
+            lo, hi = max(lo, to_minutes(window[0])), min(hi, to_minutes(window[1]))
+        lo = not_before_now(date, lo, zone, now)
+        first, last = timezones.local_to_utc(zone, date, lo), timezones.local_to_utc(zone, date, hi)
+        if first >= last:
+            continue
+        gaps = common_utc_gaps(users, first, last)
+        if rooms is None:
+            start = first_fit(gaps, first, last, duration, date, zone)
+            if start is not None:
+                slots.append(make_slot(date, to_hhmm(start), to_hhmm(start + duration), zone))
+            continue
+
+        fit = earliest_room_fit(gaps, rooms, first, last, duration, date, zone, owner) if gaps else None
+        if fit is not None:
+            room, slot = fit
+            slot["room_id"], slot["room_name"] = room.room_id, room.name
+            slots.append(slot)
+    return slots
+
+
+def earliest_room_fit(gaps: List[tuple], rooms: List[Room], first: int, last: int, duration: int, date: str,
+                      zone: str, owner: str = None) -> Optional[tuple]:
+    """Earliest (room, slot) where the attendees' `gaps` and one of `rooms` are free.
+
+    The rooms' free gaps are merged into one stream ordered by the time they
+    open, so the sweep stops at the first gap opening after the best start
+    found so far instead of fitting the meeting into every room. Ties go to
+    the smaller room.
+    """
+    streams = [
+        [(lo, index, hi) for lo, hi in common_utc_gaps([room.key], first, last) if hi > first and lo < last]
+        for index, room in enumerate(rooms)
+    ]
+    best = None  # (start, room index, UTC start, slot)
+    for lo, index, hi in heapq.merge(*streams):
+        if best is not None and lo >= best[2]:
+            break  # starts in this gap and every later one come after the best
+        start = first_fit(intersect_gaps(gaps, [(lo, hi)]), first, last, duration, date, zone)
+        if start is None or (best is not None and (start, index) >= best[:2]):
+            continue
+        slot = make_slot(date, to_hhmm(start), to_hhmm(start + duration), zone)
+        if room_is_free(rooms[index], slot["periods"], owner):
+            best = (start, index, timezones.local_to_utc(zone, date, start), slot)
+    return (rooms[best[1]], best[3]) if best is not None else None
+
+
+def find_quorum_slots(date_range: List[str], required: List[str], optional: List[str], min_attendance: float,
+                      duration: int = 0, window: tuple = None, calendar: WorkCalendar = None,
+                      zone: str = DEFAULT_TIMEZONE, now: datetime = None, rooms: List[Room] = None,
+                      owner: str = None) -> List[Dict]:
+    """Rank slots by how many attendees can come, with every required attendee free.
+
+    With a duration the search covers the window (or working hours) from
+    `now` on, like find_duration_slots; without one the whole window is the
+    meeting. With `rooms`, slots no room can host are skipped before the
+    list is cut to QUORUM_MAX_SLOTS.
+    """
+    calendar = calendar or tenants.current().calendar
+    store = tenants.current().store
+    users = list(dict.fromkeys(required + optional))
+    min_count = quorum.min_attendance_count(len(users), min_attendance, len(set(required)))
+
+    candidates = []
+    for date in date_range:
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+        hours = calendar.working_hours.get(day.weekday())
+        if hours is None or not calendar.is_working_day(day):
+            continue
+        if duration:
+            lo, hi = hours
+            if window:
+                lo, hi = max(lo, to_minutes(window[0])), min(hi, to_minutes(window[1]))
+            lo = not_before_now(date, lo, zone, now)
+        else:
+            lo, hi = to_minutes(window[0]), to_minutes(window[1])
+            if not calendar.fits_hours(day, lo, hi):
+                continue
+        first, last = timezones.local_to_utc(zone, date, lo), timezones.local_to_utc(zone, date, hi)
+        length = timezones.local_to_utc(zone, date, lo + duration) - first if duration else last - first
+        if length <= 0 or first + length > last:
+            continue
+
+        busy = {user: [] for user in users}
+        for utc_date, _, _ in timezones.split_utc(first, last):
+            base = timezones.day_start(utc_date)
+            for user in users:
+                busy[user].extend(quorum.busy_from_gaps(store.free_gaps(user, utc_date), base))
+
+        for run_lo, run_hi, attendance in quorum.quorum_windows(busy, set(required), first, last, length, min_count):
+            start = timezones.local_minute(zone, date, run_lo)
+            if duration:
+                start = -(-start // 15) * 15
+                if timezones.local_to_utc(zone, date, start) > run_hi:
+                    continue
+            candidates.append((-attendance, date, start))
+
+    slots = []
+    for negative_attendance, date, start in sorted(candidates):
+        if len(slots) >= quorum.QUORUM_MAX_SLOTS:
+            break
+        end = start + duration if duration else to_minutes(window[1])
+        slot = make_slot(date, to_hhmm(start), to_hhmm(end), zone)
+        if rooms is not None and not assign_rooms([slot], rooms, owner):
+            continue
+        slot["attendees"] = [
+            user for user in users
+            if all(store.is_free(user, utc_date, to_minutes(s), to_minutes(e)) for utc_date, s, e in slot["periods"])
+        ]
+        slot["attendance"] = -negative_attendance
+        slot["total"] = len(users)
+        slots.append(slot)
+    return slots
+
 
 def generate_date_range(start_date: str, end_date: str) -> List[str]:
     """Generate a list of dates between start_date and end_date (inclusive)."""
@@ -133,6 +444,7 @@ def generate_date_range(start_date: str, end_date: str) -> List[str]:
     
     return date_range
 
+
 def create_login_message():
     """Create the main menu message."""
     return TextSendMessage(
@@ -143,6 +455,7 @@ def create_login_message():
         ])
     )
 
+
 def create_main_menu_message():
     """Create the main menu message."""
     return TextSendMessage(
@@ -155,6 +468,7 @@ def create_main_menu_message():
         ])
     )
 
+
 def create_calendar_flex_message(user_id):
     """Create a calendar date picker flex message."""
     # This is a simplified version, you would need to create a proper calendar UI in production
@@ -214,6 +528,7 @@ def create_calendar_flex_message(user_id):
         }
     )
 
+
 def create_user_selection_flex_message(user_id):
     """Create a user selection flex message."""
     items = []
@@ -305,7 +620,8 @@ def create_user_selection_flex_message(user_id):
         }
     )
 
-def create_meeting_summary_flex_message(user_id, meeting_data):
+
+def create_meeting_summary_flex_message(user_id, meeting: MeetingDraft):
     """Create a meeting summary flex message."""
 
     return FlexSendMessage(
@@ -340,7 +656,7 @@ def create_meeting_summary_flex_message(user_id, meeting_data):
                                     },
                                     {
                                         "type": "text",
-                                        "text": meeting_data["name"],
+                                        "text": meeting.name,
                                         "wrap": True,
                                         "flex": 5
                                     }
@@ -359,7 +675,7 @@ def create_meeting_summary_flex_message(user_id, meeting_data):
                                     },
                                     {
                                         "type": "text",
-                                        "text": meeting_data["date"],
+                                        "text": meeting.date,
                                         "wrap": True
                                     }
                                 ]
@@ -377,11 +693,31 @@ def create_meeting_summary_flex_message(user_id, meeting_data):
                                     },
                                     {
                                         "type": "text",
-                                        "text": f"{meeting_data['start_time']} - {meeting_data['end_time']}",
+                                        "text": f"{meeting.start_time} - {meeting.end_time}",
                                         "wrap": True
                                     }
                                 ]
                             },
+                            *([
+                                {
+                                    "type": "box",
+                                    "layout": "baseline",
+                                    "contents": [
+                                        {
+                                            "type": "text",
+                                            "text": "🚪 ห้อง: ",
+                                            "weight": "bold",
+                                            "margin": "sm",
+                                            "flex": 0
+                                        },
+                                        {
+                                            "type": "text",
+                                            "text": meeting.room_name,
+                                            "wrap": True
+                                        }
+                                    ]
+                                }
+                            ] if meeting.room_name else []),
                             {
                                 "type": "box",
                                 "layout": "vertical",
@@ -400,7 +736,7 @@ def create_meeting_summary_flex_message(user_id, meeting_data):
                                             "wrap": True,
                                             "margin": "sm"
                                         }
-                                        for attendee in meeting_data["attendees"]
+                                        for attendee in meeting.selected_users
                                     ]
                                 ]
                             }
@@ -459,7 +795,9 @@ def create_available_slots_flex_message(user_id, available_slots):
             "contents": [
                 {
                     "type": "text",
-                    "text": f"{i+1}️⃣ {date_format} เวลา {slot['start_time']} - {slot['end_time']}",
+                    "text": f"{i+1}️⃣ {date_format} เวลา {slot['start_time']} - {slot['end_time']}"
+                            + (f" (ว่าง {slot['attendance']}/{slot['total']} คน)" if "attendance" in slot else "")
+                            + (f"\n🚪 ห้อง {slot['room_name']}" if slot.get("room_name") else ""),
                     "wrap": True,
                     "size": "sm",
                     "weight": "regular"
@@ -505,494 +843,694 @@ def create_available_slots_flex_message(user_id, available_slots):
             }
         }
     )
-    
-@handler.add(MessageEvent, message=TextMessage)
+
+
+# Postback actions that run an availability search
+HEAVY_POSTBACK_ACTIONS = {"confirm_users"}
+
+
+def dispatch_event(event):
+    """Route a parsed webhook event to its handler."""
+    if isinstance(event, MessageEvent) and isinstance(event.message, TextMessage):
+        with tracing.span("text message"):
+            handle_text_message(event)
+    elif isinstance(event, PostbackEvent):
+        with tracing.span("postback", action=postback_action(event.postback.data)):
+            handle_postback(event)
+
+
+def is_heavy_event(event) -> bool:
+    """Check whether an event triggers expensive work (calendar fetch and slot search)."""
+    if isinstance(event, PostbackEvent):
+        return postback_action(event.postback.data) in HEAVY_POSTBACK_ACTIONS
+    if isinstance(event, MessageEvent) and isinstance(event.message, TextMessage):
+        return is_meeting_request(getattr(event.source, "user_id", None), event.message.text)
+    return False
+
+
+def is_meeting_request(user_id, text: str) -> bool:
+    """Whether this text starts a one-message meeting search (see on_main_menu_text)."""
+    session = user_sessions.get(user_id)
+    if session is not None and session.state != MAIN_MENU:
+        return False
+    return parse_meeting_request(text, timezones.today(user_timezone(user_id))) is not None
+
+
+def reply_busy(event):
+    """Tell the user their request was dropped because the system is overloaded."""
+    reply_token = getattr(event, "reply_token", None)
+    if reply_token:
+        line_bot_api.reply_message(
+            reply_token,
+            TextSendMessage(text="⏳ ขณะนี้มีผู้ใช้งานจำนวนมาก กรุณาลองใหม่อีกครั้งในภายหลัง")
+        )
+
+
+conversation = StateMachine()
+
+
+def reset_session(session: Session) -> str:
+    """Release the session's slot holds and return to the main menu."""
+    release_offers(session)
+    if session.hold_id:
+        reservations.release(session.hold_id)
+    return session.reset()
+
+
+def release_offers(session: Session, keep: str = ""):
+    """Release the holds on offered slots, except the hold `keep`."""
+    for slot in session.available_slots or ():
+        if slot.get("hold_id") and slot["hold_id"] != keep:
+            reservations.release(slot["hold_id"])
+
+
+def get_session(user_id) -> Session:
+    """Get the user's session, creating one at the main menu if needed."""
+    session = user_sessions.get(user_id)
+    if session is None:
+        session = user_sessions[user_id] = Session()
+    return session
+
+
+# Text commands that are accepted in any state
+TEXT_COMMANDS = {
+    "เพิ่มอีเมล": "add_email",
+    "นัดประชุม": "create_meeting",
+    "สร้างนัดประชุม": "create_meeting",
+}
+
+TIMEZONE_COMMANDS = ("timezone", "เขตเวลา")
+
+
 def handle_text_message(event):
     user_id = event.source.user_id
     text = event.message.text
+    session = get_session(user_id)
 
-    
-    # Initialize user session if not exists
-    if user_id not in user_sessions:
-        user_sessions[user_id] = {"step": "main_menu"}
-        
-        
-    if text.lower() == "เพิ่มอีเมล":
-        user_sessions[user_id] = {
-            "step": "enter_email",
-        }
+    command = TEXT_COMMANDS.get(text.lower(), TEXT_EVENT)
+    if not conversation.dispatch(session, command, event, user_id, text):
+        # Default response
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text="กรุณากรอกอีเมลที่ต้องการเพิ่มเข้าระบบ:")
+            create_main_menu_message()
         )
-    
-    # Main menu or trigger command
-    if text.lower() == "นัดประชุม" or text.lower() == "สร้างนัดประชุม":
-        user_sessions[user_id] = {
-            "step": "enter_meeting_name",
-            "meeting_data": {}
-        }
+
+
+def handle_postback(event):
+    if profiler.is_sampled():
+        with profiler.sampling(f"postback {postback_action(event.postback.data)}"):
+            return _handle_postback(event)
+    return _handle_postback(event)
+
+
+def _handle_postback(event):
+    user_id = event.source.user_id
+    action, arg = parse_postback(event.postback.data)
+    session = get_session(user_id)
+
+    if not conversation.dispatch(session, action, event, user_id, arg):
+        # Stale button from an earlier step
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text="กรุณากรอกชื่อการประชุม:")
+            TextSendMessage(text="ขออภัย ไม่สามารถทำรายการนี้ได้ในขั้นตอนปัจจุบัน")
         )
-    
-     # Add this new condition for handling email input
-    elif user_sessions[user_id]["step"] == "enter_email":
-        # Save email and proceed to confirmation
-        email = text.strip()
-        # Validate email format
-        if not validate_email(email):
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text="รูปแบบอีเมลไม่ถูกต้อง กรุณากรอกอีเมลใหม่")
-            )
-            return
-        user_sessions[user_id]["email"] = email
-        user_sessions[user_id]["step"] = "confirm_email"
-        
-        
-        # Display confirmation message with buttons
+
+
+@conversation.on("add_email")
+def on_add_email(session, event, user_id, text):
+    reset_session(session)
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text="กรุณากรอกอีเมลที่ต้องการเพิ่มเข้าระบบ:")
+    )
+    return ENTER_EMAIL
+
+
+@conversation.on("create_meeting")
+def on_create_meeting(session, event, user_id, text):
+    reset_session(session)
+    session.meeting = MeetingDraft()
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text="กรุณากรอกชื่อการประชุม:")
+    )
+    return ENTER_MEETING_NAME
+
+
+@conversation.on(TEXT_EVENT, ENTER_EMAIL)
+def on_enter_email(session, event, user_id, text):
+    # Save email and proceed to confirmation
+    email = text.strip()
+    # Validate email format
+    if not validate_email(email):
         line_bot_api.reply_message(
             event.reply_token,
-            FlexSendMessage(
-                alt_text="ยืนยันการเพิ่มอีเมล",
-                contents={
-                    "type": "bubble",
-                    "body": {
-                        "type": "box",
-                        "layout": "vertical",
-                        "contents": [
-                            {
-                                "type": "text",
-                                "text": "ยืนยันการเพิ่มอีเมล",
-                                "weight": "bold",
-                                "size": "lg"
-                            },
-                            {
-                                "type": "text",
-                                "text": f"อีเมล: {email}",
-                                "margin": "md",
-                                "wrap": True
+            TextSendMessage(text="รูปแบบอีเมลไม่ถูกต้อง กรุณากรอกอีเมลใหม่")
+        )
+        return None
+    session.email = email
+
+    # Display confirmation message with buttons
+    line_bot_api.reply_message(
+        event.reply_token,
+        FlexSendMessage(
+            alt_text="ยืนยันการเพิ่มอีเมล",
+            contents={
+                "type": "bubble",
+                "body": {
+                    "type": "box",
+                    "layout": "vertical",
+                    "contents": [
+                        {
+                            "type": "text",
+                            "text": "ยืนยันการเพิ่มอีเมล",
+                            "weight": "bold",
+                            "size": "lg"
+                        },
+                        {
+                            "type": "text",
+                            "text": f"อีเมล: {email}",
+                            "margin": "md",
+                            "wrap": True
+                        },
+                        {
+                            "type": "text",
+                            "text": "คุณต้องการเพิ่มอีเมลนี้เข้าระบบใช่หรือไม่?",
+                            "margin": "md"
+                        }
+                    ]
+                },
+                "footer": {
+                    "type": "box",
+                    "layout": "vertical",
+                    "contents": [
+                        {
+                            "type": "button",
+                            "action": {
+                                "type": "postback",
+                                "label": "✅ ยืนยัน",
+                                "data": f"confirm_add_email_{user_id}"
                             },
-                            {
-                                "type": "text",
-                                "text": "คุณต้องการเพิ่มอีเมลนี้เข้าระบบใช่หรือไม่?",
-                                "margin": "md"
-                            }
-                        ]
-                    },
-                    "footer": {
-                        "type": "box",
-                        "layout": "vertical",
-                        "contents": [
-                            {
-                                "type": "button",
-                                "action": {
-                                    "type": "postback",
-                                    "label": "✅ ยืนยัน",
-                                    "data": f"confirm_add_email_{user_id}"
-                                },
-                                "style": "primary"
+                            "style": "primary"
+                        },
+                        {
+                            "type": "button",
+                            "action": {
+                                "type": "postback",
+                                "label": "🔄 แก้ไขอีเมล",
+                                "data": f"edit_email_{user_id}"
                             },
-                            {
-                                "type": "button",
-                                "action": {
-                                    "type": "postback",
-                                    "label": "🔄 แก้ไขอีเมล",
-                                    "data": f"edit_email_{user_id}"
-                                },
-                                "style": "secondary",
-                                "margin": "md"
+                            "style": "secondary",
+                            "margin": "md"
+                        },
+                        {
+                            "type": "button",
+                            "action": {
+                                "type": "postback",
+                                "label": "❌ ยกเลิก",
+                                "data": f"cancel_add_email_{user_id}"
                             },
-                            {
-                                "type": "button",
-                                "action": {
-                                    "type": "postback",
-                                    "label": "❌ ยกเลิก",
-                                    "data": f"cancel_add_email_{user_id}"
-                                },
-                                "style": "secondary",
-                                "margin": "md"
-                            }
-                        ]
-                    }
+                            "style": "secondary",
+                            "margin": "md"
+                        }
+                    ]
                 }
-            )
-        )
-        add_user_email(email)
-    
-    # Handle user input based on current step
-    elif user_sessions[user_id]["step"] == "enter_meeting_name":
-        # Save meeting name and proceed to date selection
-        user_sessions[user_id]["meeting_data"]["name"] = text
-        user_sessions[user_id]["step"] = "select_date"
-        
-        # Display confirmation and calendar
-        line_bot_api.reply_message(
-            event.reply_token,
-            [
-                TextSendMessage(text=f"ชื่อการประชุม: {text}"),
-                create_calendar_flex_message(user_id)
-            ]
+            }
         )
-    
-    elif user_sessions[user_id]["step"] == "enter_time":
-        try:
-            # Parse time range
-            start_time, end_time = parse_time_range(text)
-            
-            # Save time range
-            user_sessions[user_id]["meeting_data"]["start_time"] = start_time
-            user_sessions[user_id]["meeting_data"]["end_time"] = end_time
-            user_sessions[user_id]["step"] = "select_attendees"
-            
-            # Display confirmation and attendee selection
-            line_bot_api.reply_message(
-                event.reply_token,
-                [
-                    TextSendMessage(text=f"ช่วงเวลาที่ต้องการ: {start_time} - {end_time}"),
-                    create_user_selection_flex_message(user_id)
-                ]
-            )
-        except ValueError as e:
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text=f"ขออภัย: {str(e)}\nกรุณากรอกข้อมูลในรูปแบบ '13:00 - 14:00'")
-            )
-    
-    elif user_sessions[user_id]["step"] == "main_menu":
-        # Handle main menu options
-        if text == "ดูนัดประชุมที่มี":
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text="คุณยังไม่มีนัดประชุมที่กำลังจะมาถึง")
-            )
-        elif text == "วิธีใช้งาน":
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text="พิมพ์ 'นัดประชุม' เพื่อเริ่มสร้างนัดประชุมใหม่\nคุณสามารถเลือกวันที่ เวลา และผู้เข้าร่วมได้")
-            )
-        else:
-            line_bot_api.reply_message(
-                event.reply_token,
-                create_main_menu_message()
-            )
-    
-    else:
-        # Default response
+    )
+    add_user_email(email)
+    return CONFIRM_EMAIL
+
+
+@conversation.on(TEXT_EVENT, ENTER_MEETING_NAME)
+def on_enter_meeting_name(session, event, user_id, text):
+    # Save meeting name and proceed to date selection
+    session.meeting.name = text
+
+    # Display confirmation and calendar
+    line_bot_api.reply_message(
+        event.reply_token,
+        [
+            TextSendMessage(text=f"ชื่อการประชุม: {text}"),
+            create_calendar_flex_message(user_id)
+        ]
+    )
+    return SELECT_DATE
+
+
+@conversation.on(TEXT_EVENT, ENTER_TIME)
+def on_enter_time(session, event, user_id, text):
+    # Parse time range
+    time_range = parse_time_range(text)
+    if time_range is None:
         line_bot_api.reply_message(
             event.reply_token,
-            create_main_menu_message()
+            TextSendMessage(text="ขออภัย: รูปแบบช่วงเวลาไม่ถูกต้อง\nกรุณากรอกข้อมูลในรูปแบบ '13:00 - 14:00'")
         )
+        return None
+    start_time, end_time = time_range
 
-@handler.add(PostbackEvent)
-def handle_postback(event):
-    user_id = event.source.user_id
-    data = event.postback.data
-    
-    # Initialize user session if not exists
-    if user_id not in user_sessions:
-        user_sessions[user_id] = {"step": "main_menu"}
-    
-        # Handle email confirmation
-    if data.startswith("confirm_add_email_"):
-        email = user_sessions[user_id].get("email", "")
-        if not email:
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text="ไม่พบอีเมลที่ต้องการเพิ่ม กรุณาลองใหม่อีกครั้ง")
-            )
-            return
-        encoded_email = quote(email)
-        # Create Google API URL (FastAPI endpoint)
-        api_url = f"https://0bf4-49-228-96-87.ngrok-free.app/{encoded_email}"
-        
-        print(api_url)
-        # Tell user they'll be redirected
+    # Save time range
+    session.meeting.start_time = start_time
+    session.meeting.end_time = end_time
+
+    # Display confirmation and attendee selection
+    line_bot_api.reply_message(
+        event.reply_token,
+        [
+            TextSendMessage(text=f"ช่วงเวลาที่ต้องการ: {start_time} - {end_time}"),
+            create_user_selection_flex_message(user_id)
+        ]
+    )
+    return SELECT_ATTENDEES
+
+
+@conversation.on(TEXT_EVENT, MAIN_MENU)
+def on_main_menu_text(session, event, user_id, text):
+    # A whole meeting request in one message skips the step-by-step flow
+    request = parse_meeting_request(text, timezones.today(user_timezone(user_id)))
+    if request is not None:
+        return start_meeting_from_request(session, event, user_id, request)
+
+    # "timezone Asia/Tokyo" sets the organizer's zone for searches and invites
+    words = text.split()
+    if len(words) == 2 and words[0].lower() in TIMEZONE_COMMANDS:
+        return set_user_timezone(event, user_id, words[1])
+
+    # Handle main menu options
+    if text == "ดูนัดประชุมที่มี":
         line_bot_api.reply_message(
             event.reply_token,
-            FlexSendMessage(
-                alt_text="เพิ่มอีเมลสำเร็จ",
-                contents={
-                    "type": "bubble",
-                    "body": {
-                        "type": "box",
-                        "layout": "vertical",
-                        "contents": [
-                            {
-                                "type": "text",
-                                "text": f"อีเมล {email} ถูกเพิ่มแล้ว",
-                                "weight": "bold",
-                                "size": "lg",
-                                "wrap": True
-                            },
-                            {
-                                "type": "text",
-                                "text": "กรุณากดปุ่มด้านล่างเพื่อยืนยันการเข้าถึง Google Calendar",
-                                "margin": "md",
-                                "wrap": True
-                            }
-                        ]
-                    },
-                    "footer": {
-                        "type": "box",
-                        "layout": "vertical",
-                        "spacing": "sm",
-                        "contents": [
-                            {
-                                "type": "button",
-                                "style": "primary",
-                                "action": {
-                                    "type": "uri",
-                                    "label": "🔗 ยืนยันผ่าน Google",
-                                    "uri": api_url
-                                }
-                            }
-                        ]
-                    }
-                }
-            )
+            TextSendMessage(text="คุณยังไม่มีนัดประชุมที่กำลังจะมาถึง")
         )
-        # Reset user session
-        user_sessions[user_id] = {"step": "main_menu"}
-        
-    
-    # Handle email edit request
-    elif data.startswith("edit_email_"):
-        user_sessions[user_id]["step"] = "enter_email"
+    elif text == "วิธีใช้งาน":
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text="กรุณากรอกอีเมลใหม่อีกครั้ง:")
+            TextSendMessage(text="พิมพ์ 'นัดประชุม' เพื่อเริ่มสร้างนัดประชุมใหม่\nคุณสามารถเลือกวันที่ เวลา และผู้เข้าร่วมได้\n\nหรือพิมพ์ทั้งหมดในข้อความเดียว เช่น\n'ประชุมทีม พรุ่งนี้ถึงศุกร์ 13:00-14:00 กับ a@x.com, b@y.com'\n'ประชุมงบประมาณ สัปดาห์หน้า 1 ชั่วโมง กับ a@x.com'")
         )
-    
-    # Handle email cancellation
-    elif data.startswith("cancel_add_email_"):
-        # Reset user session
-        user_sessions[user_id] = {"step": "main_menu"}
-        
+    else:
         line_bot_api.reply_message(
             event.reply_token,
-            [
-                TextSendMessage(text="❌ ยกเลิกการเพิ่มอีเมลเรียบร้อยแล้ว"),
-                create_main_menu_message()
-            ]
+            create_main_menu_message()
         )
-    
-    # Handle date selection
-    if data.startswith("start_date_"):
-        # Save start date
-        date = event.postback.params["date"]
-        user_sessions[user_id]["meeting_data"]["start_date"] = date
+
+
+def set_user_timezone(event, user_id, zone: str):
+    if not timezones.is_valid_zone(zone):
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text=f"วันที่เริ่มต้น: {date}")
+            TextSendMessage(text=f"ไม่รู้จักเขตเวลา {zone}\nกรุณาระบุเป็นชื่อ IANA เช่น Asia/Bangkok หรือ Europe/London")
         )
-    
-    elif data.startswith("end_date_"):
-        # Save end date and proceed to time input
-        date = event.postback.params["date"]
-        user_sessions[user_id]["meeting_data"]["end_date"] = date
-        user_sessions[user_id]["step"] = "enter_time"
-        
-        # Format dates for display
-        start_date = user_sessions[user_id]["meeting_data"].get("start_date", date)
-        
-        # Display confirmation
-        start_display = datetime.strptime(start_date, "%Y-%m-%d").strftime("%d/%m/%Y")
-        end_display = datetime.strptime(date, "%Y-%m-%d").strftime("%d/%m/%Y")
-        
-        if start_date == date:
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text=f"วันที่ประชุม: {start_display}\n\nกรุณาระบุช่วงเวลาที่ต้องการจัดประชุม\n(เช่น 13:00 - 14:00)")
-            )
-        else:
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text=f"ช่วงวันที่ประชุม: {start_display} ถึง {end_display}\n\nกรุณาระบุช่วงเวลาที่ต้องการจัดประชุม\n(เช่น 13:00 - 14:00)")
-            )
-    
-    # Handle user selection
-    elif data.startswith("select_user_"):
-        parts = data.split("_")
-        email = parts[-1]
-        
-        if "selected_users" not in user_sessions[user_id]["meeting_data"]:
-            user_sessions[user_id]["meeting_data"]["selected_users"] = []
-        
-        if email not in user_sessions[user_id]["meeting_data"]["selected_users"]:
-            user_sessions[user_id]["meeting_data"]["selected_users"].append(email)
-        
+        return None
+    tenants.current().timezones[user_id] = zone
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text=f"ตั้งค่าเขตเวลาเป็น {zone} เรียบร้อยแล้ว")
+    )
+
+
+# Handle email confirmation
+@conversation.on("confirm_add_email", CONFIRM_EMAIL)
+def on_confirm_add_email(session, event, user_id, arg):
+    email = session.email
+    if not email:
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text=f"เลือก {email} เรียบร้อยแล้ว")
+            TextSendMessage(text="ไม่พบอีเมลที่ต้องการเพิ่ม กรุณาลองใหม่อีกครั้ง")
         )
-    
-    elif data.startswith("confirm_users_"):
-        # Proceed to availability check
-        if "selected_users" not in user_sessions[user_id]["meeting_data"] or not user_sessions[user_id]["meeting_data"]["selected_users"]:
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text="กรุณาเลือกผู้เข้าร่วมอย่างน้อย 1 คน")
-            )
-            return
-        
+        return None
+    encoded_email = quote(email)
+    # Create Google API URL (FastAPI endpoint)
+    api_url = f"https://0bf4-49-228-96-87.ngrok-free.app/{encoded_email}"
+
+    logger.info("google auth link created", extra={"user_id": user_id, "url": api_url})
+    # Tell user they'll be redirected
+    line_bot_api.reply_message(
+        event.reply_token,
+        FlexSendMessage(
+            alt_text="เพิ่มอีเมลสำเร็จ",
+            contents={
+                "type": "bubble",
+                "body": {
+                    "type": "box",
+                    "layout": "vertical",
+                    "contents": [
+                        {
+                            "type": "text",
+                            "text": f"อีเมล {email} ถูกเพิ่มแล้ว",
+                            "weight": "bold",
+                            "size": "lg",
+                            "wrap": True
+                        },
+                        {
+                            "type": "text",
+                            "text": "กรุณากดปุ่มด้านล่างเพื่อยืนยันการเข้าถึง Google Calendar",
+                            "margin": "md",
+                            "wrap": True
+                        }
+                    ]
+                },
+                "footer": {
+                    "type": "box",
+                    "layout": "vertical",
+                    "spacing": "sm",
+                    "contents": [
+                        {
+                            "type": "button",
+                            "style": "primary",
+                            "action": {
+                                "type": "uri",
+                                "label": "🔗 ยืนยันผ่าน Google",
+                                "uri": api_url
+                            }
+                        }
+                    ]
+                }
+            }
+        )
+    )
+    return reset_session(session)
+
+
+# Handle email edit request
+@conversation.on("edit_email", CONFIRM_EMAIL)
+def on_edit_email(session, event, user_id, arg):
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text="กรุณากรอกอีเมลใหม่อีกครั้ง:")
+    )
+    return ENTER_EMAIL
+
+
+# Handle email cancellation
+@conversation.on("cancel_add_email", CONFIRM_EMAIL)
+def on_cancel_add_email(session, event, user_id, arg):
+    line_bot_api.reply_message(
+        event.reply_token,
+        [
+            TextSendMessage(text="❌ ยกเลิกการเพิ่มอีเมลเรียบร้อยแล้ว"),
+            create_main_menu_message()
+        ]
+    )
+    return reset_session(session)
+
+
+# Handle date selection
+@conversation.on("start_date", SELECT_DATE, ENTER_TIME)
+def on_start_date(session, event, user_id, arg):
+    date = event.postback.params["date"]
+    session.meeting.start_date = date
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text=f"วันที่เริ่มต้น: {date}")
+    )
+
+
+@conversation.on("end_date", SELECT_DATE, ENTER_TIME)
+def on_end_date(session, event, user_id, arg):
+    # Save end date and proceed to time input
+    date = event.postback.params["date"]
+    session.meeting.end_date = date
+
+    # Format dates for display
+    start_date = session.meeting.start_date or date
+
+    # Display confirmation
+    start_display = datetime.strptime(start_date, "%Y-%m-%d").strftime("%d/%m/%Y")
+    end_display = datetime.strptime(date, "%Y-%m-%d").strftime("%d/%m/%Y")
+
+    if start_date == date:
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text="กำลังตรวจสอบเวลาว่างของผู้เข้าร่วมประชุม...")
+            TextSendMessage(text=f"วันที่ประชุม: {start_display}\n\nกรุณาระบุช่วงเวลาที่ต้องการจัดประชุม\n(เช่น 13:00 - 14:00)")
         )
-        
-        # Get meeting data
-        meeting_data = user_sessions[user_id]["meeting_data"]
-        start_date = meeting_data["start_date"]
-        end_date = meeting_data["end_date"]
-        start_time = meeting_data["start_time"]
-        end_time = meeting_data["end_time"]
-        selected_users = meeting_data["selected_users"]
-        
-        # Generate date range
-        date_range = generate_date_range(start_date, end_date)
-        time_range = f"{start_time} - {end_time}"
-        
-        # Find available slots
-        available_slots = find_available_slots(date_range, time_range, selected_users)
-        
-        if not available_slots:
-            # No available slots
-            line_bot_api.push_message(
-                user_id,
-                TextSendMessage(
-                    text="❌ ไม่สามารถนัดประชุมได้ในวันและเวลานี้\nกรุณาเลือกวันและเวลาใหม่อีกครั้ง",
-                    quick_reply=QuickReply(items=[
-                        QuickReplyButton(action=MessageAction(label="เลือกวันเวลาใหม่", text="สร้างนัดประชุม"))
-                    ])
-                )
-            )
-        elif len(available_slots) == 1:
-            # Only one slot available, proceed to confirmation
-            slot = available_slots[0]
-            meeting_data["date"] = slot["date"]
-            meeting_data["start_time"] = slot["start_time"]
-            meeting_data["end_time"] = slot["end_time"]
-            meeting_data["attendees"] = selected_users
-            
-            user_sessions[user_id]["step"] = "confirm_meeting"
-            
-            # Format date for display
-            date_display = datetime.strptime(slot["date"], "%Y-%m-%d").strftime("%d/%m/%Y")
-            meeting_data["date_display"] = date_display
-            
-            line_bot_api.push_message(
-                user_id,
-                create_meeting_summary_flex_message(user_id, meeting_data)
-            )
-        else:
-            # Multiple slots available, let user choose
-            user_sessions[user_id]["available_slots"] = available_slots
-            user_sessions[user_id]["step"] = "select_slot"
-            
-            line_bot_api.push_message(
-                user_id,
-                create_available_slots_flex_message(user_id, available_slots)
-            )
-    
-    # Handle slot selection
-    elif data.startswith("select_slot_"):
-        parts = data.split("_")
-        slot_index = int(parts[-1])
-        
-        available_slots = user_sessions[user_id]["available_slots"]
-        if slot_index < 0 or slot_index >= len(available_slots):
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text="ขออภัย เกิดข้อผิดพลาด กรุณาลองใหม่อีกครั้ง")
-            )
-            return
-        
-        # Get selected slot
-        slot = available_slots[slot_index]
-        meeting_data = user_sessions[user_id]["meeting_data"]
-        
-        # Update meeting data
-        meeting_data["date"] = slot["date"]
-        meeting_data["start_time"] = slot["start_time"]
-        meeting_data["end_time"] = slot["end_time"]
-        meeting_data["attendees"] = meeting_data["selected_users"]
-        
-        user_sessions[user_id]["step"] = "confirm_meeting"
-        
-        # Format date for display
-        date_display = datetime.strptime(slot["date"], "%Y-%m-%d").strftime("%d/%m/%Y")
-        meeting_data["date_display"] = date_display
-        
+    else:
         line_bot_api.reply_message(
             event.reply_token,
-            create_meeting_summary_flex_message(user_id, meeting_data)
+            TextSendMessage(text=f"ช่วงวันที่ประชุม: {start_display} ถึง {end_display}\n\nกรุณาระบุช่วงเวลาที่ต้องการจัดประชุม\n(เช่น 13:00 - 14:00)")
         )
-    
-    # Handle meeting confirmation
-    elif data.startswith("confirm_meeting_"):
-        # Create meeting
-        meeting_data = user_sessions[user_id]["meeting_data"]
-        
-        # Format date and time for API
-        date = meeting_data["date"]  # Already in YYYY-MM-DD format
-        start_time = meeting_data["start_time"]  # In HH:MM format
-        end_time = meeting_data["end_time"]  # In HH:MM format
-        
-        # Create ISO format datetime
-        start_datetime = f"{date}T{start_time}:00+07:00"
-        end_datetime = f"{date}T{end_time}:00+07:00"
-        
-        # Create meeting result
-        meeting_result = MeetingResult(
-            user_emails=meeting_data["attendees"],
-            summary=meeting_data["name"],
-            description="",
-            location="",
-            start_time=start_datetime,
-            end_time=end_datetime,
-            attendees=[]
-        )
-        # ส่ง POST ไปยัง FastAPI server
+    return ENTER_TIME
+
+
+# Handle user selection
+@conversation.on("select_user", SELECT_ATTENDEES)
+def on_select_user(session, event, user_id, email):
+    if email not in session.meeting.selected_users:
+        session.meeting.selected_users.append(email)
+
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text=f"เลือก {email} เรียบร้อยแล้ว")
+    )
 
-        
-        # Reset user session
-        user_sessions[user_id] = {"step": "main_menu"}
-        
-        # Send confirmation
+
+@conversation.on("confirm_users", SELECT_ATTENDEES)
+def on_confirm_users(session, event, user_id, arg):
+    # Proceed to availability check
+    meeting = session.meeting
+    if not meeting.selected_users:
         line_bot_api.reply_message(
             event.reply_token,
-            [
-                TextSendMessage(text="✅ การนัดหมายถูกสร้างเรียบร้อยแล้ว! ขอบคุณที่ใช้ระบบนัดประชุมอัตโนมัติของเรา 🙏"),
+            TextSendMessage(text="กรุณาเลือกผู้เข้าร่วมอย่างน้อย 1 คน")
+        )
+        return None
+
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text="กำลังตรวจสอบเวลาว่างของผู้เข้าร่วมประชุม...")
+    )
+
+    message, next_state = offer_slots(session, user_id)
+    line_bot_api.push_message(user_id, message)
+    return next_state
+
 
-            ]
+@tracing.traced("find slots")
+def find_meeting_slots(meeting: MeetingDraft, user_id) -> List[Dict]:
+    """Search the draft's dates for slots, skipping those another organizer is holding."""
+    # Refresh attendees' calendars (all at once, skipping fresh ones)
+    schedule_store.refresh_snapshot()
+    calendar_fetcher.fetch(
+        meeting.selected_users + meeting.optional_users, tenants.current().store, tenants.current().timezones
+    )
+
+    # Generate date range
+    date_range = generate_date_range(meeting.start_date or meeting.end_date, meeting.end_date)
+    zone = user_timezone(user_id)
+    window = (meeting.start_time, meeting.end_time) if meeting.start_time else None
+
+    # Rooms big enough and equipped as asked, straight from the capacity index
+    rooms = None
+    if meeting.room_capacity:
+        rooms = tenants.current().rooms.candidates(meeting.room_capacity, meeting.room_attributes)
+        if not rooms:
+            return []
+
+    if meeting.optional_users or meeting.min_attendance < 1:
+        slots = find_quorum_slots(
+            date_range, meeting.selected_users, meeting.optional_users, meeting.min_attendance,
+            meeting.duration, window, zone=zone, rooms=rooms, owner=user_id
         )
-        threading.Thread(target=send_post, args=(meeting_result,)).start() #send to fastapi
-    
-    # Handle meeting edit
-    elif data.startswith("edit_meeting_"):
-        # Reset to start of meeting creation
-        user_sessions[user_id] = {
-            "step": "enter_meeting_name",
-            "meeting_data": {}
-        }
-        
+    elif meeting.duration:
+        slots = find_duration_slots(
+            date_range, meeting.duration, meeting.selected_users, window, zone=zone, rooms=rooms, owner=user_id
+        )
+    else:
+        time_range = f"{meeting.start_time} - {meeting.end_time}"
+        # The generation the primary engine saw, read before it runs
+        store = tenants.current().store
+        started_generation = store.generation
+        started = time.perf_counter()
+        slots = find_available_slots(date_range, time_range, meeting.selected_users, zone=zone)
+        # Sampled re-run on the candidate engine, off the response path
+        shadow.runner.compare(
+            slots, time.perf_counter() - started,
+            {"date_range": date_range, "time_range": time_range, "users": list(meeting.selected_users), "zone": zone},
+            lambda: store.generation, started_generation
+        )
+        if rooms is not None:
+            slots = assign_rooms(slots, rooms, owner=user_id)
+
+    return [
+        slot for slot in slots
+        if not reservations.is_held(slot.get("attendees", meeting.selected_users), slot["periods"], owner=user_id)
+    ]
+
+
+def offer_slots(session: Session, user_id):
+    """Find slots for the session's draft; returns (message, next state)."""
+    release_offers(session)
+    session.available_slots = None
+    available_slots = find_meeting_slots(session.meeting, user_id)
+
+    if not available_slots:
+        # No available slots
+        return TextSendMessage(
+            text="❌ ไม่สามารถนัดประชุมได้ในวันและเวลานี้\nกรุณาเลือกวันและเวลาใหม่อีกครั้ง",
+            quick_reply=QuickReply(items=[
+                QuickReplyButton(action=MessageAction(label="เลือกวันเวลาใหม่", text="สร้างนัดประชุม"))
+            ])
+        ), None
+
+    if len(available_slots) == 1:
+        # Only one slot available, proceed to confirmation
+        apply_slot(session, user_id, available_slots[0])
+        return create_meeting_summary_flex_message(user_id, session.meeting), CONFIRM_MEETING
+
+    # Multiple slots available, let user choose; each is held while on offer,
+    # so other organizers are not shown it in the meantime
+    for slot in available_slots:
+        slot["hold_id"] = reservations.hold(user_id, hold_users(session.meeting, slot), slot["periods"])
+    session.available_slots = available_slots
+    return create_available_slots_flex_message(user_id, available_slots), SELECT_SLOT
+
+
+def start_meeting_from_request(session: Session, event, user_id, request):
+    """Turn a parsed one-message request into a draft and answer with its slots in one reply."""
+    reset_session(session)
+    session.meeting = MeetingDraft(
+        name=request.name,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        start_time=request.start_time,
+        end_time=request.end_time,
+        duration=request.duration,
+        selected_users=request.attendees,
+        optional_users=request.optional_attendees,
+        min_attendance=request.min_attendance,
+        room_capacity=request.room_capacity,
+        room_attributes=request.room_attributes
+    )
+
+    message, next_state = offer_slots(session, user_id)
+    line_bot_api.reply_message(event.reply_token, message)
+    if next_state is None:
+        return reset_session(session)
+    return next_state
+
+
+def apply_slot(session: Session, user_id, slot: Dict):
+    """Copy the chosen slot into the meeting draft and hold it for the organizer."""
+    meeting = session.meeting
+    meeting.date = slot["date"]
+    meeting.start_time = slot["start_time"]
+    meeting.end_time = slot["end_time"]
+    meeting.room_id = slot.get("room_id", "")
+    meeting.room_name = slot.get("room_name", "")
+
+    if session.hold_id:
+        reservations.release(session.hold_id)
+    # An offered slot keeps the hold it got when it was offered
+    release_offers(session, keep=slot.get("hold_id", ""))
+    session.hold_id = slot.get("hold_id") or reservations.hold(user_id, hold_users(meeting, slot), slot["periods"])
+
+
+def hold_users(meeting: MeetingDraft, slot: Dict) -> List[str]:
+    """Schedule keys a hold on `slot` covers.
+
+    Quorum slots only block the attendees who are actually free; the room is
+    held (and later committed) together with the people.
+    """
+    users = list(slot.get("attendees", meeting.selected_users))
+    if slot.get("room_id"):
+        users.append(ROOM_KEY_PREFIX + slot["room_id"])
+    return users
+
+
+# Handle slot selection
+@conversation.on("select_slot", SELECT_SLOT)
+def on_select_slot(session, event, user_id, arg):
+    slot_index = int(arg) if arg.isdigit() else -1
+
+    available_slots = session.available_slots or []
+    if slot_index < 0 or slot_index >= len(available_slots):
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text="เริ่มสร้างนัดประชุมใหม่\nกรุณากรอกชื่อการประชุม:")
+            TextSendMessage(text="ขออภัย เกิดข้อผิดพลาด กรุณาลองใหม่อีกครั้ง")
         )
-    
-    # Handle meeting cancellation
-    elif data.startswith("cancel_meeting_"):
-        # Reset user session
-        user_sessions[user_id] = {"step": "main_menu"}
-        
+        return None
+
+    apply_slot(session, user_id, available_slots[slot_index])
+    session.available_slots = None
+
+    line_bot_api.reply_message(
+        event.reply_token,
+        create_meeting_summary_flex_message(user_id, session.meeting)
+    )
+    return CONFIRM_MEETING
+
+
+# Handle meeting confirmation
+@conversation.on("confirm_meeting", CONFIRM_MEETING)
+def on_confirm_meeting(session, event, user_id, arg):
+    meeting = session.meeting
+
+    # Create ISO format datetime with the organizer's UTC offset
+    zone = user_timezone(user_id)
+    start_datetime = timezones.local_isoformat(zone, meeting.date, meeting.start_time)
+    end_datetime = timezones.local_isoformat(zone, meeting.date, meeting.end_time)
+
+    # Create meeting result
+    meeting_result = MeetingResult(
+        user_emails=meeting.selected_users + meeting.optional_users,
+        summary=meeting.name,
+        description="",
+        location=meeting.room_name,
+        start_time=start_datetime,
+        end_time=end_datetime,
+        attendees=[]
+    )
+
+    # Re-validate the hold and block the slot in every attendee's schedule
+    committed = reservations.commit(session.hold_id)
+    session.hold_id = ""
+    if not committed:
         line_bot_api.reply_message(
             event.reply_token,
-            [
-                TextSendMessage(text="❌ ยกเลิกการนัดหมายเรียบร้อยแล้ว"),
-                create_main_menu_message()
-            ]
-        )
\ No newline at end of file
+            TextSendMessage(
+                text="❌ ช่วงเวลานี้ถูกจองไปแล้ว กรุณาเลือกวันและเวลาใหม่อีกครั้ง",
+                quick_reply=QuickReply(items=[
+                    QuickReplyButton(action=MessageAction(label="เลือกวันเวลาใหม่", text="สร้างนัดประชุม"))
+                ])
+            )
+        )
+        return reset_session(session)
+
+    # Send confirmation
+    line_bot_api.reply_message(
+        event.reply_token,
+        [
+            TextSendMessage(text="✅ การนัดหมายถูกสร้างเรียบร้อยแล้ว! ขอบคุณที่ใช้ระบบนัดประชุมอัตโนมัติของเรา 🙏"),
+
+        ]
+    )
+    # send to fastapi (in the request's context so the correlation ID follows)
+    threading.Thread(target=contextvars.copy_context().run, args=(send_post, meeting_result)).start()
+    return reset_session(session)
+
+
+# Handle meeting edit
+@conversation.on("edit_meeting", CONFIRM_MEETING)
+def on_edit_meeting(session, event, user_id, arg):
+    # Reset to start of meeting creation
+    reset_session(session)
+    session.meeting = MeetingDraft()
+
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text="เริ่มสร้างนัดประชุมใหม่\nกรุณากรอกชื่อการประชุม:")
+    )
+    return ENTER_MEETING_NAME
+
+
+# Handle meeting cancellation
+@conversation.on("cancel_meeting", CONFIRM_MEETING)
+def on_cancel_meeting(session, event, user_id, arg):
+    line_bot_api.reply_message(
+        event.reply_token,
+        [
+            TextSendMessage(text="❌ ยกเลิกการนัดหมายเรียบร้อยแล้ว"),
+            create_main_menu_message()
+        ]
+    )
+    return reset_session(session)
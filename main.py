@@ -1,32 +1,146 @@
+import startup  # first, so the import clock covers everything below
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
-from linebot.exceptions import InvalidSignatureError
 from lineChatbot import *
-import aiosmtplib
-from email.message import EmailMessage
-from test import send_email, send_post
+from test import build_meeting_message, send_meeting_email
+import profiler
+import admission
+import shadow
+import shard_search
+import tracing
+from capture import capture
+import tenants
+import webhook_events
+import logging
+from app_logging import setup_logging, new_request_id, REQUEST_ID_HEADER
 
 
 
 
+setup_logging()
+logger = logging.getLogger(__name__)
+startup.import_finished()
+
 app = FastAPI()
+profiler.install(app)
+
+
+@app.middleware("http")
+async def correlate_requests(request: Request, call_next):
+    # Per-request correlation ID, echoed back to the caller
+    request_id = new_request_id(request.headers.get(REQUEST_ID_HEADER))
+    # Server span, continuing the caller's trace when it sent a traceparent
+    with tracing.span(f"{request.method} request", request.headers.get(tracing.TRACEPARENT_HEADER),
+                      request_id=request_id) as server_span:
+        response = await call_next(request)
+        endpoint = request.scope.get("endpoint")
+        if endpoint is not None:
+            server_span.name = f"{request.method} {endpoint.__name__}"
+        server_span.set("status_code", response.status_code)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
 
 
 @app.post("/webhook")
 async def webhook(request: Request):
+    # Route by the destination (bot user ID) in the body
+    return await handle_webhook(request, None)
+
+@app.post("/webhook/{channel_id}")
+async def channel_webhook(channel_id: str, request: Request):
+    # Route by the channel in the webhook URL
+    return await handle_webhook(request, channel_id)
+
+async def handle_webhook(request: Request, channel_id: str = None):
     # Get X-Line-Signature header and request body
     signature = request.headers.get("X-Line-Signature", "")
     body = await request.body()
-    body_decode = body.decode("utf-8")
-    
-    try:
-        # Handle webhook body
-        handler.handle(body_decode, signature)
-    except InvalidSignatureError:
+
+    # Signature is checked on the raw bytes; the body is decoded at most once
+    payload = None
+    if channel_id is not None:
+        tenant = tenants.registry.get(channel_id=channel_id)
+        if tenant is None:
+            raise HTTPException(status_code=404, detail="Unknown channel")
+    else:
+        payload = load_webhook_payload(body)
+        tenant = tenants.registry.get(destination=payload.get("destination"))
+        if tenant is None:
+            raise HTTPException(status_code=404, detail="Unknown channel")
+    if not webhook_events.verify_signature(body, signature, tenant.secret):
         raise HTTPException(status_code=400, detail="Invalid signature")
+
+    # Record (sanitized) traffic for replay when capture is enabled; only
+    # verified requests, so forged bodies never land in the capture file
+    if capture is not None:
+        capture.record(body)
+
+    # Bodies with only follow/read/delivery/... events never reach the JSON parser
+    if not webhook_events.may_contain_handled(body):
+        return JSONResponse(content={"status": "OK"})
+    if payload is None:
+        payload = load_webhook_payload(body)
+    events = webhook_events.parse_events(payload)
+
+    # Everything queued below runs against this channel's clients and stores
+    tenants.use_tenant(tenant)
+
+    # Queue each event on its user's fair queue instead of running it inline
+    for event in events:
+        user_id = getattr(event.source, "user_id", None) or "anonymous"
+        status = admission.scheduler.submit(
+            f"{tenant.channel_id}:{user_id}",
+            lambda event=event: dispatch_event(event),
+            heavy=is_heavy_event(event)
+        )
+        if status == admission.SHED:
+            reply_busy(event)
     
     return JSONResponse(content={"status": "OK"})
     
+def load_webhook_payload(body: bytes) -> dict:
+    try:
+        return webhook_events.load_payload(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid body")
+
+@app.on_event("startup")
+def start_up():
+    # Required before taking traffic; failures keep /ready at 503
+    with startup.readiness.check("admission"):
+        admission.scheduler.start()
+    startup.readiness.probe("admission_workers", admission.scheduler.running)
+    with startup.readiness.check("channels"):
+        load_channels()
+
+    # Caches and clients the first requests would otherwise build inline
+    startup.warm_up({
+        "line_clients": warm_line_clients,
+        "calendar_client": calendar_fetcher.start,
+        "shard_pool": lambda: shard_search.start(default_tenant.store),
+        "timezone_tables": warm_timezone_tables,
+        "parser": warm_parser,
+    })
+
+@app.get("/metrics/admission")
+def admission_metrics():
+    """Admission control counters (accepted, deferred, shed, ...)"""
+    return admission.scheduler.snapshot()
+
+@app.get("/metrics/shadow")
+def shadow_metrics():
+    """Shadow-mode comparison counters and latency of both engines"""
+    return shadow.runner.snapshot()
+
+@app.get("/debug/schedule-consistency")
+def schedule_consistency():
+    """Compare each channel's free-gap view against a full recompute"""
+    mismatches = {
+        channel_id: tenant.store.check_consistency()
+        for channel_id, tenant in tenants.registry.by_channel.items()
+    }
+    return {"consistent": not any(mismatches.values()), "mismatches": mismatches}
+
 @app.get("/")
 def root():
     """Health check endpoint"""
@@ -37,6 +151,12 @@ def health():
     """Health check endpoint"""
     return {"status": "ok", "message": "LINE Bot Meeting Scheduler is running"}
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until startup dependencies are up and warm-up has run"""
+    status = startup.readiness.snapshot()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 @app.get("/meetings/{user_id}")
 def get_user_meetings(user_id: str):
     """Get user meetings (mock endpoint for demonstration)"""
@@ -47,7 +167,7 @@ def get_user_meetings(user_id: str):
 @app.post("/getmeeting")
 async def receive_meeting(request: Request):
     data = await request.json()
-    print("📥 ได้รับข้อมูลจาก LINE BOT:", data)
+    logger.info("meeting received", extra={"summary": data.get("summary"), "recipients": len(data.get("user_emails", []))})
 
     subject = f"นัดปลาชุมกันนน [ชื่อ : {data['summary']}]"
     body = f"""📝 ข้อมูลการประชุม:
@@ -59,8 +179,15 @@ async def receive_meeting(request: Request):
 👥 ผู้เข้าร่วม:
 """ + "\n".join(f"- {email}" for email in data["user_emails"])
 
-    for email in data["user_emails"]:
-        await send_email(email, subject, body)
+    # Build the message once and deliver it in a single SMTP transaction
+    message = build_meeting_message(data, subject, body)
+    refused = await send_meeting_email(message, data["user_emails"])
+    if refused:
+        return JSONResponse(content={
+            "status": "partial",
+            "detail": "ส่งอีเมลไม่ถึงผู้รับบางคน",
+            "refused": sorted(refused),
+        })
 
     return JSONResponse(content={"status": "received", "detail": "ได้รับข้อมูลและส่งอีเมลแล้ว"})
 
@@ -68,7 +195,7 @@ async def receive_meeting(request: Request):
 
 @app.get("/{email}")
 async def login(email: str, request: Request):
-    print('kuy')
+    logger.info("login", extra={"email": email})
     return {"message": "เข้าสู่ระบบสำเร็จ! คุณสามารถกลับไปใช้งาน LINE Bot ได้แล้ว"}
 
 if __name__ == "__main__":
@@ -0,0 +1,255 @@
+import calendar
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from datetime import date as Date, timedelta
+from typing import List, Optional, Tuple
+
+# Meetings asked for with only a duration are searched over this many days
+DEFAULT_SEARCH_DAYS = 7
+DEFAULT_MEETING_NAME = "ประชุม"
+
+EMAIL = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
+RANGE_SEPARATOR = r"\s*(?:-|–|ถึง|to|until)\s*"
+
+
+def _english(words: str) -> str:
+    # Thai has no spaces between words, so only English words get boundaries
+    return rf"(?<![A-Za-z])(?:{words})(?![A-Za-z])"
+
+
+THAI_WEEKDAYS = ["จันทร์", "อังคาร", "พุธ", "พฤหัสบดี", "ศุกร์", "เสาร์", "อาทิตย์"]
+ENGLISH_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+WEEKDAY_INDEX = {name: i for i, name in enumerate(THAI_WEEKDAYS)}
+WEEKDAY_INDEX.update({name: i for i, name in enumerate(ENGLISH_WEEKDAYS)})
+WEEKDAY_INDEX.update({name[:3]: i for i, name in enumerate(ENGLISH_WEEKDAYS)})
+WEEKDAY_INDEX["พฤหัส"] = 3
+WEEKDAY_INDEX["thu"] = WEEKDAY_INDEX["thur"] = WEEKDAY_INDEX["thurs"] = 3
+
+RELATIVE_DAYS = {
+    "วันนี้": 0, "today": 0,
+    "พรุ่งนี้": 1, "tomorrow": 1,
+    "มะรืนนี้": 2, "มะรืน": 2, "day after tomorrow": 2,
+}
+THIS_WEEK = ("สัปดาห์นี้", "อาทิตย์นี้", "this week")
+MINUTE_UNITS = ("นาที", "minute", "minutes", "min", "mins", "m")
+ROOM_ATTRIBUTES = {
+    "projector": "projector", "โปรเจคเตอร์": "projector", "โปรเจกเตอร์": "projector",
+    "tv": "tv", "ทีวี": "tv",
+    "whiteboard": "whiteboard", "ไวท์บอร์ด": "whiteboard",
+    "video": "video", "vc": "video", "วิดีโอคอล": "video",
+}
+
+# Time window: "13:00-14:00", "13.00 ถึง 14.00 น.", "9:00 to 10:30"
+TIME_RANGE = (
+    r"(?P<h1>\d{1,2})[:.](?P<m1>\d{2})" + RANGE_SEPARATOR +
+    r"(?P<h2>\d{1,2})[:.](?P<m2>\d{2})(?:\s*น\.)?"
+)
+TIME_RANGE_PATTERN = re.compile(TIME_RANGE, re.IGNORECASE)
+
+# One alternation scanned left to right over the message; the first
+# alternative that matches at a position wins, so longer phrases come first.
+TOKEN_REGEX = "|".join([
+    rf"(?P<email>{EMAIL})",
+    rf"(?P<time>{TIME_RANGE})",
+    r"(?P<iso>(?P<iso_y>\d{4})-(?P<iso_m>\d{1,2})-(?P<iso_d>\d{1,2}))",
+    r"(?P<dmy>(?P<dmy_d>\d{1,2})/(?P<dmy_m>\d{1,2})(?:/(?P<dmy_y>\d{2,4}))?)",
+    r"(?P<quorum>(?:อย่างน้อย|" + _english("at least") + r")\s*(?P<percent>\d{1,3})\s*%)",
+    r"(?P<room>(?:ห้องประชุม|ห้อง|" + _english("room") + r")(?:\s*(?:for|สำหรับ)?\s*(?P<room_size>\d+)\s*"
+    + r"(?:คน|" + _english("people|persons?|seats?") + r"))?)",
+    r"(?P<room_attribute>" + "|".join(_english(word) if word.isascii() else word for word in ROOM_ATTRIBUTES) + ")",
+    r"(?P<optional>ไม่บังคับ|ถ้าว่าง|" + _english("optional") + ")",
+    r"(?P<half>ครึ่งชั่วโมง|" + _english("half an hour") + ")",
+    r"(?P<duration>(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>ชั่วโมง|ชม\.?|นาที|"
+    + _english("hours?|hrs?|h|minutes?|mins?|m") + "))",
+    r"(?P<relative>วันนี้|พรุ่งนี้|มะรืนนี้|มะรืน|" + _english("day after tomorrow|today|tomorrow") + ")",
+    r"(?P<week>สัปดาห์นี้|สัปดาห์หน้า|อาทิตย์นี้|อาทิตย์หน้า|" + _english("this week|next week") + ")",
+    r"(?P<weekday>(?P<next_en>" + _english("next") + r"\s+)?(?:วัน)?(?P<day_name>"
+    + "|".join(_english(name) if name.isascii() else name for name in sorted(WEEKDAY_INDEX, key=len, reverse=True))
+    + r"))(?P<next_th>\s*หน้า)?",
+])
+
+TOKEN_KINDS = ("email", "time", "half", "duration", "optional", "quorum", "room", "room_attribute")
+
+# Leftover words around the meeting name
+FILLER_PATTERN = re.compile(r"^(?:นัด(?=ประชุม)|" + _english("schedule|book|set up") + r")?\s*|[\s,]*(?:กับ|และ|"
+                            + _english("with|and|on|at|from") + r")?[\s,]*$", re.IGNORECASE)
+# What may sit between date tokens without being part of a title
+DATE_GLUE_PATTERN = re.compile(r"[\s,\-–]+|ถึง|กับ|และ|" + _english("to|until|and|with|on|at|from"), re.IGNORECASE)
+
+
+@dataclass(slots=True)
+class MeetingRequest:
+    """Everything a single free-text meeting request asked for."""
+    name: str = DEFAULT_MEETING_NAME
+    start_date: str = ""
+    end_date: str = ""
+    start_time: str = ""  # empty when only a duration was given
+    end_time: str = ""
+    duration: int = 0  # minutes, 0 when the whole window is the meeting
+    attendees: List[str] = field(default_factory=list)  # required
+    optional_attendees: List[str] = field(default_factory=list)
+    min_attendance: float = 1.0
+    room_capacity: int = 0  # 0 = no room; -1 = a room for everyone invited
+    room_attributes: List[str] = field(default_factory=list)
+
+
+@lru_cache(maxsize=None)
+def token_pattern() -> re.Pattern:
+    """TOKEN_REGEX compiled on first use (or by the startup warm-up); compiling it is slow."""
+    return re.compile(TOKEN_REGEX, re.IGNORECASE)
+
+
+def _time(hours: str, minutes: str) -> Optional[int]:
+    hours, minutes = int(hours), int(minutes)
+    if hours > 23 or minutes > 59:
+        return None
+    return hours * 60 + minutes
+
+
+def _hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _window(match: re.Match) -> Optional[Tuple[str, str]]:
+    start = _time(match.group("h1"), match.group("m1"))
+    end = _time(match.group("h2"), match.group("m2"))
+    if start is None or end is None or start >= end:
+        return None
+    return _hhmm(start), _hhmm(end)
+
+
+def parse_time_window(text: str) -> Optional[Tuple[str, str]]:
+    """Parse "13:00 - 14:00" (also "13.00 ถึง 14.00", "9:00 to 10:00") into ("HH:MM", "HH:MM").
+
+    Returns None when the text is not a valid, non-empty time window.
+    """
+    match = TIME_RANGE_PATTERN.fullmatch(text.strip())
+    return _window(match) if match else None
+
+
+def _make_date(year: int, month: int, day: int) -> Optional[Date]:
+    if year > 2400:
+        year -= 543  # Buddhist era
+    elif year < 100:
+        year += 2000
+    if not 1 <= month <= 12 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+        return None
+    return Date(year, month, day)
+
+
+def _resolve_dates(match: re.Match, today: Date, anchor: Date) -> Optional[Tuple[Date, Date]]:
+    """Turn a date token into an inclusive (first, last) day range."""
+    if match.group("relative"):
+        day = today + timedelta(days=RELATIVE_DAYS[match.group("relative").lower()])
+        return day, day
+    if match.group("week"):
+        monday = today - timedelta(days=today.weekday())
+        if match.group("week").lower() in THIS_WEEK:
+            return today, monday + timedelta(days=6)
+        return monday + timedelta(days=7), monday + timedelta(days=13)
+    if match.group("weekday"):
+        weekday = WEEKDAY_INDEX[match.group("day_name").lower()]
+        if match.group("next_en") or match.group("next_th"):
+            # That weekday in the coming calendar week
+            day = today - timedelta(days=today.weekday()) + timedelta(days=7 + weekday)
+        else:
+            # Next occurrence on or after the previous date in the message
+            day = anchor + timedelta(days=(weekday - anchor.weekday()) % 7)
+        return day, day
+    if match.group("iso"):
+        day = _make_date(int(match.group("iso_y")), int(match.group("iso_m")), int(match.group("iso_d")))
+    else:
+        year = match.group("dmy_y")
+        day = _make_date(int(year) if year else today.year, int(match.group("dmy_m")), int(match.group("dmy_d")))
+        if day is not None and not year and day < today:
+            day = _make_date(today.year + 1, day.month, day.day)
+    return (day, day) if day else None
+
+
+def _duration(match: re.Match) -> int:
+    if match.group("half"):
+        return 30
+    amount = float(match.group("amount"))
+    unit = match.group("unit").lower()
+    return round(amount if unit in MINUTE_UNITS else amount * 60)
+
+
+def _blank(match: re.Match) -> str:
+    return "\0" * len(match.group())
+
+
+def parse_meeting_request(text: str, today: Date) -> Optional[MeetingRequest]:
+    """Extract a meeting request from one Thai/English message.
+
+    e.g. "ประชุมทีม พรุ่งนี้ถึงศุกร์ 13:00-14:00 กับ a@x.com, b@y.com" or
+    "sync next monday 1 hour with a@x.com optional c@z.com at least 80%".
+    Emails after "optional"/"ไม่บังคับ" are optional attendees. Returns None
+    unless the message names at least one attendee and a time window or a
+    duration.
+    """
+    request = MeetingRequest()
+    first_day = last_day = None
+    anchor = today
+    window_length = 0
+    optional = False
+    name_end = None
+    title_end = None  # first token that is not a date
+
+    for match in token_pattern().finditer(text):
+        if name_end is None:
+            name_end = match.start()
+        kind = match.lastgroup if match.lastgroup in TOKEN_KINDS else "date"
+        if title_end is None and kind != "date":
+            title_end = match.start()
+        if kind == "email":
+            email = match.group("email")
+            if email not in request.attendees and email not in request.optional_attendees:
+                (request.optional_attendees if optional else request.attendees).append(email)
+        elif kind == "optional":
+            optional = True
+        elif kind == "room":
+            request.room_capacity = int(match.group("room_size") or -1)
+        elif kind == "room_attribute":
+            attribute = ROOM_ATTRIBUTES[match.group("room_attribute").lower()]
+            if attribute not in request.room_attributes:
+                request.room_attributes.append(attribute)
+        elif kind == "quorum":
+            request.min_attendance = min(int(match.group("percent")), 100) / 100
+        elif kind == "time":
+            window = _window(match)
+            if window is None:
+                return None
+            request.start_time, request.end_time = window
+            window_length = _time(*window[1].split(":")) - _time(*window[0].split(":"))
+        elif kind in ("half", "duration"):
+            request.duration = _duration(match)
+        else:
+            days = _resolve_dates(match, today, anchor)
+            if days is None:
+                return None
+            first_day = first_day or days[0]
+            last_day = anchor = days[1]
+
+    if not (request.attendees or request.optional_attendees) or not (request.start_time or request.duration):
+        return None
+    if request.room_attributes and not request.room_capacity:
+        request.room_capacity = -1  # asking for equipment implies a room
+    if request.room_capacity < 0:
+        request.room_capacity = len(request.attendees) + len(request.optional_attendees)
+    if request.start_time and request.duration >= window_length:
+        request.duration = 0  # the window is the meeting
+
+    if first_day is None:
+        first_day, last_day = today, today + timedelta(days=DEFAULT_SEARCH_DAYS - 1)
+    request.start_date = first_day.isoformat()
+    request.end_date = max(first_day, last_day).isoformat()
+
+    name = FILLER_PATTERN.sub("", text[:name_end]).strip()
+    if not name and title_end:
+        # A title may open with a day ("Sunday brunch"): keep it up to its last word that is not a date
+        leading = DATE_GLUE_PATTERN.sub(_blank, token_pattern().sub(_blank, text[:title_end]))
+        name = FILLER_PATTERN.sub("", text[:len(leading.rstrip("\0"))]).strip()
+    if name:
+        request.name = name
+    return request
@@ -0,0 +1,141 @@
+import os
+import random
+import sys
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Profiling configuration (disabled unless a sample rate or the flag is set)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1" or PROFILE_SAMPLE_RATE > 0
+PROFILE_HEADER = "X-Debug-Profile"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+# Collapsed stacks per key ("POST /webhook", "postback confirm_users", ...)
+profiles = defaultdict(Counter)
+_profiles_lock = threading.Lock()
+
+# Sampler attached to the request currently being profiled
+_active_sampler = ContextVar("active_sampler", default=None)
+
+
+class StackSampler:
+    """Periodically sample one thread's stack and collapse it into counts."""
+
+    def __init__(self, thread_id: int, key: str, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.key = key
+        self.interval = interval
+        self.samples = defaultdict(Counter)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        with _profiles_lock:
+            for key, stacks in self.samples.items():
+                profiles[key].update(stacks)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[self.key][collapse_stack(frame)] += 1
+
+
+def collapse_stack(frame) -> str:
+    """Collapse a frame chain into a root-first 'file:func;file:func' string."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def should_sample(headers) -> bool:
+    """Decide whether a request is profiled (debug header or random sample)."""
+    if headers.get(PROFILE_HEADER):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def is_sampled() -> bool:
+    return _active_sampler.get() is not None
+
+
+@contextmanager
+def sampling(key: str):
+    """Profile the enclosed block under `key`.
+
+    Nested blocks on the same thread reuse the outer sampler and only relabel
+    the samples taken while they run, so one request costs one sampler thread.
+    """
+    sampler = _active_sampler.get()
+    if sampler is not None and sampler.thread_id == threading.get_ident():
+        previous = sampler.key
+        sampler.key = key
+        try:
+            yield
+        finally:
+            sampler.key = previous
+        return
+
+    sampler = StackSampler(threading.get_ident(), key)
+    token = _active_sampler.set(sampler)
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        _active_sampler.reset(token)
+
+
+def render_collapsed(key: str = None) -> str:
+    """Render stored stacks in collapsed format for flamegraph.pl/speedscope."""
+    lines = []
+    with _profiles_lock:
+        for profile_key, stacks in sorted(profiles.items()):
+            if key is not None and profile_key != key:
+                continue
+            for stack, count in stacks.most_common():
+                lines.append(f"{profile_key};{stack} {count}")
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def reset_profiles():
+    with _profiles_lock:
+        profiles.clear()
+
+
+def install(app):
+    """Register the profiling middleware and debug endpoint on a FastAPI app.
+
+    Nothing is registered when profiling is disabled, so the request path
+    carries no extra work in that case.
+    """
+    if not PROFILE_ENABLED:
+        return
+
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    @app.middleware("http")
+    async def profile_requests(request: Request, call_next):
+        if not should_sample(request.headers):
+            return await call_next(request)
+        with sampling(f"{request.method} {request.url.path}"):
+            return await call_next(request)
+
+    @app.get("/debug/profiles", response_class=PlainTextResponse)
+    def get_profiles(key: str = None, reset: bool = False):
+        """Collapsed stacks per route and postback action."""
+        text = render_collapsed(key)
+        if reset:
+            reset_profiles()
+        return text
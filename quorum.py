@@ -0,0 +1,87 @@
+import os
+from typing import Dict, Iterable, List, Set, Tuple
+
+from schedule_store import DAY_END, DAY_START
+
+# Quorum search configuration
+QUORUM_MAX_SLOTS = int(os.getenv("QUORUM_MAX_SLOTS", "5"))
+
+
+def busy_from_gaps(gaps: List[Tuple[int, int]], base: int = 0) -> List[Tuple[int, int]]:
+    """Invert a day's free gaps (exclusive bounds) into inclusive busy intervals, offset by `base`."""
+    busy = []
+    lo = DAY_START
+    for gap_lo, gap_hi in gaps:
+        if gap_lo > lo:
+            busy.append((base + max(lo, 0), base + gap_lo))
+        lo = gap_hi
+    if lo < DAY_END:
+        busy.append((base + max(lo, 0), base + DAY_END - 1))
+    return busy
+
+
+def blocked_starts(busy: Iterable[Tuple[int, int]], duration: int) -> List[Tuple[int, int]]:
+    """Merge one attendee's busy intervals into the meeting starts they rule out.
+
+    A meeting [s, s + duration] touches busy [b0, b1] (inclusive) exactly
+    when b0 - duration <= s <= b1.
+    """
+    merged = []
+    for start, end in sorted(busy):
+        start -= duration
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def quorum_windows(busy: Dict[str, List[Tuple[int, int]]], required: Set[str], first: int, last: int,
+                   duration: int, min_count: int) -> List[Tuple[int, int, int]]:
+    """Sweep-line over all attendees' blocked starts.
+
+    Returns (earliest start, latest start, attendance) runs of meeting starts
+    in [first, last - duration] where every required attendee and at least
+    `min_count` attendees in total are free. Cost is O(I log I) in the total
+    number of busy intervals I, whatever the number of attendee subsets.
+    """
+    latest = last - duration
+    if latest < first:
+        return []
+
+    events = []  # (position, change in blocked required, change in blocked total)
+    for user, intervals in busy.items():
+        is_required = 1 if user in required else 0
+        for lo, hi in blocked_starts(intervals, duration):
+            if hi < first or lo > latest:
+                continue
+            events.append((max(lo, first), is_required, 1))
+            events.append((min(hi, latest) + 1, -is_required, -1))
+    events.sort()
+
+    runs = []
+    total = len(busy)
+    blocked_required = blocked = 0
+    position = first
+    i = 0
+    while position <= latest:
+        while i < len(events) and events[i][0] <= position:
+            blocked_required += events[i][1]
+            blocked += events[i][2]
+            i += 1
+        end = min(events[i][0] - 1, latest) if i < len(events) else latest
+        attendance = total - blocked
+        if blocked_required == 0 and attendance >= min_count:
+            if runs and runs[-1][1] == position - 1 and runs[-1][2] == attendance:
+                runs[-1] = (runs[-1][0], end, attendance)
+            else:
+                runs.append((position, end, attendance))
+        position = end + 1
+    return runs
+
+
+def min_attendance_count(total: int, fraction: float, required: int) -> int:
+    """Attendees needed for a quorum of `fraction`, never fewer than the required ones."""
+    needed = -(-round(total * fraction * 1000) // 1000)  # ceil, tolerant of float noise
+    return max(needed, required, 1 if total else 0)
@@ -0,0 +1,259 @@
+"""Replay captured webhook traffic against a running app.
+
+Reports HTTP latency (the app acknowledges once events are queued),
+completion latency (until each handler's reply reaches the mock LINE API)
+and the app's handler errors from /metrics/admission, separately from HTTP
+errors.
+
+Example:
+    # Terminal 1: the app under test, pointed at the mocks started below
+    CHANNEL_SECRET=replay-secret LINE_API_ENDPOINT=http://127.0.0.1:9001 \\
+    SMTP_HOST=127.0.0.1 SMTP_PORT=9025 SMTP_START_TLS=0 python main.py
+
+    # Terminal 2
+    python replay.py capture.jsonl.gz --speed 10 --secret replay-secret
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+from capture import load_capture
+
+
+def sign(body: bytes, secret: str) -> str:
+    """Compute the X-Line-Signature header for a body."""
+    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("utf-8")
+
+
+def with_reply_tokens(payload: dict) -> dict:
+    """Give every event a fresh reply token (captures drop the originals)."""
+    events = [
+        {**event, "replyToken": uuid.uuid4().hex} if event.get("type") in ("message", "postback") else event
+        for event in payload.get("events", [])
+    ]
+    return {**payload, "events": events}
+
+
+class MockLineAPI:
+    """LINE Messaging API stub that answers 200 {} and timestamps replies.
+
+    Webhooks are acknowledged as soon as their events are queued, so the
+    time until the handler's reply arrives here (matched by reply token) is
+    what measures completion.
+    """
+
+    def __init__(self):
+        self.replied = {}  # reply token -> perf_counter() when the reply arrived
+        self.pushes = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                body = await reader.readexactly(length) if length else b""
+                self._record(head.split(b" ", 2)[1], body)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # CancelledError: the app keeps connections alive until the mocks shut down
+            pass
+        finally:
+            writer.close()
+
+    def _record(self, path: bytes, body: bytes):
+        if path.endswith(b"/message/reply"):
+            try:
+                token = json.loads(body).get("replyToken")
+            except ValueError:
+                return
+            if token:
+                self.replied.setdefault(token, time.perf_counter())
+        elif path.endswith(b"/message/push"):
+            self.pushes += 1
+
+
+class MockSMTP:
+    """Minimal SMTP sink that accepts and counts messages."""
+
+    def __init__(self):
+        self.messages = 0
+        self.recipients = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def reply(line: str):
+            writer.write(line.encode("ascii") + b"\r\n")
+            await writer.drain()
+
+        await reply("220 replay-smtp ready")
+        try:
+            while True:
+                line = (await reader.readline()).decode("utf-8", "replace").strip()
+                if not line:
+                    break
+                command = line.split(" ", 1)[0].upper()
+                if command in ("EHLO", "HELO"):
+                    await reply("250 replay-smtp")
+                elif command == "RCPT":
+                    self.recipients += 1
+                    await reply("250 OK")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    await reader.readuntil(b"\r\n.\r\n")
+                    self.messages += 1
+                    await reply("250 OK")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("250 OK")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def latency_summary(latencies) -> dict:
+    return {
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 1),
+    }
+
+
+async def replay(records, url: str, secret: str, speed: float, timeout: float) -> tuple:
+    """Fire the captured webhooks; returns (HTTP report, reply token -> perf_counter() when sent)."""
+    latencies = []
+    errors = Counter()
+    sent = {}
+
+    async def fire(client, payload):
+        payload = with_reply_tokens(payload)
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json", "X-Line-Signature": sign(body, secret)}
+        start = time.perf_counter()
+        try:
+            response = await client.post(url, content=body, headers=headers)
+            if response.status_code >= 400:
+                errors[f"HTTP {response.status_code}"] += 1
+            else:
+                for event in payload.get("events", []):
+                    if "replyToken" in event:
+                        sent[event["replyToken"]] = start
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] += 1
+        latencies.append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        started = time.perf_counter()
+        tasks = []
+        for offset, payload in records:
+            # Keep the captured inter-arrival times, compressed by `speed`
+            delay = offset / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(client, payload)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(records),
+        "elapsed_s": round(elapsed, 2),
+        "rate_per_s": round(len(records) / elapsed, 1) if elapsed else 0.0,
+        **latency_summary(latencies),
+        "errors": dict(errors),
+    }, sent
+
+
+async def admission_counters(client: httpx.AsyncClient, url: str) -> dict:
+    """The app's admission counters, or {} when the endpoint is unreachable."""
+    if not url:
+        return {}
+    try:
+        response = await client.get(url)
+        response.raise_for_status()
+        return response.json()
+    except (httpx.HTTPError, ValueError):
+        return {}
+
+
+def handler_report(before: dict, after: dict) -> dict:
+    """Tasks the app finished, failed or dropped during the replay (counter deltas)."""
+    if not before or not after:
+        return {}
+    return {key: after.get(key, 0) - before.get(key, 0) for key in ("completed", "errors", "shed", "deferred")}
+
+
+async def main(args):
+    records = load_capture(args.capture)
+    line_api = MockLineAPI()
+    smtp = MockSMTP()
+    servers = []
+    if args.mock_line_port:
+        servers.append(await asyncio.start_server(line_api.handle, "127.0.0.1", args.mock_line_port))
+    if args.mock_smtp_port:
+        servers.append(await asyncio.start_server(smtp.handle, "127.0.0.1", args.mock_smtp_port))
+
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        before = await admission_counters(client, args.metrics_url)
+        report, sent = await replay(records, args.url, args.secret, args.speed, args.timeout)
+        # Wait for the handlers (replies, notification posts, emails) to finish
+        deadline = time.perf_counter() + args.settle
+        while time.perf_counter() < deadline and not sent.keys() <= line_api.replied.keys():
+            await asyncio.sleep(0.05)
+        after = await admission_counters(client, args.metrics_url)
+
+    completion = [line_api.replied[token] - start for token, start in sent.items() if token in line_api.replied]
+    report["http"] = {key: report.pop(key) for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms", "errors")}
+    report["completion"] = {
+        **latency_summary(completion),
+        "replied": len(completion),
+        "unanswered": len(sent) - len(completion),
+    }
+    report["handler"] = handler_report(before, after)
+    report["pushes"] = line_api.pushes
+    report["emails"] = smtp.messages
+    report["email_recipients"] = smtp.recipients
+
+    for server in servers:
+        server.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured LINE webhook traffic")
+    parser.add_argument("capture", help="capture file written with WEBHOOK_CAPTURE_PATH")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/webhook")
+    parser.add_argument("--secret", default="replay-secret", help="channel secret the app under test uses")
+    parser.add_argument("--speed", type=float, default=1.0, help="time scale, 1 (real time) to 100")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--mock-line-port", type=int, default=9001, help="0 to disable")
+    parser.add_argument("--mock-smtp-port", type=int, default=9025, help="0 to disable")
+    parser.add_argument("--metrics-url", default="http://127.0.0.1:8000/metrics/admission",
+                        help="admission counters of the app under test, for handler errors ('' to skip)")
+    parser.add_argument("--settle", type=float, default=10.0,
+                        help="longest wait for replies and background work after the last request")
+    args = parser.parse_args()
+    if not 1 <= args.speed <= 100:
+        parser.error("--speed must be between 1 and 100")
+    asyncio.run(main(args))
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from schedule_store import ScheduleStore, to_hhmm, to_minutes
+
+# Reservation configuration
+HOLD_TTL_SECONDS = float(os.getenv("HOLD_TTL_SECONDS", "300"))
+LOCK_STRIPES = 64
+
+
+@dataclass(slots=True)
+class Hold:
+    """Short-lived claim on a slot for a set of users."""
+    hold_id: str
+    owner: str
+    users: List[str]
+    periods: List[Tuple[str, int, int]]  # UTC (date, start, end) parts of the slot
+    versions: Dict[str, int]
+    expires_at: float
+
+
+class SlotReservations:
+    """Holds on offered slots and optimistic commit at confirmation.
+
+    A hold records the attendees' schedule versions when the slot is offered.
+    `commit` takes the attendees' lock stripes (in a fixed order, so
+    organizers touching different people never wait on each other), compares
+    the recorded versions with the current ones and, if any changed, re-checks
+    the slot against current data before writing the busy period back.
+
+    Holds, versions and lock stripes live in this process, so the guarantee
+    is per worker: with several workers sharing a schedule snapshot, two of
+    them can still commit the same slot.
+    """
+
+    def __init__(self, store: ScheduleStore, ttl: float = HOLD_TTL_SECONDS):
+        self.store = store
+        self.ttl = ttl
+        self.holds = {}       # hold_id -> Hold
+        self._by_day = {}     # (user, date) -> set of hold_ids
+        self._holds_lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def hold(self, owner: str, users: List[str], periods: List[Tuple[str, str, str]]) -> str:
+        """Place a hold on (date, "HH:MM", "HH:MM") periods and return its ID."""
+        hold = Hold(
+            hold_id=uuid.uuid4().hex,
+            owner=owner,
+            users=list(users),
+            periods=[(date, to_minutes(start), to_minutes(end)) for date, start, end in periods],
+            versions={user: self.store.version(user) for user in users},
+            expires_at=time.monotonic() + self.ttl
+        )
+        with self._holds_lock:
+            self.holds[hold.hold_id] = hold
+            for user in hold.users:
+                for date, _, _ in hold.periods:
+                    self._by_day.setdefault((user, date), set()).add(hold.hold_id)
+        return hold.hold_id
+
+    def release(self, hold_id: str):
+        with self._holds_lock:
+            self._drop(hold_id)
+
+    def is_held(self, users: List[str], periods: List[Tuple[str, str, str]], owner: str = None) -> bool:
+        """Check whether someone other than `owner` holds a slot overlapping `periods`."""
+        now = time.monotonic()
+        with self._holds_lock:
+            for date, start_time, end_time in periods:
+                start, end = to_minutes(start_time), to_minutes(end_time)
+                for user in users:
+                    for hold_id in list(self._by_day.get((user, date), ())):
+                        hold = self.holds.get(hold_id)
+                        if hold is None:
+                            continue
+                        if hold.expires_at < now:
+                            self._drop(hold_id)
+                        elif hold.owner != owner and _overlaps(hold, date, start, end):
+                            return True
+        return False
+
+    def commit(self, hold_id: str) -> bool:
+        """Validate a hold and write its busy period; returns False on conflict."""
+        with self._holds_lock:
+            hold = self.holds.get(hold_id)
+        if hold is None:
+            return False
+
+        stripes = sorted({hash(user) % LOCK_STRIPES for user in hold.users})
+        for i in stripes:
+            self._stripes[i].acquire()
+        try:
+            changed = any(self.store.version(user) != version for user, version in hold.versions.items())
+            expired = hold.expires_at < time.monotonic()
+            if changed or expired:
+                # Something moved since the offer: check against current data
+                if not all(
+                    self.store.is_free(user, date, start, end)
+                    for user in hold.users for date, start, end in hold.periods
+                ):
+                    return False
+                if expired and self._conflicts_with_others(hold):
+                    return False
+
+            for date, start, end in hold.periods:
+                start_time, end_time = to_hhmm(start), to_hhmm(end)
+                for user in hold.users:
+                    self.store.add_busy(user, date, start_time, end_time)
+            return True
+        finally:
+            for i in reversed(stripes):
+                self._stripes[i].release()
+            self.release(hold_id)
+
+    def _conflicts_with_others(self, hold: Hold) -> bool:
+        now = time.monotonic()
+        with self._holds_lock:
+            for date, start, end in hold.periods:
+                for user in hold.users:
+                    for other_id in self._by_day.get((user, date), ()):
+                        other = self.holds[other_id]
+                        if (other_id != hold.hold_id and other.owner != hold.owner and other.expires_at >= now
+                                and _overlaps(other, date, start, end)):
+                            return True
+        return False
+
+    def _drop(self, hold_id: str) -> Optional[Hold]:
+        # Caller holds _holds_lock
+        hold = self.holds.pop(hold_id, None)
+        if hold is not None:
+            for user in hold.users:
+                for date, _, _ in hold.periods:
+                    ids = self._by_day.get((user, date))
+                    if ids is not None:
+                        ids.discard(hold_id)
+                        if not ids:
+                            del self._by_day[(user, date)]
+        return hold
+
+
+def _overlaps(hold: Hold, date: str, start: int, end: int) -> bool:
+    return any(
+        held_date == date and start <= held_end and end >= held_start
+        for held_date, held_start, held_end in hold.periods
+    )
+
@@ -0,0 +1,75 @@
+import json
+import os
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+# Room configuration: a JSON list of {"id", "name", "capacity", "attributes": [...]}
+ROOMS_FILE = os.getenv("ROOMS_FILE", "")
+
+# Rooms share the ScheduleStore (and holds) with people under this prefix,
+# so a meeting and its room are held and committed together
+ROOM_KEY_PREFIX = "room:"
+
+
+@dataclass(slots=True, frozen=True)
+class Room:
+    """Bookable room or resource."""
+    room_id: str
+    name: str
+    capacity: int
+    attributes: FrozenSet[str] = frozenset()
+
+    @property
+    def key(self) -> str:
+        return ROOM_KEY_PREFIX + self.room_id
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Room":
+        return cls(
+            room_id=str(data["id"]),
+            name=data.get("name", str(data["id"])),
+            capacity=int(data.get("capacity", 0)),
+            attributes=frozenset(attribute.lower() for attribute in data.get("attributes", []))
+        )
+
+
+class RoomDirectory:
+    """Rooms indexed by capacity (sorted, for bisect) and by attribute."""
+
+    def __init__(self, rooms: Iterable[Room] = ()):
+        self.rooms = {}
+        self._by_capacity = []   # rooms sorted by (capacity, room_id)
+        self._capacities = []    # matching capacities, for bisect
+        self._by_attribute = {}  # attribute -> set of room IDs
+        for room in rooms:
+            self.add(room)
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def add(self, room: Room):
+        self.rooms[room.room_id] = room
+        self._by_capacity = sorted(self.rooms.values(), key=lambda r: (r.capacity, r.room_id))
+        self._capacities = [r.capacity for r in self._by_capacity]
+        for attribute in room.attributes:
+            self._by_attribute.setdefault(attribute, set()).add(room.room_id)
+
+    def get(self, room_id: str) -> Optional[Room]:
+        return self.rooms.get(room_id)
+
+    def candidates(self, min_capacity: int = 0, attributes: Iterable[str] = ()) -> List[Room]:
+        """Rooms seating at least `min_capacity` with every attribute, smallest first."""
+        rooms = self._by_capacity[bisect_left(self._capacities, min_capacity):]
+        wanted = [attribute.lower() for attribute in attributes]
+        if wanted:
+            allowed = set.intersection(*(self._by_attribute.get(attribute, set()) for attribute in wanted))
+            rooms = [room for room in rooms if room.room_id in allowed]
+        return rooms
+
+
+def load_rooms(path: str = ROOMS_FILE) -> List[Room]:
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [Room.from_dict(room) for room in json.load(f)]
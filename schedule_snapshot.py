@@ -0,0 +1,292 @@
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from datetime import date as Date
+from typing import Dict, List, Tuple
+
+from schedule_store import DAY_END, DAY_START, to_minutes
+
+# Snapshot configuration (disabled unless a path is set). Only the ingestion
+# process writes; every other worker maps the file read-only.
+SCHEDULE_SNAPSHOT_PATH = os.getenv("SCHEDULE_SNAPSHOT_PATH", "")
+SCHEDULE_SNAPSHOT_WRITER = os.getenv("SCHEDULE_SNAPSHOT_WRITER", "0") == "1"
+# How often the writer applies other workers' bookings from the journal
+SCHEDULE_JOURNAL_POLL_SECONDS = float(os.getenv("SCHEDULE_JOURNAL_POLL_SECONDS", "0.2"))
+
+# Layout (native byte order, all offsets in bytes from the start of the file):
+#   header     MAGIC, version, n_users, n_days, n_intervals, strings_size
+#   users      n_users × (email_offset, email_length, first_day, day_count)   uint32, sorted by email
+#   days       n_days × (day_ordinal, first_interval, interval_count)         uint32, sorted by day per user
+#   intervals  n_intervals × (start, end)                                     uint16 minutes, sorted by start
+#   strings    UTF-8 emails
+MAGIC = b"LAMS"
+VERSION = 1
+HEADER = struct.Struct("=4sIIIII")
+USER_FIELDS = 4
+DAY_FIELDS = 3
+
+logger = logging.getLogger(__name__)
+
+
+def attach_snapshot(store, path: str = SCHEDULE_SNAPSHOT_PATH, writer: bool = SCHEDULE_SNAPSHOT_WRITER):
+    """Hook a ScheduleStore up to the shared snapshot file.
+
+    Readers send their writes to the writer through the journal next to
+    the snapshot; the writer applies them and republishes.
+    """
+    if not path:
+        return
+    if writer:
+        snapshot_writer = SnapshotWriter(path)
+        store.listeners.append(snapshot_writer)
+        snapshot_writer(store)  # publish the initial state
+    elif os.path.exists(path):
+        store.snapshot = ScheduleSnapshot(path)
+        store.journal = SnapshotJournal(path)
+
+
+def write_snapshot(schedules: Dict, path: str):
+    """Serialize {email: {date: [[start, end], ...]}} and atomically replace `path`."""
+    users = array("I")
+    days = array("I")
+    intervals = array("H")
+    strings = bytearray()
+
+    for email in sorted(schedules, key=lambda e: e.encode("utf-8")):
+        encoded = email.encode("utf-8")
+        user_days = sorted(
+            (Date.fromisoformat(date).toordinal(), periods)
+            for date, periods in schedules[email].items() if periods
+        )
+        users.extend([len(strings), len(encoded), len(days) // DAY_FIELDS, len(user_days)])
+        strings += encoded
+        for ordinal, periods in user_days:
+            days.extend([ordinal, len(intervals) // 2, len(periods)])
+            for start, end in sorted((to_minutes(s), to_minutes(e)) for s, e in periods):
+                intervals.extend([start, end])
+
+    header = HEADER.pack(
+        MAGIC, VERSION, len(users) // USER_FIELDS, len(days) // DAY_FIELDS, len(intervals) // 2, len(strings)
+    )
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(users.tobytes())
+        f.write(days.tobytes())
+        f.write(intervals.tobytes())
+        f.write(strings)
+    os.replace(tmp_path, path)
+
+
+class ScheduleSnapshot:
+    """Read-only, zero-copy view of a snapshot file mapped with mmap.
+
+    Every worker that maps the same file shares the page cache copy; lookups
+    are binary searches over memoryviews of the mapping and never build
+    Python objects for users or days they do not touch.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._stat = None
+        self._load()
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, version, n_users, n_days, n_intervals, strings_size = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a schedule snapshot")
+
+        offset = HEADER.size
+        self._users = view[offset:offset + n_users * USER_FIELDS * 4].cast("I")
+        offset += n_users * USER_FIELDS * 4
+        self._days = view[offset:offset + n_days * DAY_FIELDS * 4].cast("I")
+        offset += n_days * DAY_FIELDS * 4
+        self._intervals = view[offset:offset + n_intervals * 4].cast("H")
+        offset += n_intervals * 4
+        self._strings = view[offset:offset + strings_size]
+        self.n_users = n_users
+        self._stat = (stat.st_ino, stat.st_mtime_ns)
+
+    def __getstate__(self):
+        # Worker processes re-map the file instead of receiving a copy
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def refresh(self) -> bool:
+        """Remap if the file was replaced since it was opened."""
+        stat = os.stat(self.path)
+        if (stat.st_ino, stat.st_mtime_ns) == self._stat:
+            return False
+        self._load()
+        return True
+
+    def _find_user(self, email: str) -> int:
+        target = email.encode("utf-8")
+        lo, hi = 0, self.n_users
+        while lo < hi:
+            mid = (lo + hi) // 2
+            base = mid * USER_FIELDS
+            start = self._users[base]
+            name = self._strings[start:start + self._users[base + 1]]
+            if name == target:
+                return mid
+            if bytes(name) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+
+    def _find_day(self, email: str, date: str) -> Tuple[int, int]:
+        """Return (first_interval, count) for a user's day, or (0, 0)."""
+        user = self._find_user(email)
+        if user < 0:
+            return 0, 0
+        base = user * USER_FIELDS
+        lo, hi = self._users[base + 2], self._users[base + 2] + self._users[base + 3]
+        ordinal = Date.fromisoformat(date).toordinal()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            day_ordinal = self._days[mid * DAY_FIELDS]
+            if day_ordinal == ordinal:
+                return self._days[mid * DAY_FIELDS + 1], self._days[mid * DAY_FIELDS + 2]
+            if day_ordinal < ordinal:
+                lo = mid + 1
+            else:
+                hi = mid
+        return 0, 0
+
+    def __contains__(self, email: str) -> bool:
+        return self._find_user(email) >= 0
+
+    def busy(self, email: str, date: str) -> List[Tuple[int, int]]:
+        first, count = self._find_day(email, date)
+        intervals = self._intervals
+        return [(intervals[2 * i], intervals[2 * i + 1]) for i in range(first, first + count)]
+
+    def is_free(self, email: str, date: str, start: int, end: int) -> bool:
+        first, count = self._find_day(email, date)
+        intervals = self._intervals
+        for i in range(first, first + count):
+            busy_start = intervals[2 * i]
+            if busy_start > end:
+                break  # sorted by start, nothing later can overlap
+            if start <= intervals[2 * i + 1]:
+                return False
+        return True
+
+    def free_gaps(self, email: str, date: str) -> List[Tuple[int, int]]:
+        gaps = []
+        lo = DAY_START
+        for start, end in self.busy(email, date):
+            if start - lo > 1:
+                gaps.append((lo, start))
+            lo = max(lo, end)
+        if DAY_END - lo > 1:
+            gaps.append((lo, DAY_END))
+        return gaps
+
+
+class SnapshotJournal:
+    """Append-only log of busy-period writes made by reader workers.
+
+    Entries are JSON lines appended under an exclusive flock; the writer
+    takes the same lock to apply and truncate them, so no entry is lost
+    between its read and the truncate.
+    """
+
+    OPS = ("add_busy", "remove_busy")
+
+    def __init__(self, snapshot_path: str):
+        self.path = f"{snapshot_path}.journal"
+
+    def append(self, op: str, *args):
+        line = json.dumps({"op": op, "args": args}, ensure_ascii=False) + "\n"
+        with open(self.path, "a", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(line)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def apply(self, store) -> int:
+        """Replay pending entries on `store`, then truncate; returns the number applied."""
+        try:
+            f = open(self.path, "r+", encoding="utf-8")
+        except FileNotFoundError:
+            return 0
+        applied = 0
+        with f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        if entry["op"] not in self.OPS:
+                            raise ValueError(f"unknown journal op {entry['op']!r}")
+                        getattr(store, entry["op"])(*entry["args"])
+                        applied += 1
+                    except Exception:
+                        logger.exception("bad schedule journal entry", extra={"entry": line.strip()})
+                f.seek(0)
+                f.truncate()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return applied
+
+
+class SnapshotWriter:
+    """Coalesce store changes into background snapshot rewrites.
+
+    Also applies the readers' journal every SCHEDULE_JOURNAL_POLL_SECONDS,
+    so a booking made in one worker reaches the others with the next
+    rewrite.
+    """
+
+    def __init__(self, path: str, poll_seconds: float = SCHEDULE_JOURNAL_POLL_SECONDS):
+        self.path = path
+        self.journal = SnapshotJournal(path)
+        self.poll_seconds = poll_seconds
+        self._store = None
+        self._dirty = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="schedule-snapshot", daemon=True)
+        self._thread.start()
+
+    def __call__(self, store):
+        # Registered as a ScheduleStore listener; runs under the store lock
+        self._store = store
+        self._dirty.set()
+
+    def _run(self):
+        while True:
+            self._dirty.wait(self.poll_seconds)
+            store = self._store
+            if store is None:
+                continue
+            try:
+                self.journal.apply(store)  # changes set _dirty through the listener
+            except Exception:
+                logger.exception("schedule journal apply failed", extra={"path": self.journal.path})
+            if not self._dirty.is_set():
+                continue
+            self._dirty.clear()
+            try:
+                with store._lock:
+                    schedules = {
+                        email: {date: list(periods) for date, periods in days.items()}
+                        for email, days in store.schedules.items()
+                    }
+                write_snapshot(schedules, self.path)
+            except Exception:
+                logger.exception("schedule snapshot write failed", extra={"path": self.path})
@@ -0,0 +1,291 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Gaps are (lo, hi) with exclusive bounds in minutes since midnight: a window
+# [start, end] fits a gap when lo < start and end < hi. This mirrors the
+# inclusive overlap check used for busy periods, where touching counts as busy.
+DAY_START = -1
+DAY_END = 24 * 60
+FULL_DAY = [(DAY_START, DAY_END)]
+
+
+def to_minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def to_hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def compute_gaps(busy_periods) -> List[Tuple[int, int]]:
+    """Full recompute of a day's free gaps from its busy periods."""
+    gaps = []
+    lo = DAY_START
+    for start, end in sorted((to_minutes(s), to_minutes(e)) for s, e in busy_periods):
+        if start - lo > 1:
+            gaps.append((lo, start))
+        lo = max(lo, end)
+    if DAY_END - lo > 1:
+        gaps.append((lo, DAY_END))
+    return gaps
+
+
+def gaps_fit(gaps: List[Tuple[int, int]], start: int, end: int) -> bool:
+    """Whether the window [start, end] fits inside one of the sorted gaps."""
+    i = bisect_left(gaps, (start,)) - 1
+    return i >= 0 and gaps[i][0] < start and end < gaps[i][1]
+
+
+def carve_gap(gaps: List[Tuple[int, int]], start: int, end: int):
+    """Cut the busy period [start, end] out of sorted gaps, in place."""
+    # Gaps that can overlap [start, end]: lo < end and hi > start
+    first = max(bisect_right(gaps, (start,)) - 1, 0)
+    last = bisect_left(gaps, (end,))
+    replaced = []
+    for lo, hi in gaps[first:last]:
+        if hi <= start or lo >= end:
+            replaced.append((lo, hi))
+            continue
+        if start - lo > 1:
+            replaced.append((lo, start))
+        if hi - end > 1:
+            replaced.append((end, hi))
+    gaps[first:last] = replaced
+
+
+def merge_busy(busy_periods) -> List[Tuple[str, str]]:
+    """Merge overlapping and adjacent busy periods of one day with a sorted sweep.
+
+    Periods are inclusive at minute granularity, so [a, b] and [b + 1, c]
+    leave no room for a meeting and become [a, c].
+    """
+    merged = []
+    for start, end in sorted((to_minutes(s), to_minutes(e)) for s, e in busy_periods):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(to_hhmm(start), to_hhmm(end)) for start, end in merged]
+
+
+def intersect_gaps(a: List[Tuple[int, int]], b: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Intersect two sorted gap lists with a linear merge."""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        lo = max(a[i][0], b[j][0])
+        hi = min(a[i][1], b[j][1])
+        if hi - lo > 1:
+            result.append((lo, hi))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+class ScheduleStore:
+    """Users' busy periods plus an incrementally maintained free-gap view.
+
+    `schedules` keeps the raw {email: {date: [[start, end], ...]}} data; `free`
+    holds the matching sorted gap list per user and day. Inserting a busy
+    period splits the affected gaps in place; removing one recomputes only
+    that user's day. `generation` is bumped on every change and `versions`
+    on every change to a given user.
+
+    Users not held locally are answered from `snapshot` (a mapped
+    ScheduleSnapshot) when one is attached. Busy periods written for such
+    users go to `overlay` and are applied on top of the snapshot until a
+    refreshed snapshot contains them; `journal` (see SnapshotJournal) sends
+    those writes on to the process that rewrites the snapshot. `listeners`
+    are called after every change.
+    """
+
+    def __init__(self, schedules: Dict = None):
+        self.schedules = schedules if schedules is not None else {}
+        self.free = {}
+        self.versions = {}
+        self.generation = 0
+        self.snapshot = None
+        self.overlay = {}  # email -> {date: [[start, end], ...]} not yet in the snapshot
+        self.journal = None
+        self.listeners = []
+        self._lock = threading.RLock()
+        for email, days in self.schedules.items():
+            self.free[email] = {date: compute_gaps(periods) for date, periods in days.items()}
+
+    def __getstate__(self):
+        # Locks cannot be pickled; worker processes only read the data
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["listeners"] = []
+        state["journal"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def add_busy(self, email: str, date: str, start_time: str, end_time: str):
+        """Record a busy period and carve it out of the free gaps."""
+        with self._lock:
+            if self._in_snapshot(email):
+                self.overlay.setdefault(email, {}).setdefault(date, []).append([start_time, end_time])
+            else:
+                self._insert(email, date, start_time, end_time)
+            if self.journal is not None:
+                self.journal.append("add_busy", email, date, start_time, end_time)
+            self._bump(email)
+
+    def remove_busy(self, email: str, date: str, start_time: str, end_time: str) -> bool:
+        """Remove one busy period; only that user's day is recomputed."""
+        with self._lock:
+            if self._in_snapshot(email):
+                if not _remove_period(self.overlay.get(email, {}).get(date, []), start_time, end_time):
+                    return False
+            elif not self._delete(email, date, start_time, end_time):
+                return False
+            if self.journal is not None:
+                self.journal.append("remove_busy", email, date, start_time, end_time)
+            self._bump(email)
+            return True
+
+    def sync_user(self, email: str, days: Dict) -> bool:
+        """Apply a calendar sync of a user's whole schedule; returns True if it changed.
+
+        Only the differences are applied, period by period, through the same
+        incremental paths as add_busy and remove_busy, so unchanged days keep
+        their gap lists. A user seen for the first time is built in one pass.
+        Sync results are not journaled: every process syncs from the calendar.
+        """
+        with self._lock:
+            current = self.schedules.get(email)
+            if current is None:
+                return self.replace_user(email, days)
+            changed = False
+            for date in set(current) | set(days):
+                held = Counter(tuple(period) for period in current.get(date, ()))
+                wanted = Counter(tuple(period) for period in days.get(date, ()))
+                if held == wanted:
+                    continue
+                for start_time, end_time in (held - wanted).elements():
+                    self._delete(email, date, start_time, end_time)
+                for start_time, end_time in (wanted - held).elements():
+                    self._insert(email, date, start_time, end_time)
+                changed = True
+            if changed:
+                self._bump(email)
+            return changed
+
+    def replace_user(self, email: str, days: Dict) -> bool:
+        """Replace a user's whole schedule with a full recompute; returns True if it changed."""
+        with self._lock:
+            if self.schedules.get(email) == days:
+                return False
+            self.schedules[email] = days
+            self.overlay.pop(email, None)
+            self.free[email] = {date: compute_gaps(periods) for date, periods in days.items()}
+            self._bump(email)
+            return True
+
+    def refresh_snapshot(self):
+        """Pick up a newer snapshot file if the writer replaced it.
+
+        Overlay periods the new snapshot already has are dropped, so the
+        snapshot becomes the only source for them again.
+        """
+        if self.snapshot is None or not self.snapshot.refresh():
+            return
+        with self._lock:
+            for email, days in list(self.overlay.items()):
+                for date, periods in list(days.items()):
+                    published = set(self.snapshot.busy(email, date))
+                    periods[:] = [
+                        period for period in periods
+                        if (to_minutes(period[0]), to_minutes(period[1])) not in published
+                    ]
+                    if not periods:
+                        del days[date]
+                if not days:
+                    del self.overlay[email]
+
+    def _insert(self, email: str, date: str, start_time: str, end_time: str):
+        # Caller holds _lock; the user is held locally
+        self.schedules.setdefault(email, {}).setdefault(date, []).append([start_time, end_time])
+        gaps = self.free.setdefault(email, {}).setdefault(date, list(FULL_DAY))
+        carve_gap(gaps, to_minutes(start_time), to_minutes(end_time))
+
+    def _delete(self, email: str, date: str, start_time: str, end_time: str) -> bool:
+        # Caller holds _lock; only this user's day is recomputed
+        periods = self.schedules.get(email, {}).get(date, [])
+        if not _remove_period(periods, start_time, end_time):
+            return False
+        if periods:
+            self.free[email][date] = compute_gaps(periods)
+        else:
+            del self.schedules[email][date]
+            del self.free[email][date]
+        return True
+
+    def _in_snapshot(self, email: str) -> bool:
+        # Users this process does not hold are answered from the snapshot
+        return email not in self.schedules and self.snapshot is not None
+
+    def version(self, email: str) -> int:
+        return self.versions.get(email, 0)
+
+    def _bump(self, email: str):
+        self.versions[email] = self.versions.get(email, 0) + 1
+        self.generation += 1
+        for listener in self.listeners:
+            listener(self)
+
+    def free_gaps(self, email: str, date: str) -> List[Tuple[int, int]]:
+        days = self.free.get(email)
+        if days is None and self.snapshot is not None:
+            gaps = self.snapshot.free_gaps(email, date)
+            for start_time, end_time in self.overlay.get(email, {}).get(date, ()):
+                carve_gap(gaps, to_minutes(start_time), to_minutes(end_time))
+            return gaps
+        return (days or {}).get(date, FULL_DAY)
+
+    def common_gaps(self, users: List[str], date: str) -> List[Tuple[int, int]]:
+        """Gaps where every user in `users` is free."""
+        gaps = FULL_DAY
+        for user in users:
+            gaps = intersect_gaps(gaps, self.free_gaps(user, date))
+            if not gaps:
+                break
+        return gaps
+
+    def is_free(self, email: str, date: str, start: int, end: int) -> bool:
+        if email not in self.free and self.snapshot is not None and date not in self.overlay.get(email, {}):
+            return self.snapshot.is_free(email, date, start, end)
+        return gaps_fit(self.free_gaps(email, date), start, end)
+
+    def check_consistency(self) -> List[Tuple[str, str]]:
+        """Compare the view against a full recompute; returns mismatched (email, date)."""
+        with self._lock:
+            mismatches = []
+            for email, days in self.schedules.items():
+                for date, periods in days.items():
+                    if self.free_gaps(email, date) != compute_gaps(periods):
+                        mismatches.append((email, date))
+            for email, days in self.free.items():
+                for date in days:
+                    if date not in self.schedules.get(email, {}):
+                        mismatches.append((email, date))
+            return mismatches
+
+
+def _remove_period(periods: list, start_time: str, end_time: str) -> bool:
+    """Delete the first [start_time, end_time] from `periods`; False when absent."""
+    for i, (start, end) in enumerate(periods):
+        if start == start_time and end == end_time:
+            del periods[i]
+            return True
+    return False
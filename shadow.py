@@ -0,0 +1,140 @@
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+# Shadow mode configuration (disabled unless an engine is named)
+SHADOW_ENGINE = os.getenv("SHADOW_ENGINE", "")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "8"))  # comparisons queued or running
+
+logger = logging.getLogger(__name__)
+
+# Candidate availability engines by name; each takes the same arguments as
+# find_available_slots
+engines: Dict[str, Callable] = {}
+
+
+def register(name: str, engine: Callable):
+    engines[name] = engine
+
+
+def slot_keys(slots: List[Dict]) -> List[tuple]:
+    """What must match between engines: the (date, start, end) of every slot, in order."""
+    return [(slot["date"], slot["start_time"], slot["end_time"]) for slot in slots]
+
+
+class ShadowRunner:
+    """Re-run sampled searches on a candidate engine and compare the answers.
+
+    The candidate runs on a single background thread in a copy of the
+    request's context (same tenant and request ID), never on the response
+    path. At most `max_pending` comparisons are queued or running; samples
+    beyond that are dropped, which bounds the overhead together with
+    `sample_rate`.
+    """
+
+    def __init__(self, engine: str = SHADOW_ENGINE, sample_rate: float = SHADOW_SAMPLE_RATE,
+                 max_pending: int = SHADOW_MAX_PENDING):
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self._pending = 0
+        self._executor = None
+        self._lock = threading.Lock()
+        self.metrics = {
+            "sampled": 0,
+            "dropped": 0,
+            "matches": 0,
+            "mismatches": 0,
+            "stale": 0,
+            "errors": 0,
+            "primary_ms_total": 0.0,
+            "candidate_ms_total": 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engine)
+
+    def compare(self, primary_slots: List[Dict], primary_seconds: float, inputs: Dict,
+                generation: Callable[[], int], started_generation: int):
+        """Schedule a shadow run for a search the primary engine just answered.
+
+        `inputs` are the keyword arguments of the search; `generation`
+        returns the current store generation and `started_generation` is
+        the one read before the primary search ran. Runs where they differ
+        raced a schedule change (during either search) and are counted as
+        stale instead of as mismatches.
+        """
+        if not self.enabled or random.random() >= self.sample_rate:
+            return
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.metrics["dropped"] += 1
+                return
+            self._pending += 1
+            self.metrics["sampled"] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        context = contextvars.copy_context()
+        self._executor.submit(
+            context.run, self._run, slot_keys(primary_slots), primary_seconds, inputs, generation, started_generation
+        )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            compared = self.metrics["matches"] + self.metrics["mismatches"]
+            return {
+                **{key: value for key, value in self.metrics.items() if not key.endswith("_ms_total")},
+                "engine": self.engine,
+                "pending": self._pending,
+                "primary_ms_avg": round(self.metrics["primary_ms_total"] / compared, 2) if compared else 0.0,
+                "candidate_ms_avg": round(self.metrics["candidate_ms_total"] / compared, 2) if compared else 0.0,
+            }
+
+    def _run(self, expected, primary_seconds, inputs, generation, started_generation):
+        try:
+            engine = engines[self.engine]
+            start = time.perf_counter()
+            actual = slot_keys(engine(**inputs))
+            candidate_seconds = time.perf_counter() - start
+
+            with self._lock:
+                if generation() != started_generation:
+                    self.metrics["stale"] += 1
+                    return
+                self.metrics["primary_ms_total"] += primary_seconds * 1000
+                self.metrics["candidate_ms_total"] += candidate_seconds * 1000
+                self.metrics["matches" if actual == expected else "mismatches"] += 1
+
+            timing = {
+                "engine": self.engine,
+                "primary_ms": round(primary_seconds * 1000, 2),
+                "candidate_ms": round(candidate_seconds * 1000, 2),
+            }
+            if actual == expected:
+                logger.debug("shadow match", extra=timing)
+            else:
+                # Enough to replay the search offline against a store dump
+                logger.warning("shadow mismatch", extra={
+                    **timing,
+                    "inputs": inputs,
+                    "store_generation": started_generation,
+                    "primary": expected,
+                    "candidate": actual,
+                })
+        except Exception:
+            with self._lock:
+                self.metrics["errors"] += 1
+            logger.exception("shadow engine failed", extra={"engine": self.engine, "inputs": inputs})
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+runner = ShadowRunner()
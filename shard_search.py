@@ -0,0 +1,136 @@
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+import timezones
+from schedule_snapshot import ScheduleSnapshot
+from schedule_store import gaps_fit, to_minutes
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+# Sharding configuration
+SHARD_MIN_WORK = int(os.getenv("SHARD_MIN_WORK", "1000"))  # dates × attendees below this stay in-process
+SHARD_DAYS = int(os.getenv("SHARD_DAYS", "14"))
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", str(os.cpu_count() or 1)))
+# Never "fork": the server is multi-threaded, and a forked child can inherit
+# a lock some other thread held at fork time
+SHARD_START_METHOD = os.getenv("SHARD_START_METHOD", "forkserver")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Snapshots mapped by this worker process, by path
+_snapshots: Dict[str, ScheduleSnapshot] = {}
+
+
+def should_shard(date_range: List[str], users: List[str], store=None) -> bool:
+    """Only pay the IPC cost when the search is big enough to benefit.
+
+    Workers read busy periods from the store's mmap snapshot, so a store
+    without one is always searched in-process: shipping every user's gaps
+    to the workers costs more than checking them here.
+    """
+    return (
+        SHARD_WORKERS > 1
+        and store is not None and store.snapshot is not None
+        and len(date_range) * max(len(users), 1) >= SHARD_MIN_WORK
+    )
+
+
+def _search_shard(path: str, windows: List[Tuple[str, list]], users: List[str],
+                  local_gaps: Dict[tuple, list]) -> List[str]:
+    """Local dates whose UTC parts are free for every user.
+
+    Users the parent holds in memory come with their gaps in `local_gaps`;
+    everyone else is read from the snapshot at `path`.
+    """
+    snapshot = _snapshots.get(path)
+    if snapshot is None:
+        snapshot = _snapshots[path] = ScheduleSnapshot(path)
+    else:
+        snapshot.refresh()
+
+    def is_free(user, utc_date, start, end):
+        gaps = local_gaps.get((user, utc_date))
+        if gaps is not None:
+            return gaps_fit(gaps, start, end)
+        return snapshot.is_free(user, utc_date, start, end)
+
+    return [
+        date for date, parts in windows
+        if all(is_free(user, utc_date, start, end) for utc_date, start, end in parts for user in users)
+    ]
+
+
+def _get_pool() -> "ProcessPoolExecutor":
+    global _pool
+    # multiprocessing is only imported once a search is big enough to shard
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with _pool_lock:
+        if _pool is None:
+            # Long-lived: workers keep no copy of the store, so writes never
+            # invalidate the pool
+            method = SHARD_START_METHOD if SHARD_START_METHOD in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=SHARD_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def start(store) -> bool:
+    """Start the worker processes ahead of the first big search; returns whether it did.
+
+    Only a store with a snapshot attached is ever sharded (see should_shard),
+    so without one no processes are started and the pool stays lazy.
+    """
+    if SHARD_WORKERS > 1 and store.snapshot is not None:
+        pool = _get_pool()
+        for future in [pool.submit(os.getpid) for _ in range(SHARD_WORKERS)]:
+            future.result()
+        return True
+    return False
+
+
+def search(date_range: List[str], start_time: str, end_time: str, users: List[str], store, zone: str) -> List[str]:
+    """Return the available (local) dates, searching date shards in worker processes.
+
+    The store must have a snapshot attached (see should_shard).
+    """
+    from concurrent.futures.process import BrokenProcessPool
+
+    start, end = to_minutes(start_time), to_minutes(end_time)
+    local_users = [user for user in users if user in store.free or user in store.overlay]
+    shards = []
+    for i in range(0, len(date_range), SHARD_DAYS):
+        windows = [(date, timezones.to_utc(zone, date, start, end)) for date in date_range[i:i + SHARD_DAYS]]
+        utc_dates = {utc_date for _, parts in windows for utc_date, _, _ in parts}
+        # Only users fetched into (or booked by) this process travel with the task
+        local_gaps = {
+            (user, utc_date): store.free_gaps(user, utc_date) for user in local_users for utc_date in utc_dates
+        }
+        shards.append((windows, local_gaps))
+
+    path = store.snapshot.path
+    try:
+        results = _get_pool().map(
+            _search_shard,
+            [path] * len(shards),
+            [windows for windows, _ in shards],
+            [users] * len(shards),
+            [local_gaps for _, local_gaps in shards]
+        )
+        # map() yields in submission order, so dates stay sorted
+        return [date for shard in results for date in shard]
+    except BrokenProcessPool:
+        # A worker died: answer in-process and build a fresh pool next time
+        shutdown()
+        return [date for windows, local_gaps in shards for date in _search_shard(path, windows, users, local_gaps)]
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
@@ -0,0 +1,167 @@
+"""Cold start: import-time budget, readiness state and background warm-up.
+
+main imports this module first, so `import_started` marks the start of the
+app's own imports.
+
+Example (exits 1 when importing the app takes longer than the budget):
+    python startup.py --budget-ms 800
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+import_started = time.perf_counter()
+
+# Startup configuration
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1000"))
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """State of each startup dependency, reported by /ready.
+
+    The instance is ready once every critical component is ready and no
+    component is still pending; a failed warm-up step (non-critical) is
+    reported but does not keep the instance out of rotation. Probes are
+    re-evaluated on every call, for dependencies that can die later.
+    """
+
+    def __init__(self):
+        self.components = {}  # name -> {"state", "critical", "ms", "detail"}
+        self.probes = {}  # name -> callable returning True when healthy
+        self._lock = threading.Lock()
+
+    def expect(self, name: str, critical: bool = True):
+        with self._lock:
+            self.components[name] = {"state": PENDING, "critical": critical}
+
+    def mark(self, name: str, state: str, ms: float = None, detail: str = None):
+        with self._lock:
+            component = self.components.setdefault(name, {"critical": True})
+            component["state"] = state
+            if ms is not None:
+                component["ms"] = round(ms, 1)
+            if detail is not None:
+                component["detail"] = detail
+
+    def probe(self, name: str, check: Callable[[], bool]):
+        self.probes[name] = check
+
+    @contextmanager
+    def check(self, name: str, critical: bool = True):
+        """Mark `name` ready when the block completes, failed when it raises (the error is not re-raised)."""
+        self.expect(name, critical)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.mark(name, FAILED, (time.perf_counter() - start) * 1000, repr(e))
+            logger.exception("startup step failed", extra={"component": name})
+        else:
+            self.mark(name, READY, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            components = {name: dict(component) for name, component in self.components.items()}
+        for name, check in self.probes.items():
+            try:
+                healthy = bool(check())
+            except Exception:
+                healthy = False
+            components[name] = {"state": READY if healthy else FAILED, "critical": True}
+        # Nothing has registered before the startup hook runs
+        ready = bool(components) and all(
+            component["state"] == READY or (component["state"] == FAILED and not component["critical"])
+            for component in components.values()
+        )
+        return {"ready": ready, "components": components}
+
+
+readiness = Readiness()
+
+
+def import_finished() -> float:
+    """Log how long the app's imports took, warning when over IMPORT_BUDGET_MS."""
+    elapsed_ms = (time.perf_counter() - import_started) * 1000
+    extra = {"import_ms": round(elapsed_ms, 1), "budget_ms": IMPORT_BUDGET_MS}
+    if elapsed_ms > IMPORT_BUDGET_MS:
+        logger.warning("app import over budget", extra=extra)
+    else:
+        logger.info("app imported", extra=extra)
+    return elapsed_ms
+
+
+def warm_up(steps: Dict[str, Callable[[], None]]) -> threading.Thread:
+    """Run cache warm-up steps in order on a background thread."""
+    for name in steps:
+        readiness.expect(name, critical=False)
+
+    def run():
+        for name, step in steps.items():
+            with readiness.check(name, critical=False):
+                step()
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def measure_imports(module: str = "main") -> dict:
+    """Import `module` in a fresh interpreter with -X importtime; total and slowest modules (ms)."""
+    import subprocess
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+
+    total_us = 0
+    self_times = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        self_times.append((int(self_us), name))
+        if name == module and len(indent) == 1:
+            total_us = int(cumulative_us)
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "slowest": [{"module": name, "self_ms": round(us / 1000, 1)} for us, name in sorted(self_times, reverse=True)],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check the app's import time against a budget")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    args = parser.parse_args()
+
+    measured = measure_imports(args.module)
+    within_budget = measured["total_ms"] <= args.budget_ms
+    print(json.dumps({
+        "module": args.module,
+        "total_ms": measured["total_ms"],
+        "budget_ms": args.budget_ms,
+        "within_budget": within_budget,
+        "slowest": measured["slowest"][:args.top],
+    }, indent=2))
+    sys.exit(0 if within_budget else 1)
@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from linebot import LineBotApi
+from linebot.http_client import RequestsHttpClient, RequestsHttpResponse
+
+import tracing
+from conversation import Session
+from reservations import SlotReservations
+from rooms import Room, RoomDirectory
+from schedule_store import ScheduleStore
+from work_calendar import WorkCalendar, get_calendar
+
+# Tenant configuration: a JSON list of
+# {"channel_id", "destination", "access_token", "secret", "organization", "rooms"}
+LINE_CHANNELS_FILE = os.getenv("LINE_CHANNELS_FILE", "")
+LINE_API_ENDPOINT = os.getenv("LINE_API_ENDPOINT", "https://api.line.me")  # overridden by replay mocks
+LINE_HTTP_POOL_SIZE = int(os.getenv("LINE_HTTP_POOL_SIZE", "50"))
+
+
+class PooledHttpClient(RequestsHttpClient):
+    """LINE SDK HTTP client backed by one shared keep-alive session."""
+
+    def __init__(self, timeout=RequestsHttpClient.DEFAULT_TIMEOUT, pool_size: int = LINE_HTTP_POOL_SIZE):
+        super().__init__(timeout=timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        response = self.session.get(
+            url, headers=headers, params=params, stream=stream, timeout=timeout or self.timeout
+        )
+        return RequestsHttpResponse(response)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        # Replies and pushes are legs of the request's trace
+        with tracing.span("line api", path=urlsplit(url).path):
+            response = self.session.post(url, headers=headers, data=data, timeout=timeout or self.timeout)
+        return RequestsHttpResponse(response)
+
+    def delete(self, url, headers=None, data=None, timeout=None):
+        response = self.session.delete(url, headers=headers, data=data, timeout=timeout or self.timeout)
+        return RequestsHttpResponse(response)
+
+    def put(self, url, headers=None, data=None, timeout=None):
+        response = self.session.put(url, headers=headers, data=data, timeout=timeout or self.timeout)
+        return RequestsHttpResponse(response)
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def shared_http_client() -> PooledHttpClient:
+    """HTTP client shared by every tenant's LineBotApi, built with the first one."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = PooledHttpClient()
+        return _http_client
+
+
+@dataclass
+class Tenant:
+    """One LINE channel with its own clients and isolated stores."""
+    channel_id: str
+    destination: str
+    secret: str  # verifies webhook signatures
+    access_token: str = field(repr=False)
+    store: ScheduleStore
+    reservations: SlotReservations
+    calendar: WorkCalendar
+    user_sessions: Dict[str, Session] = field(default_factory=dict)
+    available_users: List[str] = field(default_factory=list)
+    timezones: Dict[str, str] = field(default_factory=dict)  # LINE user ID or email -> IANA zone
+    rooms: RoomDirectory = field(default_factory=RoomDirectory)
+    _line_bot_api: Optional[LineBotApi] = field(default=None, repr=False)
+
+    @property
+    def line_bot_api(self) -> LineBotApi:
+        # Built on first use (or by the startup warm-up), not at import
+        if self._line_bot_api is None:
+            self._line_bot_api = LineBotApi(
+                self.access_token, endpoint=LINE_API_ENDPOINT, http_client=lambda timeout: shared_http_client()
+            )
+        return self._line_bot_api
+
+    @classmethod
+    def create(cls, channel_id: str, access_token: str, secret: str, destination: str = "",
+               organization: str = "default", schedules: Dict = None, available_users: List[str] = None,
+               rooms: List[Room] = ()):
+        store = ScheduleStore(schedules)
+        return cls(
+            channel_id=channel_id,
+            destination=destination,
+            secret=secret,
+            access_token=access_token,
+            store=store,
+            reservations=SlotReservations(store),
+            calendar=get_calendar(organization),
+            available_users=list(available_users or []),
+            rooms=RoomDirectory(rooms)
+        )
+
+
+class TenantRegistry:
+    """Tenants by channel ID and by webhook destination (the bot's user ID)."""
+
+    def __init__(self):
+        self.by_channel = {}
+        self.by_destination = {}
+        self.default: Optional[Tenant] = None
+        self._lock = threading.Lock()
+
+    def add(self, tenant: Tenant, default: bool = False) -> Tenant:
+        with self._lock:
+            self.by_channel[tenant.channel_id] = tenant
+            if tenant.destination:
+                self.by_destination[tenant.destination] = tenant
+            if default or self.default is None:
+                self.default = tenant
+        return tenant
+
+    def get(self, channel_id: str = None, destination: str = None) -> Optional[Tenant]:
+        """The tenant for a channel ID or destination; None when neither is known.
+
+        An unknown destination never falls back to the default tenant. The
+        one exception is a single-channel setup that has no destination
+        configured (CHANNEL_DESTINATION unset), which serves every webhook.
+        """
+        if channel_id is not None:
+            return self.by_channel.get(channel_id)
+        if destination:
+            tenant = self.by_destination.get(destination)
+            if tenant is None and len(self.by_channel) == 1 and not self.default.destination:
+                return self.default
+            return tenant
+        return self.default
+
+    def load_file(self, path: str = LINE_CHANNELS_FILE):
+        if not path:
+            return
+        with open(path, encoding="utf-8") as f:
+            for channel in json.load(f):
+                self.add(Tenant.create(
+                    channel_id=str(channel["channel_id"]),
+                    access_token=channel["access_token"],
+                    secret=channel["secret"],
+                    destination=channel.get("destination", ""),
+                    organization=channel.get("organization", "default"),
+                    rooms=[Room.from_dict(room) for room in channel.get("rooms", [])]
+                ))
+
+
+registry = TenantRegistry()
+
+# Tenant of the webhook being handled (copied onto worker threads)
+_current_tenant = ContextVar("current_tenant", default=None)
+
+
+def use_tenant(tenant: Tenant):
+    _current_tenant.set(tenant)
+
+
+def current() -> Tenant:
+    return _current_tenant.get() or registry.default
+
+
+class TenantLocal:
+    """Module-level stand-in that forwards to the current tenant's attribute.
+
+    Lets handler code keep using `line_bot_api`, `user_sessions`, ... as
+    globals while each webhook only ever touches its own tenant's objects.
+    """
+    __slots__ = ("_name",)
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def _target(self):
+        return getattr(current(), self._name)
+
+    def __getattr__(self, attr):
+        return getattr(self._target(), attr)
+
+    def __getitem__(self, key):
+        return self._target()[key]
+
+    def __setitem__(self, key, value):
+        self._target()[key] = value
+
+    def __contains__(self, key):
+        return key in self._target()
+
+    def __iter__(self):
+        return iter(self._target())
+
+    def __len__(self):
+        return len(self._target())
@@ -1,15 +1,32 @@
 from fastapi import FastAPI
 from pydantic import BaseModel
-from typing import List, Any
-from datetime import datetime
+from typing import Any, Dict, List
+from datetime import datetime, timezone
 import requests
 import aiosmtplib
 from email.message import EmailMessage
+import copy
+import logging
 import os
 import time
+import uuid
+
+import tracing
+
+from app_logging import REQUEST_ID_HEADER, request_id_var
+from schedule_store import merge_busy
+from timezones import DEFAULT_TIMEZONE, utc_periods
 
 app = FastAPI()
 
+logger = logging.getLogger(__name__)
+
+# SMTP configuration
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_START_TLS = os.getenv("SMTP_START_TLS", "1") == "1"
+SMTP_MAX_RECIPIENTS = int(os.getenv("SMTP_MAX_RECIPIENTS", "100"))  # RCPT TO per transaction
+
 
 class Creator(BaseModel):
     email: str
@@ -31,6 +48,7 @@ class Event(BaseModel):
 class CalendarResult(BaseModel):
     email: str
     calendar_id: str
+    time_zone: str = DEFAULT_TIMEZONE  # for all-day and floating-time events
     events: List[Event]
     is_authenticated: bool
 
@@ -39,6 +57,28 @@ class CalendarInput(BaseModel):
     results: List[CalendarResult]
 
 
+def parse_event_times(start: str, end: str, zone: str = DEFAULT_TIMEZONE) -> list:
+    """Convert an event's start/end into UTC [(date, "HH:MM", "HH:MM"), ...] parts."""
+    return utc_periods(start, end, zone)
+
+
+def parse_events(events, zone: str = DEFAULT_TIMEZONE) -> dict:
+    """Group event dicts (or Event models) into UTC {date: [(start, end), ...]}.
+
+    Multi-day and overnight events are split on day boundaries and each day's
+    periods are merged, so only the minimal set of busy intervals is stored.
+    """
+    busy = {}
+    for event in events:
+        if isinstance(event, dict):
+            start, end = event["start"], event["end"]
+        else:
+            start, end = event.start, event.end
+        for date, time_start, time_end in parse_event_times(start, end, zone):
+            busy.setdefault(date, []).append((time_start, time_end))
+    return {date: merge_busy(periods) for date, periods in busy.items()}
+
+
 @app.post("/calendar/parse")
 async def parse_calendar(data: CalendarInput):
     calendar_data = {}
@@ -48,59 +88,31 @@ async def parse_calendar(data: CalendarInput):
         if email not in calendar_data:
             calendar_data[email] = {}
 
-        for event in result.events:
-            start = event.start
-            end = event.end
+        for date, periods in parse_events(result.events, result.time_zone).items():
+            calendar_data[email].setdefault(date, []).extend(periods)
 
-            if 'T' not in start:
-                date = start
-                time_start = "00:00"
-                time_end = "23:59"
-            else:
-                start_dt = datetime.fromisoformat(start)
-                end_dt = datetime.fromisoformat(end)
-                date = start_dt.date().isoformat()
-                time_start = start_dt.strftime("%H:%M")
-                time_end = end_dt.strftime("%H:%M")
-
-            if date not in calendar_data[email]:
-                calendar_data[email][date] = []
-
-            calendar_data[email][date].append((time_start, time_end))
-
-    return calendar_data
+    # The same person's calendars can overlap each other
+    return {
+        email: {date: merge_busy(periods) for date, periods in days.items()}
+        for email, days in calendar_data.items()
+    }
 
 def send_post(meeting_result):
     start = time.time()
     try:
-        response = requests.post(
-            "http://127.0.0.1:8000/getmeeting",
-            json=meeting_result.dict(),
-            headers={"Content-Type": "application/json"},
-            timeout=15
-        )
-        print("✅ POST สำเร็จ:", response.status_code)
+        with tracing.span("send_post", recipients=len(meeting_result.user_emails)):
+            response = requests.post(
+                "http://127.0.0.1:8000/getmeeting",
+                json=meeting_result.dict(),
+                headers=tracing.inject({"Content-Type": "application/json", REQUEST_ID_HEADER: request_id_var.get()}),
+                timeout=15
+            )
+        logger.info("meeting posted", extra={"status": response.status_code})
     except Exception as e:
-        print("❌ POST ล้มเหลว:", str(e))
+        logger.error("meeting post failed", extra={"error": str(e)})
         
     finally:
-        print(f"⏱️ ใช้เวลา: {round(time.time() - start, 2)} วินาที")
-
-def send_get(email):
-    start = time.time()
-    try:
-        response = requests.get(
-            f"http://127.0.0.1:8000/events/{email}",
-            timeout=15
-        )
-        print(f"✅ GET สำเร็จ: {response.status_code}")
-        print(f"📡 URL: http://127.0.0.1:8000/events/{email}")
-        return response.json()
-    except Exception as e:
-        print(f"❌ GET ล้มเหลว: {str(e)}")
-        return {"error": str(e)}
-    finally:
-        print(f"⏱️ ใช้เวลา: {round(time.time() - start, 2)} วินาที")
+        logger.info("meeting post finished", extra={"elapsed_s": round(time.time() - start, 2)})
 
 async def send_email(to_email: str, subject: str, body: str):
     message = EmailMessage()
@@ -109,11 +121,128 @@ async def send_email(to_email: str, subject: str, body: str):
     message["Subject"] = subject
     message.set_content(body)
 
-    await aiosmtplib.send(
-        message,
-        hostname="smtp.gmail.com",
-        port=587,
-        start_tls=True,
-        username= os.getenv("email"),
-        password= os.getenv("password")  # ใช้ App Password ถ้าใช้ Gmail
-    )
\ No newline at end of file
+    with tracing.span("smtp send", recipients=1):
+        await aiosmtplib.send(
+            message,
+            hostname=SMTP_HOST,
+            port=SMTP_PORT,
+            start_tls=SMTP_START_TLS,
+            username= os.getenv("email"),
+            password= os.getenv("password")  # ใช้ App Password ถ้าใช้ Gmail
+        )
+
+
+def _ics_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_fold(line: str) -> str:
+    """Fold a content line at 75 octets as required by RFC 5545."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line
+    parts = []
+    limit = 75
+    while len(data) > limit:
+        cut = limit
+        # Never split a multi-byte UTF-8 character
+        while cut > 0 and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode("utf-8"))
+        data = data[cut:]
+        limit = 74  # continuation lines start with a space
+    parts.append(data.decode("utf-8"))
+    return "\r\n ".join(parts)
+
+
+def _ics_time(iso_time: str) -> str:
+    return datetime.fromisoformat(iso_time).astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def build_ics(meeting: dict) -> str:
+    """Render a meeting (MeetingResult dict) as an iCalendar REQUEST invite."""
+    organizer = os.getenv("email", "")
+    lines = [
+        "BEGIN:VCALENDAR",
+        "PRODID:-//line-auto-meet//EN",
+        "VERSION:2.0",
+        "METHOD:REQUEST",
+        "BEGIN:VEVENT",
+        f"UID:{uuid.uuid4()}@line-auto-meet",
+        f"DTSTAMP:{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART:{_ics_time(meeting['start_time'])}",
+        f"DTEND:{_ics_time(meeting['end_time'])}",
+        f"SUMMARY:{_ics_escape(meeting['summary'])}",
+        f"DESCRIPTION:{_ics_escape(meeting.get('description', ''))}",
+        f"LOCATION:{_ics_escape(meeting.get('location', ''))}",
+    ]
+    if organizer:
+        lines.append(f"ORGANIZER:mailto:{organizer}")
+    for email in meeting["user_emails"]:
+        lines.append(f"ATTENDEE;ROLE=REQ-PARTICIPANT;RSVP=TRUE:mailto:{email}")
+    lines += ["END:VEVENT", "END:VCALENDAR"]
+    return "\r\n".join(_ics_fold(line) for line in lines) + "\r\n"
+
+
+def build_meeting_message(meeting: dict, subject: str, body: str) -> EmailMessage:
+    """Build the meeting email (with .ics invite) once for all recipients."""
+    message = EmailMessage()
+    message["From"] = os.getenv("email")
+    message["To"] = ", ".join(meeting["user_emails"])
+    message["Subject"] = subject
+    message.set_content(body)
+    message.add_attachment(
+        build_ics(meeting).encode("utf-8"),
+        maintype="text",
+        subtype="calendar",
+        filename="invite.ics",
+        params={"method": "REQUEST", "charset": "utf-8"}
+    )
+    return message
+
+
+async def send_meeting_email(message: EmailMessage, recipients: List[str], personalize=None) -> Dict:
+    """Deliver a prebuilt message over one SMTP connection.
+
+    Without `personalize` the message goes out as one transaction per
+    SMTP_MAX_RECIPIENTS recipients (multiple RCPT TO). With it, each
+    recipient gets their own copy, personalize(copy, email) being applied
+    first. Returns the recipients the server refused, {email: (code, reply)},
+    which are also logged.
+    """
+    refused = {}
+    smtp = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT, start_tls=SMTP_START_TLS)
+    with tracing.span("smtp session", recipients=len(recipients)):
+        async with smtp:
+            if os.getenv("password"):
+                with tracing.span("smtp login"):
+                    await smtp.login(os.getenv("email"), os.getenv("password"))
+
+            if personalize is None:
+                for i in range(0, len(recipients), SMTP_MAX_RECIPIENTS):
+                    batch = recipients[i:i + SMTP_MAX_RECIPIENTS]
+                    with tracing.span("smtp send", recipients=len(batch)):
+                        refused.update(await _send_refused(smtp, message, batch))
+            else:
+                for email in recipients:
+                    personal = copy.deepcopy(message)
+                    personalize(personal, email)
+                    with tracing.span("smtp send", recipients=1):
+                        refused.update(await _send_refused(smtp, personal, [email]))
+
+    for email, (code, reply) in refused.items():
+        logger.warning("recipient refused", extra={"email": email, "code": code, "reply": reply})
+    return refused
+
+
+async def _send_refused(smtp, message: EmailMessage, recipients: List[str]) -> Dict:
+    """Send one transaction and return its refused recipients, {email: (code, reply)}.
+
+    aiosmtplib returns the refusals when some recipients are accepted but
+    raises when all of them are refused; both end up here.
+    """
+    try:
+        errors, _ = await smtp.send_message(message, recipients=recipients)
+    except aiosmtplib.SMTPRecipientsRefused as e:
+        return {error.recipient: (error.code, error.message) for error in e.recipients}
+    return {email: (response.code, response.message) for email, response in errors.items()}
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from admission import ACCEPTED, DEFERRED, SHED, FairScheduler
+
+
+def blocked_scheduler(**kwargs):
+    """A started scheduler whose only worker is stuck until the returned event is set."""
+    scheduler = FairScheduler(workers=1, **kwargs)
+    scheduler.start()
+    release = threading.Event()
+    started = threading.Event()
+
+    def stuck():
+        started.set()
+        release.wait(5)
+
+    scheduler.submit("slow", stuck)
+    assert started.wait(1)
+    return scheduler, release
+
+
+def test_sheds_heavy_work_while_workers_are_blocked():
+    scheduler, release = blocked_scheduler(defer_after_ms=20, shed_after_ms=60)
+    try:
+        assert scheduler.submit("a", lambda: None) == ACCEPTED
+        assert scheduler.submit("b", lambda: None, heavy=True) == ACCEPTED
+
+        # Nothing is dequeued while the worker is stuck; the queued work still ages
+        time.sleep(0.03)
+        assert scheduler.submit("c", lambda: None, heavy=True) == DEFERRED
+        time.sleep(0.05)
+        assert scheduler.submit("d", lambda: None, heavy=True) == SHED
+        assert scheduler.snapshot()["queue_latency_ms"] >= 60
+        # Light work is only shed when the queues are full
+        assert scheduler.submit("e", lambda: None) == ACCEPTED
+    finally:
+        release.set()
+
+
+def test_latency_drops_once_the_backlog_drains():
+    scheduler, release = blocked_scheduler(defer_after_ms=20, shed_after_ms=60)
+    done = threading.Event()
+    scheduler.submit("a", done.set)
+    time.sleep(0.08)
+    assert scheduler.submit("b", lambda: None, heavy=True) == SHED
+
+    release.set()
+    assert done.wait(1)
+    deadline = time.monotonic() + 1
+    while scheduler.snapshot()["queued"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert scheduler.snapshot()["queue_latency_ms"] == 0
+    assert scheduler.submit("c", lambda: None, heavy=True) == ACCEPTED
+
+
+def test_full_queues_shed_everything():
+    scheduler, release = blocked_scheduler(max_queue_total=2)
+    try:
+        assert scheduler.submit("a", lambda: None) == ACCEPTED
+        assert scheduler.submit("b", lambda: None) == ACCEPTED
+        assert scheduler.submit("c", lambda: None) == SHED
+    finally:
+        release.set()
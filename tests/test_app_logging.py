@@ -0,0 +1,108 @@
+import contextvars
+import json
+import logging
+import queue
+import threading
+from logging.handlers import QueueListener
+
+import pytest
+
+import tracing
+from admission import FairScheduler
+from app_logging import ContextFilter, DeferredQueueHandler, JsonFormatter, new_request_id
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    """A private logger wired like setup_logging(), capturing what the listener emits."""
+    monkeypatch.setattr(tracing, "TRACE_FILE", "")
+    log_queue = queue.Queue()
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    sink = ListHandler()
+    listener = QueueListener(log_queue, sink)
+
+    logger = logging.getLogger("test_app_logging")
+    logger.handlers[:] = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener.start()
+    yield logger, sink, listener
+    logger.handlers[:] = []
+
+
+def drain(listener, sink):
+    listener.stop()
+    return sink.records
+
+
+def in_request(fn):
+    """Run `fn` in a fresh context so request IDs don't leak between tests."""
+    return contextvars.copy_context().run(fn)
+
+
+def test_records_reach_the_handler_with_trace_and_request_ids(captured):
+    logger, sink, listener = captured
+
+    def request():
+        new_request_id("req-1")
+        with tracing.span("webhook", traceparent=TRACEPARENT) as active:
+            logger.info("slot booked", extra={"slot": "10:00"})
+        return active
+
+    active = in_request(request)
+    (record,) = drain(listener, sink)
+    assert record.request_id == "req-1"
+    assert record.trace_id == active.trace_id
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["trace_id"] == active.trace_id
+    assert entry["request_id"] == "req-1"
+    assert entry["slot"] == "10:00"
+
+
+def test_worker_thread_records_carry_the_submitters_ids(captured):
+    logger, sink, listener = captured
+    scheduler = FairScheduler(workers=1)
+    scheduler.start()
+    done = threading.Event()
+
+    def task():
+        logger.info("on worker")
+        done.set()
+
+    def request():
+        new_request_id("req-2")
+        with tracing.span("webhook", traceparent=TRACEPARENT) as active:
+            scheduler.submit("user", task)
+        return active
+
+    active = in_request(request)
+    assert done.wait(5)
+    (record,) = drain(listener, sink)
+    assert record.threadName.startswith("fair-worker-")
+    assert (record.request_id, record.trace_id) == ("req-2", active.trace_id)
+
+
+def test_unsampled_spans_leave_no_trace_id(captured):
+    logger, sink, listener = captured
+
+    def request():
+        with tracing.span("webhook"):
+            logger.info("not sampled")
+
+    in_request(request)
+    (record,) = drain(listener, sink)
+    assert record.request_id == "-"
+    assert not hasattr(record, "trace_id")
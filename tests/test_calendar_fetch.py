@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import pytest
+
+from calendar_fetch import CalendarFetcher
+from schedule_store import ScheduleStore
+
+DELAY = 0.05
+
+
+class StubCalendarHandler(BaseHTTPRequestHandler):
+    """GET /events/<email>: one busy hour after a short delay; "broken@..." answers 500."""
+
+    def do_GET(self):
+        server = self.server
+        email = unquote(self.path.rsplit("/", 1)[-1])
+        with server.lock:
+            server.requests[email] += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(DELAY)
+            if email.startswith("broken@"):
+                self.send_response(500)
+                self.end_headers()
+                return
+            body = json.dumps({
+                "timeZone": "UTC",
+                "events": [{"start": "2026-10-20T09:00:00Z", "end": "2026-10-20T10:00:00Z"}],
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCalendarHandler)
+    server.lock = threading.Lock()
+    server.requests = Counter()
+    server.in_flight = server.max_in_flight = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_fetcher(stub_server):
+    fetchers = []
+
+    def make(**kwargs):
+        fetcher = CalendarFetcher(base_url=f"http://127.0.0.1:{stub_server.server_port}", **kwargs)
+        fetchers.append(fetcher)
+        return fetcher
+
+    yield make
+    for fetcher in fetchers:
+        fetcher.close()
+
+
+def test_per_host_concurrency_cap(stub_server, make_fetcher):
+    fetcher = make_fetcher(max_per_host=3)
+    emails = [f"user{i}@x.com" for i in range(12)]
+
+    started = time.monotonic()
+    assert fetcher.fetch(emails, ScheduleStore()) == {}
+
+    assert stub_server.max_in_flight == 3
+    # 12 requests, 3 at a time
+    assert time.monotonic() - started >= 4 * DELAY
+
+
+def test_fresh_calendars_are_not_refetched(stub_server, make_fetcher):
+    fetcher = make_fetcher(cache_ttl=60)
+    store = ScheduleStore()
+
+    fetcher.fetch(["a@x.com", "b@x.com"], store)
+    fetcher.fetch(["a@x.com", "b@x.com", "c@x.com"], store)
+    assert stub_server.requests == Counter({"a@x.com": 1, "b@x.com": 1, "c@x.com": 1})
+
+    fetcher.fetch(["a@x.com"], store, force=True)
+    assert stub_server.requests["a@x.com"] == 2
+
+
+def test_expired_calendars_are_refetched(stub_server, make_fetcher):
+    fetcher = make_fetcher(cache_ttl=0)
+    store = ScheduleStore()
+    fetcher.fetch(["a@x.com"], store)
+    fetcher.fetch(["a@x.com"], store)
+    assert stub_server.requests["a@x.com"] == 2
+
+
+def test_one_failing_calendar_does_not_fail_the_batch(stub_server, make_fetcher):
+    fetcher = make_fetcher()
+    store = ScheduleStore()
+
+    errors = fetcher.fetch(["a@x.com", "broken@x.com", "b@x.com"], store)
+
+    assert list(errors) == ["broken@x.com"]
+    for email in ("a@x.com", "b@x.com"):
+        assert not store.is_free(email, "2026-10-20", 9 * 60 + 15, 9 * 60 + 45)
+        assert fetcher.is_fresh(store, email)
+    assert not fetcher.is_fresh(store, "broken@x.com")
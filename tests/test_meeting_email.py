@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+import test as mail
+
+MEETING = {
+    "user_emails": ["a@x.com", "bad@x.com"],
+    "summary": "Sync",
+    "description": "",
+    "location": "",
+    "start_time": "2026-10-20T09:00:00+07:00",
+    "end_time": "2026-10-20T10:00:00+07:00",
+}
+
+
+async def stub_smtp(reader, writer):
+    """Accepts every recipient except bad@..., which gets 550."""
+    async def reply(line):
+        writer.write(line.encode("ascii") + b"\r\n")
+        await writer.drain()
+
+    await reply("220 stub")
+    while line := (await reader.readline()).decode().strip():
+        command = line.split(" ", 1)[0].upper()
+        if command == "RCPT":
+            await reply("550 no such user" if "bad@" in line else "250 OK")
+        elif command == "DATA":
+            await reply("354 go ahead")
+            await reader.readuntil(b"\r\n.\r\n")
+            await reply("250 OK")
+        elif command == "QUIT":
+            await reply("221 bye")
+            break
+        else:
+            await reply("250 OK")
+    writer.close()
+
+
+@pytest.mark.parametrize("personalize", [None, lambda message, email: None])
+def test_refused_recipients_are_returned(monkeypatch, personalize):
+    monkeypatch.setenv("email", "organizer@x.com")
+    monkeypatch.delenv("password", raising=False)
+
+    async def run():
+        server = await asyncio.start_server(stub_smtp, "127.0.0.1", 0)
+        monkeypatch.setattr(mail, "SMTP_HOST", "127.0.0.1")
+        monkeypatch.setattr(mail, "SMTP_PORT", server.sockets[0].getsockname()[1])
+        monkeypatch.setattr(mail, "SMTP_START_TLS", False)
+        async with server:
+            message = mail.build_meeting_message(MEETING, "Sync", "body")
+            return await mail.send_meeting_email(message, MEETING["user_emails"], personalize)
+
+    assert asyncio.run(run()) == {"bad@x.com": (550, "no such user")}
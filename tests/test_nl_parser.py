@@ -0,0 +1,42 @@
+from datetime import date
+
+import pytest
+
+from nl_parser import parse_meeting_request
+
+TODAY = date(2026, 10, 19)  # a Monday
+
+
+def test_thai_request():
+    request = parse_meeting_request("ประชุมทีม พรุ่งนี้ถึงศุกร์ 13:00-14:00 กับ a@x.com, b@y.com", TODAY)
+    assert request.name == "ประชุมทีม"
+    assert (request.start_date, request.end_date) == ("2026-10-20", "2026-10-23")
+    assert (request.start_time, request.end_time) == ("13:00", "14:00")
+    assert request.attendees == ["a@x.com", "b@y.com"]
+
+
+@pytest.mark.parametrize("text, name, dates", [
+    ("Monitoring review tomorrow 1h with a@x.com", "Monitoring review", ("2026-10-20", "2026-10-20")),
+    ("Satisfaction survey sync 1 hour with a@x.com", "Satisfaction survey sync", ("2026-10-19", "2026-10-25")),
+    ("Wedding plan thursday 1h with a@x.com", "Wedding plan", ("2026-10-22", "2026-10-22")),
+    ("sunset talk wed 1h with a@x.com", "sunset talk", ("2026-10-21", "2026-10-21")),
+    ("Friends and Thumbnails 30 min with a@x.com", "Friends and Thumbnails", ("2026-10-19", "2026-10-25")),
+    ("Tuesdays recap wed 1h with a@x.com", "Tuesdays recap", ("2026-10-21", "2026-10-21")),
+])
+def test_day_abbreviations_inside_words_are_not_dates(text, name, dates):
+    request = parse_meeting_request(text, TODAY)
+    assert request.name == name
+    assert (request.start_date, request.end_date) == dates
+
+
+def test_title_starting_with_a_weekday_keeps_its_name():
+    request = parse_meeting_request("Sunday brunch 13:00-14:00 with a@x.com", TODAY)
+    assert request.name == "Sunday brunch"
+    assert (request.start_date, request.end_date) == ("2026-10-25", "2026-10-25")
+
+
+def test_day_abbreviations_as_words_are_dates():
+    request = parse_meeting_request("sync sat 1h with a@x.com", TODAY)
+    assert request.name == "sync"
+    assert request.start_date == "2026-10-24"
+    assert parse_meeting_request("tomorrow 13:00-14:00 with a@x.com", TODAY).name == "ประชุม"
@@ -0,0 +1,73 @@
+import pytest
+
+from reservations import SlotReservations
+from schedule_store import ScheduleStore, to_minutes
+
+SLOT = [("2026-10-20", "02:00", "03:00")]
+USERS = ["a@x.com", "b@x.com"]
+
+
+@pytest.fixture
+def store():
+    return ScheduleStore()
+
+
+def is_free(store, user, date, start, end):
+    return store.is_free(user, date, to_minutes(start), to_minutes(end))
+
+
+def test_commit_writes_the_busy_period(store):
+    reservations = SlotReservations(store)
+    hold_id = reservations.hold("organizer", USERS, SLOT)
+    assert reservations.commit(hold_id)
+    assert not any(is_free(store, user, *SLOT[0]) for user in USERS)
+    assert reservations.holds == {}
+
+
+def test_holds_hide_slots_from_other_organizers_only(store):
+    reservations = SlotReservations(store)
+    hold_id = reservations.hold("organizer", USERS, SLOT)
+    overlapping = [("2026-10-20", "02:30", "03:30")]
+    assert reservations.is_held(["b@x.com"], overlapping, owner="other")
+    assert not reservations.is_held(["b@x.com"], overlapping, owner="organizer")
+    assert not reservations.is_held(["c@x.com"], overlapping, owner="other")
+    reservations.release(hold_id)
+    assert not reservations.is_held(["b@x.com"], overlapping, owner="other")
+
+
+def test_changed_version_still_commits_when_slot_is_free(store):
+    reservations = SlotReservations(store)
+    hold_id = reservations.hold("organizer", USERS, SLOT)
+    store.add_busy("a@x.com", "2026-10-20", "05:00", "06:00")
+    assert reservations.commit(hold_id)
+
+
+def test_changed_version_with_conflict_fails(store):
+    reservations = SlotReservations(store)
+    hold_id = reservations.hold("organizer", USERS, SLOT)
+    store.add_busy("b@x.com", "2026-10-20", "02:30", "02:45")
+    assert not reservations.commit(hold_id)
+    assert is_free(store, "a@x.com", *SLOT[0])
+    assert reservations.holds == {}
+
+
+def test_expired_hold_loses_to_a_live_hold(store):
+    reservations = SlotReservations(store, ttl=-1)
+    expired = reservations.hold("organizer", USERS, SLOT)
+    reservations.ttl = 60
+    reservations.hold("other", ["b@x.com"], SLOT)
+    assert not reservations.commit(expired)
+
+
+def test_expired_hold_commits_when_the_slot_is_still_free(store):
+    reservations = SlotReservations(store, ttl=-1)
+    expired = reservations.hold("organizer", USERS, SLOT)
+    assert reservations.commit(expired)
+    assert not is_free(store, "a@x.com", *SLOT[0])
+
+
+def test_expired_holds_stop_hiding_the_slot(store):
+    reservations = SlotReservations(store, ttl=-1)
+    expired = reservations.hold("organizer", USERS, SLOT)
+    assert not reservations.is_held(USERS, SLOT, owner="other")
+    assert expired not in reservations.holds
@@ -0,0 +1,127 @@
+import os
+import random
+import time
+
+from schedule_snapshot import ScheduleSnapshot, attach_snapshot, write_snapshot
+from schedule_store import ScheduleStore, compute_gaps, to_minutes
+
+DATES = ["2026-01-05", "2026-01-06", "2026-01-07"]
+USERS = ["a@x.com", "b@x.com", "c@x.com"]
+
+
+def random_period(rng):
+    start = rng.randrange(0, 24 * 60 - 15)
+    end = rng.randrange(start + 1, min(start + 240, 24 * 60))
+    return f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}"
+
+
+def sorted_days(days):
+    return {date: sorted(map(tuple, periods)) for date, periods in days.items() if periods}
+
+
+def test_random_operations_match_full_recompute():
+    rng = random.Random(1234)
+    store = ScheduleStore()
+    held = []
+    for step in range(2000):
+        op = rng.random()
+        if op < 0.55 or not held:
+            email, date = rng.choice(USERS), rng.choice(DATES)
+            start, end = random_period(rng)
+            store.add_busy(email, date, start, end)
+            held.append((email, date, start, end))
+        elif op < 0.9:
+            email, date, start, end = held.pop(rng.randrange(len(held)))
+            assert store.remove_busy(email, date, start, end)
+        elif op < 0.95:
+            email = rng.choice(USERS)
+            days = {date: [list(random_period(rng)) for _ in range(rng.randrange(4))] for date in rng.sample(DATES, 2)}
+            store.replace_user(email, days)
+            held = [entry for entry in held if entry[0] != email]
+            held += [(email, date, start, end) for date, periods in days.items() for start, end in periods]
+        else:
+            # Calendar sync: keep most periods, drop some, add a few
+            email = rng.choice(USERS)
+            days = {
+                date: [list(period) for period in periods if rng.random() < 0.7]
+                + [list(random_period(rng)) for _ in range(rng.randrange(3))]
+                for date, periods in store.schedules.get(email, {}).items()
+            }
+            days.setdefault(rng.choice(DATES), []).append(list(random_period(rng)))
+            store.sync_user(email, days)
+            assert sorted_days(store.schedules[email]) == sorted_days(days)
+            held = [entry for entry in held if entry[0] != email]
+            held += [(email, date, start, end) for date, periods in days.items() for start, end in periods]
+        assert store.check_consistency() == [], f"diverged after step {step}"
+
+
+def test_sync_only_touches_changed_days():
+    store = ScheduleStore()
+    store.sync_user("a@x.com", {DATES[0]: [["09:00", "10:00"]], DATES[1]: [["11:00", "12:00"]]})
+    unchanged = store.free["a@x.com"][DATES[0]]
+    version = store.version("a@x.com")
+
+    assert store.sync_user("a@x.com", {DATES[0]: [["09:00", "10:00"]], DATES[2]: [["13:00", "14:00"]]})
+    assert store.free["a@x.com"][DATES[0]] is unchanged
+    assert DATES[1] not in store.schedules["a@x.com"]
+    assert store.version("a@x.com") == version + 1
+    assert store.check_consistency() == []
+    assert not store.sync_user("a@x.com", {DATES[0]: [["09:00", "10:00"]], DATES[2]: [["13:00", "14:00"]]})
+
+
+def test_injected_inconsistency_is_reported():
+    store = ScheduleStore()
+    store.add_busy("a@x.com", DATES[0], "09:00", "10:00")
+    store.add_busy("b@x.com", DATES[0], "11:00", "12:00")
+    assert store.check_consistency() == []
+
+    store.free["a@x.com"][DATES[0]] = [(0, 24 * 60)]
+    store.free["b@x.com"][DATES[1]] = [(0, 24 * 60)]
+    assert sorted(store.check_consistency()) == [("a@x.com", DATES[0]), ("b@x.com", DATES[1])]
+
+
+def reader_store(tmp_path, schedules):
+    path = str(tmp_path / "schedules.snap")
+    write_snapshot(schedules, path)
+    store = ScheduleStore()
+    attach_snapshot(store, path, writer=False)
+    return store
+
+
+def test_local_write_keeps_snapshot_busy_periods(tmp_path):
+    store = reader_store(tmp_path, {"a@x.com": {DATES[0]: [["13:00", "14:00"]], DATES[1]: [["09:00", "10:00"]]}})
+    assert not store.is_free("a@x.com", DATES[0], to_minutes("13:00"), to_minutes("13:30"))
+
+    store.add_busy("a@x.com", DATES[1], "15:00", "16:00")
+
+    assert not store.is_free("a@x.com", DATES[0], to_minutes("13:00"), to_minutes("13:30"))
+    assert not store.is_free("a@x.com", DATES[1], to_minutes("09:00"), to_minutes("09:30"))
+    assert not store.is_free("a@x.com", DATES[1], to_minutes("15:00"), to_minutes("15:30"))
+    assert store.free_gaps("a@x.com", DATES[1]) == compute_gaps([["09:00", "10:00"], ["15:00", "16:00"]])
+
+
+def test_reader_writes_reach_the_snapshot_writer(tmp_path):
+    path = str(tmp_path / "schedules.snap")
+    writer = ScheduleStore({"a@x.com": {DATES[0]: [["13:00", "14:00"]]}})
+    attach_snapshot(writer, path, writer=True)
+    deadline = time.monotonic() + 5
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    reader = ScheduleStore()
+    attach_snapshot(reader, path, writer=False)
+
+    reader.add_busy("a@x.com", DATES[0], "15:00", "16:00")
+    reader.add_busy("b@x.com", DATES[1], "09:00", "10:00")
+
+    other = ScheduleSnapshot(path)
+    while "b@x.com" not in other and time.monotonic() < deadline:
+        time.sleep(0.01)
+        other.refresh()
+    assert not other.is_free("a@x.com", DATES[0], to_minutes("15:00"), to_minutes("15:30"))
+    assert not other.is_free("b@x.com", DATES[1], to_minutes("09:00"), to_minutes("09:30"))
+    assert writer.check_consistency() == []
+
+    # Once the snapshot has them, the reader drops its own copies
+    reader.refresh_snapshot()
+    assert reader.overlay == {}
+    assert not reader.is_free("a@x.com", DATES[0], to_minutes("15:00"), to_minutes("15:30"))
@@ -0,0 +1,37 @@
+import time
+
+import shadow
+
+
+def wait_idle(runner):
+    deadline = time.monotonic() + 5
+    while runner.snapshot()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_write_during_primary_search_is_stale(monkeypatch):
+    monkeypatch.setitem(shadow.engines, "test", lambda **inputs: [])
+    runner = shadow.ShadowRunner(engine="test", sample_rate=1.0)
+    generation = [0]
+
+    started_generation = generation[0]
+    generation[0] += 1  # a write lands while the primary engine searches
+    runner.compare([], 0.001, {}, lambda: generation[0], started_generation)
+    wait_idle(runner)
+
+    metrics = runner.snapshot()
+    assert metrics["stale"] == 1
+    assert metrics["mismatches"] == metrics["matches"] == 0
+
+
+def test_unchanged_store_is_compared(monkeypatch):
+    slot = {"date": "2026-01-05", "start_time": "09:00", "end_time": "10:00"}
+    monkeypatch.setitem(shadow.engines, "test", lambda **inputs: [slot])
+    runner = shadow.ShadowRunner(engine="test", sample_rate=1.0)
+
+    runner.compare([slot], 0.001, {}, lambda: 7, 7)
+    runner.compare([], 0.001, {}, lambda: 7, 7)
+    wait_idle(runner)
+
+    metrics = runner.snapshot()
+    assert (metrics["matches"], metrics["mismatches"], metrics["stale"]) == (1, 1, 0)
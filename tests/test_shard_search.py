@@ -0,0 +1,61 @@
+from datetime import date, timedelta
+
+import pytest
+
+import shard_search
+from schedule_snapshot import ScheduleSnapshot, write_snapshot
+from schedule_store import ScheduleStore, to_minutes
+
+DATES = [(date(2026, 1, 1) + timedelta(days=i)).isoformat() for i in range(40)]
+USERS = ["a@x.com", "b@x.com", "c@x.com"]
+
+
+def in_process(store, users, start, end):
+    return [
+        date for date in DATES
+        if all(store.is_free(user, date, to_minutes(start), to_minutes(end)) for user in users)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(shard_search, "SHARD_WORKERS", 2)
+    schedules = {
+        user: {date: [["13:00", "14:00"]] for date in DATES[i::3]}
+        for i, user in enumerate(USERS)
+    }
+    path = str(tmp_path / "schedules.snap")
+    write_snapshot(schedules, path)
+    store = ScheduleStore()
+    store.snapshot = ScheduleSnapshot(path)
+    yield store
+    shard_search.shutdown()
+
+
+def test_only_snapshot_backed_stores_shard(store):
+    assert shard_search.should_shard(DATES * 20, USERS, store)
+    assert not shard_search.should_shard(DATES * 20, USERS, ScheduleStore())
+    assert not shard_search.should_shard(DATES[:2], USERS, store)
+
+
+def test_pool_only_starts_for_snapshot_backed_stores(store):
+    assert not shard_search.start(ScheduleStore())
+    assert shard_search._pool is None
+    assert shard_search.start(store)
+    assert shard_search._pool is not None
+
+
+def test_sharded_search_matches_in_process(store):
+    assert shard_search.search(DATES, "13:30", "13:45", USERS, store, "UTC") == in_process(store, USERS, "13:30", "13:45")
+    assert shard_search.search(DATES, "09:00", "10:00", USERS, store, "UTC") == DATES
+
+
+def test_pool_survives_writes_and_sees_local_users(store):
+    shard_search.search(DATES, "09:00", "10:00", USERS, store, "UTC")
+    pool = shard_search._pool
+
+    # A user booked in this process is shipped with the task
+    store.add_busy("d@x.com", DATES[5], "09:00", "09:30")
+    found = shard_search.search(DATES, "09:00", "10:00", USERS + ["d@x.com"], store, "UTC")
+    assert found == [date for date in DATES if date != DATES[5]]
+    assert shard_search._pool is pool
@@ -0,0 +1,117 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+from linebot.models import MessageEvent, SourceUser, TextMessage
+
+import lineChatbot
+import quorum
+import tenants
+from conversation import CONFIRM_MEETING, SELECT_SLOT, MeetingDraft, Session
+from rooms import Room
+from work_calendar import WorkCalendar
+
+ZONE = "Asia/Bangkok"
+CALENDAR = WorkCalendar({day: (9 * 60, 18 * 60) for day in range(5)})
+NOW = datetime(2026, 10, 19, 10, 7, tzinfo=ZoneInfo(ZONE))  # a Monday
+
+
+@pytest.fixture(autouse=True)
+def tenant():
+    tenant = tenants.Tenant.create("test", "token", "secret")
+    tenants.use_tenant(tenant)
+    yield tenant
+    tenants.use_tenant(None)
+
+
+def text_event(text):
+    return MessageEvent(source=SourceUser(user_id="U" + "1" * 32), reply_token="r", message=TextMessage(text=text))
+
+
+def test_duration_search_today_starts_after_now():
+    slots = lineChatbot.find_duration_slots(
+        ["2026-10-19", "2026-10-20"], 60, ["a@x.com"], calendar=CALENDAR, zone=ZONE, now=NOW
+    )
+    assert [(slot["date"], slot["start_time"]) for slot in slots] == [("2026-10-19", "10:15"), ("2026-10-20", "09:00")]
+
+
+def test_duration_search_today_after_hours_offers_nothing_today():
+    late = NOW.replace(hour=17, minute=30)
+    slots = lineChatbot.find_duration_slots(["2026-10-19"], 60, ["a@x.com"], calendar=CALENDAR, zone=ZONE, now=late)
+    assert slots == []
+
+
+def test_quorum_search_today_starts_after_now():
+    slots = lineChatbot.find_quorum_slots(
+        ["2026-10-19"], ["a@x.com"], ["b@x.com"], 1.0, 60, calendar=CALENDAR, zone=ZONE, now=NOW
+    )
+    assert slots and all(slot["start_time"] >= "10:07" for slot in slots)
+
+
+def test_bad_time_range_raises_value_error():
+    with pytest.raises(ValueError):
+        lineChatbot.find_available_slots(["2026-10-20"], "not a time", ["a@x.com"], calendar=CALENDAR, zone=ZONE)
+
+
+def test_one_message_meeting_request_is_heavy():
+    assert lineChatbot.is_heavy_event(text_event("ประชุมทีม พรุ่งนี้ 13:00-14:00 กับ a@x.com"))
+    assert not lineChatbot.is_heavy_event(text_event("วิธีใช้งาน"))
+
+
+def rooms_tenant(tenant, rooms, busy):
+    for room in rooms:
+        tenant.rooms.add(room)
+    for key, periods in busy.items():
+        for date, start, end in periods:
+            tenant.store.add_busy(key, date, start, end)
+
+
+def test_duration_search_picks_earliest_room_then_smallest(tenant):
+    small, large = Room("small", "Small", 4), Room("large", "Large", 10)
+    # UTC busy periods (Bangkok is UTC+7): small is taken 09:00-11:00 local, large 09:00-09:30
+    rooms_tenant(tenant, [small, large], {small.key: [("2026-10-20", "02:00", "04:00")],
+                                          large.key: [("2026-10-20", "02:00", "02:30")]})
+    slots = lineChatbot.find_duration_slots(
+        ["2026-10-20"], 60, ["a@x.com"], calendar=CALENDAR, zone=ZONE, rooms=[small, large], now=NOW
+    )
+    assert [(slot["start_time"], slot["room_id"]) for slot in slots] == [("09:45", "large")]
+
+    tied = lineChatbot.find_duration_slots(
+        ["2026-10-20"], 60, ["a@x.com"], window=("12:00", "14:00"), calendar=CALENDAR, zone=ZONE,
+        rooms=[small, large], now=NOW
+    )
+    assert [(slot["start_time"], slot["room_id"]) for slot in tied] == [("12:00", "small")]
+
+
+def test_quorum_search_fills_the_limit_with_room_backed_slots(tenant, monkeypatch):
+    monkeypatch.setattr(quorum, "QUORUM_MAX_SLOTS", 2)
+    room = Room("only", "Only", 4)
+    dates = ["2026-10-20", "2026-10-21", "2026-10-22", "2026-10-23"]
+    # The room is booked all day on the first two dates
+    rooms_tenant(tenant, [room], {room.key: [(date, "00:00", "23:59") for date in dates[:2]]})
+    slots = lineChatbot.find_quorum_slots(
+        dates, ["a@x.com"], ["b@x.com"], 0.5, 0, ("13:00", "14:00"), calendar=CALENDAR, zone=ZONE,
+        now=NOW, rooms=[room]
+    )
+    assert [(slot["date"], slot["room_id"]) for slot in slots] == [("2026-10-22", "only"), ("2026-10-23", "only")]
+
+
+def test_offered_slots_are_held_until_one_is_chosen(tenant):
+    def draft():
+        return MeetingDraft(start_date="2030-01-08", end_date="2030-01-09", duration=60, selected_users=["a@x.com"])
+
+    first, second = Session(meeting=draft()), Session(meeting=draft())
+    _, state = lineChatbot.offer_slots(first, "U1")
+    assert state == SELECT_SLOT and len(first.available_slots) == 2
+    offered = first.available_slots
+
+    # Both slots are held while on offer, so the other organizer is not shown them
+    _, state = lineChatbot.offer_slots(second, "U2")
+    assert state is None and not second.available_slots
+
+    # Choosing one keeps its hold and releases the other
+    lineChatbot.apply_slot(first, "U1", offered[0])
+    assert first.hold_id == offered[0]["hold_id"]
+    _, state = lineChatbot.offer_slots(second, "U2")
+    assert state == CONFIRM_MEETING
+    assert second.meeting.date == offered[1]["date"]
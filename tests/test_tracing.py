@@ -0,0 +1,67 @@
+import threading
+
+import tracing
+from admission import FairScheduler
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def run_on_worker(fn):
+    """Submit `fn` to a one-worker admission scheduler and wait for it."""
+    scheduler = FairScheduler(workers=1)
+    scheduler.start()
+    done = threading.Event()
+    result = {}
+
+    def task():
+        result["value"] = fn()
+        done.set()
+
+    scheduler.submit("user", task)
+    assert done.wait(5)
+    return result["value"]
+
+
+def test_trace_context_survives_the_admission_thread_hop():
+    with tracing.span("webhook") as root:
+        def handler():
+            with tracing.span("handler") as child:
+                return threading.current_thread().name, child
+        thread_name, child = run_on_worker(handler)
+
+    assert thread_name.startswith("fair-worker-")
+    assert child.trace_id == root.trace_id
+    assert child.parent_id == root.span_id
+    assert tracing.current_span.get() is None
+
+
+def test_remote_traceparent_is_continued_and_injected():
+    with tracing.span("server", traceparent=f"00-{TRACE_ID}-{PARENT_ID}-01") as server:
+        headers = tracing.inject({})
+    assert (server.trace_id, server.parent_id, server.sampled) == (TRACE_ID, PARENT_ID, True)
+    assert tracing.parse_traceparent(headers[tracing.TRACEPARENT_HEADER]) == (TRACE_ID, server.span_id, True)
+
+
+def test_invalid_traceparent_starts_a_new_trace():
+    assert tracing.parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") is None
+    with tracing.span("server", traceparent="garbage") as server:
+        pass
+    assert server.parent_id is None and server.trace_id != TRACE_ID
+
+
+def test_exported_spans_give_the_critical_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "traces.jsonl")
+    monkeypatch.setattr(tracing, "TRACE_FILE", path)
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "_exporter", None)
+
+    with tracing.span("webhook"):
+        with tracing.span("find slots"):
+            pass
+        run_on_worker(lambda: tracing.traced("smtp send")(lambda: None)())
+    tracing.exporter().close()
+
+    (spans,) = tracing.load_spans(path).values()
+    assert sorted(record["name"] for record in spans) == ["find slots", "smtp send", "webhook"]
+    assert [record["name"] for record in tracing.critical_path(spans)] == ["webhook", "smtp send"]
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import tenants
+import webhook_events
+from replay import sign
+
+SECRET = "channel-secret"
+DESTINATION = "U" + "d" * 32
+
+
+def follow_body(destination=DESTINATION) -> bytes:
+    # Follow events are acknowledged without being queued
+    event = {"type": "follow", "timestamp": 0, "source": {"type": "user", "userId": "U" + "1" * 32}}
+    return json.dumps({"destination": destination, "events": [event]}).encode("utf-8")
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = tenants.TenantRegistry()
+    registry.add(tenants.Tenant.create("main", "token", SECRET, destination=DESTINATION))
+    monkeypatch.setattr(tenants, "registry", registry)
+    return registry
+
+
+@pytest.fixture
+def client():
+    # No context manager: the startup hook (workers, warm-up) is not needed
+    return TestClient(main.app)
+
+
+def post(client, body, signature, path="/webhook"):
+    return client.post(path, content=body, headers={"Content-Type": "application/json", "X-Line-Signature": signature})
+
+
+def test_known_destination_is_routed(client, registry):
+    assert post(client, follow_body(), sign(follow_body(), SECRET)).status_code == 200
+
+
+def test_unknown_destination_is_not_found(client, registry):
+    registry.add(tenants.Tenant.create("other", "token", "other-secret", destination="U" + "e" * 32))
+    body = follow_body("U" + "f" * 32)
+    response = post(client, body, sign(body, SECRET))
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Unknown channel"
+
+
+def test_unknown_channel_route_is_not_found(client, registry):
+    body = follow_body()
+    assert post(client, body, sign(body, SECRET), path="/webhook/missing").status_code == 404
+
+
+def test_single_channel_without_destination_serves_every_webhook(client, monkeypatch):
+    registry = tenants.TenantRegistry()
+    registry.add(tenants.Tenant.create("main", "token", SECRET))
+    monkeypatch.setattr(tenants, "registry", registry)
+    body = follow_body("U" + "f" * 32)
+    assert post(client, body, sign(body, SECRET)).status_code == 200
+
+
+def test_bad_signature_is_rejected(client, registry):
+    body = follow_body()
+    assert post(client, body, sign(body, "wrong-secret")).status_code == 400
+    assert post(client, body, sign(body + b" ", SECRET)).status_code == 400
+
+
+def test_empty_signature_is_rejected(client, registry):
+    assert post(client, follow_body(), "").status_code == 400
+    response = client.post("/webhook", content=follow_body(), headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+
+
+def test_channel_without_secret_rejects_everything(client, monkeypatch):
+    registry = tenants.TenantRegistry()
+    registry.add(tenants.Tenant.create("main", "token", "", destination=DESTINATION))
+    monkeypatch.setattr(tenants, "registry", registry)
+    body = follow_body()
+    # An HMAC keyed with the empty secret is computable by anyone
+    assert post(client, body, sign(body, "")).status_code == 400
+
+
+@pytest.mark.parametrize("secret, signature", [("", "c2ln"), (None, "c2ln"), ("secret", ""), ("secret", None)])
+def test_verify_signature_needs_secret_and_signature(secret, signature):
+    assert not webhook_events.verify_signature(follow_body(), signature, secret)
@@ -0,0 +1,176 @@
+import os
+from datetime import date as Date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from schedule_store import merge_busy
+
+# Zone for users (and calendars) that never told us theirs
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Asia/Bangkok")
+
+MINUTES_PER_DAY = 24 * 60
+
+# Busy periods and holds are stored in UTC: dates are UTC dates and times
+# are UTC minutes. A period that crosses UTC midnight is stored as two
+# parts, the first ending at 23:59 and the second starting at 00:00 (busy
+# periods are inclusive, like the existing all-day "00:00"-"23:59").
+
+
+def is_valid_zone(zone: str) -> bool:
+    try:
+        ZoneInfo(zone)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def _offset_minutes(moment: datetime) -> int:
+    return int(moment.utcoffset().total_seconds()) // 60
+
+
+@lru_cache(maxsize=65536)
+def day_offsets(zone: str, date: str) -> Tuple[Tuple[int, int], ...]:
+    """UTC offsets in effect during a local day: ((from local minute, offset minutes), ...).
+
+    One entry on ordinary days and two on DST transition days. Cached per
+    (zone, date), so searches convert a window with a table lookup and
+    integer arithmetic instead of going through zoneinfo.
+    """
+    tz = ZoneInfo(zone)
+    day = Date.fromisoformat(date)
+    midnight = datetime.combine(day, time(), tz)
+    last_minute = datetime.combine(day, time(23, 59), tz)
+    first, last = _offset_minutes(midnight), _offset_minutes(last_minute)
+    if first == last:
+        return ((0, first),)
+
+    # Binary search (in UTC) for the first minute with the new offset
+    lo = midnight.astimezone(timezone.utc)
+    hi = last_minute.astimezone(timezone.utc)
+    while hi - lo > timedelta(minutes=1):
+        mid = lo + (hi - lo) // 2
+        if _offset_minutes(mid.astimezone(tz)) == first:
+            lo = mid
+        else:
+            hi = mid
+    changed_at = hi.astimezone(tz)
+    return (0, first), (changed_at.hour * 60 + changed_at.minute, last)
+
+
+def offset_at(zone: str, date: str, minute: int) -> int:
+    """UTC offset (minutes) of a local minute of the day."""
+    offset = 0
+    for since, value in day_offsets(zone, date):
+        if minute < since:
+            break
+        offset = value
+    return offset
+
+
+@lru_cache(maxsize=65536)
+def _ordinal(date: str) -> int:
+    return Date.fromisoformat(date).toordinal()
+
+
+def day_start(date: str) -> int:
+    """Absolute minute at which a (UTC) date starts."""
+    return _ordinal(date) * MINUTES_PER_DAY
+
+
+@lru_cache(maxsize=65536)
+def _iso(ordinal: int) -> str:
+    return Date.fromordinal(ordinal).isoformat()
+
+
+def split_utc(start: int, end: int) -> List[Tuple[str, int, int]]:
+    """Split absolute UTC minutes [start, end] into per-UTC-day (date, start, end) parts."""
+    parts = []
+    day, end_day = start // MINUTES_PER_DAY, end // MINUTES_PER_DAY
+    while day < end_day:
+        parts.append((_iso(day), start - day * MINUTES_PER_DAY, MINUTES_PER_DAY - 1))
+        day += 1
+        start = day * MINUTES_PER_DAY
+    parts.append((_iso(day), start - day * MINUTES_PER_DAY, end - day * MINUTES_PER_DAY))
+    return parts
+
+
+def local_to_utc(zone: str, date: str, minute: int) -> int:
+    """Absolute UTC minute (since day 1) of a local date and minute."""
+    return _ordinal(date) * MINUTES_PER_DAY + minute - offset_at(zone, date, minute)
+
+
+def local_minute(zone: str, date: str, utc_minute: int) -> int:
+    """Minute of the local `date` at an absolute UTC minute."""
+    base = utc_minute - _ordinal(date) * MINUTES_PER_DAY
+    offsets = day_offsets(zone, date)
+    minute = base + offsets[0][1]
+    for since, offset in offsets[1:]:
+        if base + offset >= since:
+            minute = base + offset
+    return minute
+
+
+def to_utc(zone: str, date: str, start: int, end: int) -> List[Tuple[str, int, int]]:
+    """Convert a local window [start, end] (minutes) into UTC (date, start, end) parts."""
+    return split_utc(local_to_utc(zone, date, start), local_to_utc(zone, date, end))
+
+
+def utc_periods(start: str, end: str, zone: str = DEFAULT_TIMEZONE) -> List[Tuple[str, str, str]]:
+    """Normalize an event's ISO start/end into UTC (date, "HH:MM", "HH:MM") parts.
+
+    Timestamps carrying an offset are converted directly; floating times and
+    all-day events (a bare date, with an exclusive end date) are read in
+    `zone`. Events spanning several days yield one part per UTC day.
+    """
+    if "T" not in start:
+        last_day = start
+        if end and "T" not in end and end > start:
+            last_day = _iso(_ordinal(end) - 1)
+        first, last = local_to_utc(zone, start, 0), local_to_utc(zone, last_day, MINUTES_PER_DAY - 1)
+    else:
+        first, last = _absolute_utc(start, zone), _absolute_utc(end, zone)
+    return [(date, _hhmm(lo), _hhmm(hi)) for date, lo, hi in split_utc(first, max(first, last))]
+
+
+def _absolute_utc(value: str, zone: str) -> int:
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        date = moment.date().isoformat()
+        return local_to_utc(zone, date, moment.hour * 60 + moment.minute)
+    moment = moment.astimezone(timezone.utc)
+    return moment.toordinal() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+def _hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def utc_schedules(schedules: Dict, zone: str = DEFAULT_TIMEZONE) -> Dict:
+    """Convert {email: {local date: [[start, end], ...]}} into the stored UTC form."""
+    converted = {}
+    for email, days in schedules.items():
+        user_days = converted.setdefault(email, {})
+        for date, periods in days.items():
+            for start, end in periods:
+                for utc_date, utc_start, utc_end in utc_periods(f"{date}T{start}", f"{date}T{end}", zone):
+                    user_days.setdefault(utc_date, []).append((utc_start, utc_end))
+        for date, periods in user_days.items():
+            user_days[date] = [list(period) for period in merge_busy(periods)]
+    return converted
+
+
+def local_isoformat(zone: str, date: str, hhmm: str) -> str:
+    """ISO 8601 timestamp with the zone's offset, e.g. "2025-04-21T13:00:00+07:00"."""
+    hours, minutes = hhmm.split(":")
+    offset = offset_at(zone, date, int(hours) * 60 + int(minutes))
+    sign = "+" if offset >= 0 else "-"
+    return f"{date}T{hhmm}:00{sign}{abs(offset) // 60:02d}:{abs(offset) % 60:02d}"
+
+
+def today(zone: str = DEFAULT_TIMEZONE) -> Date:
+    return datetime.now(ZoneInfo(zone)).date()
+
+
+def local_now(zone: str = DEFAULT_TIMEZONE) -> datetime:
+    return datetime.now(ZoneInfo(zone))
@@ -0,0 +1,250 @@
+"""Span tracing with W3C trace context, exported as JSON lines.
+
+A meeting confirmation crosses the webhook, an admission worker, the
+send_post thread, an HTTP hop to /getmeeting and SMTP delivery. Spans are
+kept in a ContextVar, so they follow copied contexts into threads, and the
+`traceparent` header carries them across HTTP.
+
+Example:
+    TRACE_FILE=traces.jsonl python main.py
+    python tracing.py traces.jsonl   # critical path per trace
+"""
+import argparse
+import atexit
+import functools
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Tracing configuration (spans are only exported when TRACE_FILE is set)
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))  # decided once per trace, at the root
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+
+TRACEPARENT_HEADER = "traceparent"
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+@dataclass(slots=True)
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    sampled: bool
+    start: float = field(default_factory=time.time)
+    end: float = 0.0
+    status: str = "ok"
+    attributes: Dict = field(default_factory=dict)
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "duration_ms": round((self.end - self.start) * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+# Innermost open span of the current request (copied into worker threads)
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header: str) -> Optional[tuple]:
+    """(trace_id, parent span_id, sampled) from a traceparent header, or None when invalid."""
+    match = TRACEPARENT_PATTERN.match((header or "").strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def inject(headers: Dict[str, str]) -> Dict[str, str]:
+    """Add the current span's traceparent to outgoing HTTP headers."""
+    active = current_span.get()
+    if active is not None:
+        headers[TRACEPARENT_HEADER] = active.traceparent
+    return headers
+
+
+@contextmanager
+def span(name: str, traceparent: str = None, **attributes):
+    """Open a span as a child of the current one (or of `traceparent`).
+
+    Without either a new trace is started and the sampling decision made;
+    children inherit it. Exceptions mark the span as an error and propagate.
+    """
+    parent = current_span.get()
+    remote = parse_traceparent(traceparent) if parent is None and traceparent else None
+    if parent is not None:
+        trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+    elif remote is not None:
+        trace_id, parent_id, sampled = remote
+    else:
+        trace_id, parent_id = os.urandom(16).hex(), None
+        sampled = bool(TRACE_FILE) and random.random() < TRACE_SAMPLE_RATE
+
+    active = Span(trace_id, os.urandom(8).hex(), parent_id, name, sampled, attributes=attributes)
+    token = current_span.set(active)
+    try:
+        yield active
+    except BaseException as e:
+        active.status = "error"
+        active.set("error", repr(e))
+        raise
+    finally:
+        active.end = time.time()
+        current_span.reset(token)
+        if active.sampled and TRACE_FILE:
+            exporter().export(active)
+
+
+def traced(name: str):
+    """Decorator running a plain function inside a span."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class FileExporter:
+    """Append finished spans to a JSON lines file from a background thread.
+
+    The request path only does a non-blocking put; when the queue is full
+    spans are dropped (and counted) rather than slowing requests down.
+    """
+
+    def __init__(self, path: str, queue_size: int = TRACE_QUEUE_SIZE):
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._drain, name="trace-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def export(self, finished: Span):
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _drain(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                finished = self._queue.get()
+                if finished is None:
+                    return
+                f.write(json.dumps(finished.to_dict(), ensure_ascii=False, default=str) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+
+def exporter() -> FileExporter:
+    """The TRACE_FILE exporter, started on the first finished span."""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = FileExporter(TRACE_FILE)
+    return _exporter
+
+
+def load_spans(path: str) -> Dict[str, List[dict]]:
+    traces = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                traces[record["trace_id"]].append(record)
+    return traces
+
+
+def critical_path(spans: List[dict]) -> List[dict]:
+    """Root first, then at each level the child that finished last.
+
+    Work handed to threads and HTTP calls outlives the span that started
+    it, so following the latest-ending child leads to the leg that decided
+    when the trace was done (e.g. the last email sent).
+    """
+    children = defaultdict(list)
+    ids = {record["span_id"] for record in spans}
+    roots = []
+    for record in spans:
+        if record["parent_id"] in ids:
+            children[record["parent_id"]].append(record)
+        else:
+            roots.append(record)
+    if not roots:
+        return []
+
+    path = [min(roots, key=lambda record: record["start"])]
+    while children[path[-1]["span_id"]]:
+        path.append(max(children[path[-1]["span_id"]], key=lambda record: record["end"]))
+    return path
+
+
+def report(traces: Dict[str, List[dict]]) -> List[dict]:
+    """Per trace: wall time from the first span's start to the last span's end, and its critical path."""
+    rows = []
+    for trace_id, spans in traces.items():
+        start = min(record["start"] for record in spans)
+        rows.append({
+            "trace_id": trace_id,
+            "total_ms": round((max(record["end"] for record in spans) - start) * 1000, 1),
+            "spans": len(spans),
+            "critical_path": [
+                {"name": record["name"], "offset_ms": round((record["start"] - start) * 1000, 1),
+                 "duration_ms": record["duration_ms"]}
+                for record in critical_path(spans)
+            ],
+        })
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Critical path per trace from a TRACE_FILE")
+    parser.add_argument("trace_file")
+    parser.add_argument("--name", help="only traces containing a span with this name, e.g. 'smtp send'")
+    parser.add_argument("--top", type=int, default=20, help="slowest traces to show")
+    args = parser.parse_args()
+
+    traces = load_spans(args.trace_file)
+    if args.name:
+        traces = {
+            trace_id: spans for trace_id, spans in traces.items()
+            if any(record["name"] == args.name for record in spans)
+        }
+    print(json.dumps(report(traces)[:args.top], ensure_ascii=False, indent=2))
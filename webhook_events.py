@@ -0,0 +1,59 @@
+import base64
+import hashlib
+import hmac
+import json
+from typing import List
+
+from linebot.models import MessageEvent, PostbackEvent
+
+# Event types the bot dispatches, with the message types it understands
+# (None = any). Everything else (follow, unfollow, read, delivery, ...) is
+# dropped before any SDK model is built.
+HANDLED_EVENTS = {
+    "message": {"text"},
+    "postback": None,
+}
+EVENT_MODELS = {
+    "message": MessageEvent,
+    "postback": PostbackEvent,
+}
+# Every handled event carries its type as a JSON string somewhere in the body
+HANDLED_MARKERS = tuple(f'"{event_type}"'.encode("utf-8") for event_type in HANDLED_EVENTS)
+
+
+def verify_signature(body: bytes, signature: str, secret: str) -> bool:
+    """Check X-Line-Signature against the raw request bytes."""
+    # An unset secret would make the HMAC forgeable by anyone
+    if not secret or not signature:
+        return False
+    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest), signature.encode("utf-8"))
+
+
+def may_contain_handled(body: bytes) -> bool:
+    """Cheap byte scan: False means no event in the body can be dispatched."""
+    return any(marker in body for marker in HANDLED_MARKERS)
+
+
+def load_payload(body: bytes) -> dict:
+    """Decode a webhook body; raises ValueError on malformed JSON."""
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError("webhook body is not a JSON object")
+    return payload
+
+
+def is_handled(event: dict) -> bool:
+    if event.get("type") not in HANDLED_EVENTS:
+        return False
+    message_types = HANDLED_EVENTS[event["type"]]
+    return message_types is None or (event.get("message") or {}).get("type") in message_types
+
+
+def parse_events(payload: dict) -> List:
+    """Build SDK models only for the events the bot dispatches."""
+    return [
+        EVENT_MODELS[event["type"]].new_from_json_dict(event)
+        for event in payload.get("events", ())
+        if is_handled(event)
+    ]
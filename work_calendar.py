@@ -0,0 +1,148 @@
+import os
+import threading
+from datetime import date as Date, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from schedule_store import to_minutes
+
+# Working calendar configuration
+HOLIDAYS_FILE = os.getenv("HOLIDAYS_FILE", "")
+WORKING_HOURS = os.getenv("WORKING_HOURS", "Mon-Fri 09:00-18:00")
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+# Thai public holidays that fall on the same date every year (MM-DD)
+THAI_FIXED_HOLIDAYS = {
+    "01-01": "วันขึ้นปีใหม่",
+    "04-06": "วันจักรี",
+    "04-13": "วันสงกรานต์",
+    "04-14": "วันสงกรานต์",
+    "04-15": "วันสงกรานต์",
+    "05-01": "วันแรงงานแห่งชาติ",
+    "05-04": "วันฉัตรมงคล",
+    "06-03": "วันเฉลิมพระชนมพรรษาพระราชินี",
+    "07-28": "วันเฉลิมพระชนมพรรษา ร.10",
+    "08-12": "วันแม่แห่งชาติ",
+    "10-13": "วันนวมินทรมหาราช",
+    "10-23": "วันปิยมหาราช",
+    "12-05": "วันพ่อแห่งชาติ",
+    "12-10": "วันรัฐธรรมนูญ",
+    "12-31": "วันสิ้นปี",
+}
+
+# Lunar-calendar holidays move every year; extend via HOLIDAYS_FILE
+THAI_LUNAR_HOLIDAYS = {
+    "2025-02-12": "วันมาฆบูชา",
+    "2025-05-11": "วันวิสาขบูชา",
+    "2025-07-10": "วันอาสาฬหบูชา",
+    "2025-07-11": "วันเข้าพรรษา",
+    "2026-03-03": "วันมาฆบูชา",
+    "2026-05-31": "วันวิสาขบูชา",
+    "2026-07-29": "วันอาสาฬหบูชา",
+    "2026-07-30": "วันเข้าพรรษา",
+}
+
+
+def parse_working_hours(spec: str) -> Dict[int, Tuple[int, int]]:
+    """Parse e.g. "Mon-Fri 09:00-18:00, Sat 09:00-12:00" into {weekday: (start, end)}."""
+    windows = {}
+    for part in spec.split(","):
+        days, hours = part.strip().split()
+        first, _, last = days.lower().partition("-")
+        first_index = WEEKDAYS.index(first[:3])
+        last_index = WEEKDAYS.index(last[:3]) if last else first_index
+        start, end = hours.split("-")
+        for weekday in range(first_index, last_index + 1):
+            windows[weekday] = (to_minutes(start), to_minutes(end))
+    return windows
+
+
+def load_holidays(path: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Read a holiday file into (fixed MM-DD holidays, dated YYYY-MM-DD holidays).
+
+    One holiday per line: "YYYY-MM-DD name" for a single date or
+    "MM-DD name" for every year; blank lines and "#" comments are ignored.
+    """
+    fixed, dated = {}, {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            day, _, name = line.partition(" ")
+            (dated if len(day) == 10 else fixed)[day] = name.strip()
+    return fixed, dated
+
+
+class WorkCalendar:
+    """Working days and hours of one organization, precomputed per year.
+
+    Each year is compiled once into an int bitmask with one bit per day of
+    the year (set = working day), and working hours into per-weekday minute
+    windows, so filtering a date costs a dict lookup and a bit test.
+    """
+
+    def __init__(self, working_hours: Dict[int, Tuple[int, int]], fixed_holidays: Dict[str, str] = None,
+                 dated_holidays: Dict[str, str] = None):
+        self.working_hours = working_hours
+        self.fixed_holidays = dict(fixed_holidays or {})
+        self.dated_holidays = dict(dated_holidays or {})
+        self._year_masks = {}
+        self._lock = threading.Lock()
+
+    def _year_mask(self, year: int) -> int:
+        mask = self._year_masks.get(year)
+        if mask is not None:
+            return mask
+        with self._lock:
+            mask = 0
+            day = Date(year, 1, 1)
+            index = 0
+            while day.year == year:
+                iso = day.isoformat()
+                if (day.weekday() in self.working_hours
+                        and iso[5:] not in self.fixed_holidays
+                        and iso not in self.dated_holidays):
+                    mask |= 1 << index
+                day += timedelta(days=1)
+                index += 1
+            self._year_masks[year] = mask
+        return mask
+
+    def is_working_day(self, day: Date) -> bool:
+        return bool(self._year_mask(day.year) >> (day.timetuple().tm_yday - 1) & 1)
+
+    def fits_hours(self, day: Date, start: int, end: int) -> bool:
+        window = self.working_hours.get(day.weekday())
+        return window is not None and window[0] <= start and end <= window[1]
+
+    def filter_dates(self, dates: Iterable[str], start_time: str, end_time: str) -> List[str]:
+        """Keep dates that are working days whose hours cover the time window."""
+        start, end = to_minutes(start_time), to_minutes(end_time)
+        kept = []
+        for iso in dates:
+            day = Date.fromisoformat(iso)
+            if self.is_working_day(day) and self.fits_hours(day, start, end):
+                kept.append(iso)
+        return kept
+
+    def holiday_name(self, iso: str) -> str:
+        return self.dated_holidays.get(iso) or self.fixed_holidays.get(iso[5:], "")
+
+
+def default_calendar() -> WorkCalendar:
+    """Thai public holidays plus HOLIDAYS_FILE, with WORKING_HOURS."""
+    fixed, dated = dict(THAI_FIXED_HOLIDAYS), dict(THAI_LUNAR_HOLIDAYS)
+    if HOLIDAYS_FILE:
+        extra_fixed, extra_dated = load_holidays(HOLIDAYS_FILE)
+        fixed.update(extra_fixed)
+        dated.update(extra_dated)
+    return WorkCalendar(parse_working_hours(WORKING_HOURS), fixed, dated)
+
+
+# Calendars per organization (in production, load from a database)
+calendars = {"default": default_calendar()}
+
+
+def get_calendar(organization: str = "default") -> WorkCalendar:
+    return calendars.get(organization) or calendars["default"]